@@ -1,44 +1,92 @@
-"""
-丐版量化交易系统 - Flask应用初始化
-"""
-from flask import Flask
-from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-
-db = SQLAlchemy()
-
-
-def create_app(config_name='default'):
-    """创建Flask应用"""
-    app = Flask(__name__)
-    
-    # 加载配置
-    from app.config import config
-    app.config.from_object(config[config_name])
-    
-    # 初始化扩展
-    db.init_app(app)
-    # CORS配置 - 限制允许的来源
-    allowed_origins = [
-        "http://localhost:3000",
-        "http://127.0.0.1:3000",
-        "http://localhost:5173",
-        "http://127.0.0.1:5173"
-    ]
-    CORS(app, resources={r"/api/*": {"origins": allowed_origins}})
-    
-    # 注册蓝图
-    from app.api import stock_bp, analysis_bp
-    app.register_blueprint(stock_bp, url_prefix='/api/stock')
-    app.register_blueprint(analysis_bp, url_prefix='/api/analysis')
-    
-    # 创建数据库表
-    with app.app_context():
-        db.create_all()
-    
-    # 健康检查路由
-    @app.route('/api/health')
-    def health_check():
-        return {'status': 'ok', 'message': '丐版量化交易系统运行中'}
-    
-    return app
+"""
+丐版量化交易系统 - Flask应用初始化
+"""
+from flask import Flask
+from flask_cors import CORS
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+db = SQLAlchemy()
+
+
+def create_app(config_name='default'):
+    """创建Flask应用"""
+    app = Flask(__name__)
+    
+    # 加载配置
+    from app.config import config
+    app.config.from_object(config[config_name])
+    
+    # 初始化扩展
+    db.init_app(app)
+    _init_sqlite(app)
+    # CORS配置 - 限制允许的来源
+    allowed_origins = [
+        "http://localhost:3000",
+        "http://127.0.0.1:3000",
+        "http://localhost:5173",
+        "http://127.0.0.1:5173"
+    ]
+    CORS(app, resources={r"/api/*": {"origins": allowed_origins}})
+    
+    # 注册蓝图
+    from app.api import stock_bp, analysis_bp
+    app.register_blueprint(stock_bp, url_prefix='/api/stock')
+    app.register_blueprint(analysis_bp, url_prefix='/api/analysis')
+    
+    # 创建数据库表
+    with app.app_context():
+        db.create_all()
+    
+    # 跨进程共享缓存与日线列式副本：按当前配置启用或关闭
+    from app.utils.shared_cache import init_shared_cache
+    from app.services.columnar_store import columnar_store
+    init_shared_cache(app)
+    columnar_store.init_app(app)
+    
+    # 分析缓存：补建索引并启动后台写回线程
+    from app.services.cache_service import cache_service
+    cache_service.init_app(app)
+    
+    # 分析缓存：后台清理过期行并控制容量
+    from app.services.cache_sweeper import cache_sweeper
+    cache_sweeper.init_app(app)
+    
+    # 健康检查路由
+    @app.route('/api/health')
+    def health_check():
+        from app.services.upstream import rate_limit_stats, upstream_stats
+        from app.utils.shared_cache import get_shared_cache
+        from app.utils.ttl_cache import cache_stats
+        shared = get_shared_cache()
+        return {
+            'status': 'ok',
+            'message': '丐版量化交易系统运行中',
+            'caches': cache_stats(),
+            'shared_cache': shared.get_stats() if shared is not None else None,
+            'upstreams': upstream_stats(),
+            'rate_limits': rate_limit_stats()
+        }
+    
+    return app
+
+
+def _init_sqlite(app):
+    """为数据库引擎注册 connect 事件：每个新建的 SQLite 连接执行配置中的 PRAGMA"""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if not pragmas:
+        return
+    
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
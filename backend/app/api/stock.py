@@ -1,146 +1,248 @@
-"""
-股票相关API
-"""
-from flask import Blueprint, request, jsonify
-from app.services.data_service import data_service
-from app.models.stock import Stock, StockDaily
-from app import db
-
-stock_bp = Blueprint('stock', __name__)
-
-
-@stock_bp.route('/<code>', methods=['GET'])
-def get_stock_info(code: str):
-    """
-    获取股票基本信息
-    
-    GET /api/stock/000001
-    """
-    try:
-        info = data_service.get_stock_info(code)
-        if not info:
-            return jsonify({
-                'code': 404,
-                'message': f'未找到股票 {code}',
-                'data': None
-            }), 404
-        
-        # 获取实时行情
-        realtime = data_service.get_realtime_quote(code)
-        if realtime:
-            info['current_price'] = realtime['current_price']
-            info['change_pct'] = realtime['change_pct']
-            info['volume'] = realtime['volume']
-            info['amount'] = realtime['amount']
-        
-        return jsonify({
-            'code': 200,
-            'message': 'success',
-            'data': info
-        })
-    except Exception as e:
-        return jsonify({
-            'code': 500,
-            'message': f'获取股票信息失败: {str(e)}',
-            'data': None
-        }), 500
-
-
-@stock_bp.route('/<code>/daily', methods=['GET'])
-def get_stock_daily(code: str):
-    """
-    获取股票日线数据
-    
-    GET /api/stock/000001/daily?days=60
-    """
-    try:
-        days = request.args.get('days', 60, type=int)
-        days = min(max(days, 1), 250)  # 限制范围1-250
-        
-        daily_data = data_service.get_daily_data(code, days)
-        if not daily_data:
-            return jsonify({
-                'code': 404,
-                'message': f'未找到股票 {code} 的日线数据',
-                'data': None
-            }), 404
-        
-        return jsonify({
-            'code': 200,
-            'message': 'success',
-            'data': {
-                'code': code,
-                'days': len(daily_data),
-                'daily': daily_data
-            }
-        })
-    except Exception as e:
-        return jsonify({
-            'code': 500,
-            'message': f'获取日线数据失败: {str(e)}',
-            'data': None
-        }), 500
-
-
-@stock_bp.route('/<code>/technical', methods=['GET'])
-def get_technical_indicators(code: str):
-    """
-    获取股票技术指标
-    
-    GET /api/stock/000001/technical
-    """
-    try:
-        indicators = data_service.get_technical_indicators(code)
-        if not indicators:
-            return jsonify({
-                'code': 404,
-                'message': f'无法计算股票 {code} 的技术指标',
-                'data': None
-            }), 404
-        
-        return jsonify({
-            'code': 200,
-            'message': 'success',
-            'data': {
-                'code': code,
-                'indicators': indicators
-            }
-        })
-    except Exception as e:
-        return jsonify({
-            'code': 500,
-            'message': f'获取技术指标失败: {str(e)}',
-            'data': None
-        }), 500
-
-
-@stock_bp.route('/<code>/fund-flow', methods=['GET'])
-def get_fund_flow(code: str):
-    """
-    获取资金流向
-    
-    GET /api/stock/000001/fund-flow
-    """
-    try:
-        fund_flow = data_service.get_fund_flow(code)
-        if not fund_flow:
-            return jsonify({
-                'code': 404,
-                'message': f'无法获取股票 {code} 的资金流向',
-                'data': None
-            }), 404
-        
-        return jsonify({
-            'code': 200,
-            'message': 'success',
-            'data': {
-                'code': code,
-                'fund_flow': fund_flow
-            }
-        })
-    except Exception as e:
-        return jsonify({
-            'code': 500,
-            'message': f'获取资金流向失败: {str(e)}',
-            'data': None
-        }), 500
+"""
+股票相关API
+"""
+from flask import Blueprint, request, jsonify
+from app.services.data_service import data_service
+from app.utils.circuit_breaker import CircuitOpenError
+from app.api.analysis import validate_stock_code
+from app.models.stock import Stock, StockDaily
+from app import db
+
+stock_bp = Blueprint('stock', __name__)
+
+# 批量行情单次请求的最大股票数
+MAX_QUOTE_CODES = 200
+
+
+def _upstream_unavailable(e: CircuitOpenError):
+    """上游熔断中：返回503，提示稍后重试"""
+    response = jsonify({
+        'code': 503,
+        'message': str(e),
+        'data': None
+    })
+    if e.retry_after > 0:
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+    return response, 503
+
+
+@stock_bp.route('/quotes', methods=['GET'])
+def get_quotes():
+    """
+    批量获取实时行情（共用同一份全市场快照，一次往返）
+    
+    GET /api/stock/quotes?codes=000001,600000,300750
+    """
+    try:
+        raw_codes = [c for c in request.args.get('codes', '').split(',') if c.strip()]
+        if not raw_codes:
+            return jsonify({
+                'code': 400,
+                'message': '请提供股票代码列表，如 codes=000001,600000',
+                'data': None
+            }), 400
+        
+        if len(raw_codes) > MAX_QUOTE_CODES:
+            return jsonify({
+                'code': 400,
+                'message': f'单次最多查询 {MAX_QUOTE_CODES} 只股票',
+                'data': None
+            }), 400
+        
+        codes = []
+        invalid = []
+        for raw in raw_codes:
+            is_valid, cleaned_code, _ = validate_stock_code(raw)
+            if not is_valid:
+                invalid.append(raw.strip())
+            elif cleaned_code not in codes:
+                codes.append(cleaned_code)
+        
+        quotes = data_service.get_realtime_quotes(codes)
+        
+        return jsonify({
+            'code': 200,
+            'message': 'success',
+            'data': {
+                'quotes': quotes,
+                'missing': [c for c in codes if c not in quotes],
+                'invalid': invalid
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'批量获取行情失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+
+@stock_bp.route('/<code>', methods=['GET'])
+def get_stock_info(code: str):
+    """
+    获取股票基本信息
+    
+    GET /api/stock/000001
+    """
+    try:
+        info = data_service.get_stock_info(code)
+        if not info:
+            return jsonify({
+                'code': 404,
+                'message': f'未找到股票 {code}',
+                'data': None
+            }), 404
+        
+        # 获取实时行情（基本信息可能被并发请求共享，复制后再补充）
+        info = dict(info)
+        realtime = data_service.get_realtime_quote(code)
+        if realtime:
+            info['current_price'] = realtime['current_price']
+            info['change_pct'] = realtime['change_pct']
+            info['volume'] = realtime['volume']
+            info['amount'] = realtime['amount']
+        
+        return jsonify({
+            'code': 200,
+            'message': 'success',
+            'data': info
+        })
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取股票信息失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@stock_bp.route('/<code>/daily', methods=['GET'])
+def get_stock_daily(code: str):
+    """
+    获取股票日线数据
+    
+    GET /api/stock/000001/daily?days=60
+    """
+    try:
+        days = request.args.get('days', 60, type=int)
+        days = min(max(days, 1), 250)  # 限制范围1-250
+        
+        daily_data = data_service.get_daily_data(code, days)
+        if not daily_data:
+            return jsonify({
+                'code': 404,
+                'message': f'未找到股票 {code} 的日线数据',
+                'data': None
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'message': 'success',
+            'data': {
+                'code': code,
+                'days': len(daily_data),
+                'daily': daily_data
+            }
+        })
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取日线数据失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@stock_bp.route('/<code>/technical', methods=['GET'])
+def get_technical_indicators(code: str):
+    """
+    获取股票技术指标
+    
+    GET /api/stock/000001/technical
+    GET /api/stock/000001/technical?series=1&days=120  // 返回完整指标序列（绘图用）
+    GET /api/stock/000001/technical?live=1  // 盘中用实时报价试算当日指标
+    """
+    try:
+        if request.args.get('series', 0, type=int):
+            days = request.args.get('days', 120, type=int)
+            days = min(max(days, 1), 250)  # 限制范围1-250
+            
+            series = data_service.get_technical_series(code, days)
+            if not series:
+                return jsonify({
+                    'code': 404,
+                    'message': f'无法计算股票 {code} 的技术指标',
+                    'data': None
+                }), 404
+            
+            return jsonify({
+                'code': 200,
+                'message': 'success',
+                'data': {
+                    'code': code,
+                    'series': series
+                }
+            })
+        
+        live = bool(request.args.get('live', 0, type=int))
+        indicators = data_service.get_technical_indicators(code, live=live)
+        if not indicators:
+            return jsonify({
+                'code': 404,
+                'message': f'无法计算股票 {code} 的技术指标',
+                'data': None
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'message': 'success',
+            'data': {
+                'code': code,
+                'indicators': indicators
+            }
+        })
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取技术指标失败: {str(e)}',
+            'data': None
+        }), 500
+
+
+@stock_bp.route('/<code>/fund-flow', methods=['GET'])
+def get_fund_flow(code: str):
+    """
+    获取资金流向
+    
+    GET /api/stock/000001/fund-flow
+    """
+    try:
+        fund_flow = data_service.get_fund_flow(code)
+        if not fund_flow:
+            return jsonify({
+                'code': 404,
+                'message': f'无法获取股票 {code} 的资金流向',
+                'data': None
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'message': 'success',
+            'data': {
+                'code': code,
+                'fund_flow': fund_flow
+            }
+        })
+    except CircuitOpenError as e:
+        return _upstream_unavailable(e)
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取资金流向失败: {str(e)}',
+            'data': None
+        }), 500
@@ -1,77 +1,165 @@
-"""
-配置管理模块
-
-云端LLM配置：通过环境变量
-局域网LLM配置：通过配置文件
-"""
-import os
-import json
-from pathlib import Path
-
-
-def load_json_config(config_path: str) -> dict:
-    """加载JSON配置文件"""
-    full_path = Path(__file__).parent.parent / config_path
-    if full_path.exists():
-        with open(full_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-
-class BaseConfig:
-    """基础配置"""
-    # Flask配置 - SECRET_KEY安全处理
-    SECRET_KEY = os.environ.get('SECRET_KEY')
-    if not SECRET_KEY:
-        import secrets
-        SECRET_KEY = secrets.token_hex(32)  # 开发环境生成随机密钥
-    
-    # 数据库配置
-    BASE_DIR = Path(__file__).parent.parent.parent
-    SQLALCHEMY_DATABASE_URI = f'sqlite:///{BASE_DIR / "data" / "quant.db"}'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
-    # 云端LLM配置 - 从环境变量读取
-    CLOUD_LLM_API_KEY = os.environ.get('CLOUD_API_KEY', '')
-    CLOUD_LLM_BASE_URL = os.environ.get('CLOUD_BASE_URL', 'https://api.deepseek.com')
-    CLOUD_LLM_MODEL = os.environ.get('CLOUD_MODEL', 'deepseek-chat')
-    
-    # 备选云端LLM
-    MINIMAX_API_KEY = os.environ.get('MINIMAX_API_KEY', '')
-    KIMI_API_KEY = os.environ.get('KIMI_API_KEY', '')
-    
-    # 局域网LLM配置 - 从配置文件读取
-    LOCAL_LLM_CONFIG = load_json_config('config/llm_config.json')
-    
-    # 缓存配置
-    CACHE_CONFIG = LOCAL_LLM_CONFIG.get('cache', {
-        'memory_cache_size': 1000,
-        'memory_cache_ttl': 300
-    })
-
-
-class DevelopmentConfig(BaseConfig):
-    """开发环境配置"""
-    DEBUG = True
-    TESTING = False
-
-
-class ProductionConfig(BaseConfig):
-    """生产环境配置"""
-    DEBUG = False
-    TESTING = False
-
-
-class TestingConfig(BaseConfig):
-    """测试环境配置"""
-    DEBUG = True
-    TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
-
-
-config = {
-    'development': DevelopmentConfig,
-    'production': ProductionConfig,
-    'testing': TestingConfig,
-    'default': DevelopmentConfig
-}
+"""
+配置管理模块
+
+云端LLM配置：通过环境变量
+局域网LLM配置：通过配置文件
+"""
+import os
+import json
+from pathlib import Path
+
+from sqlalchemy.pool import StaticPool
+
+
+def load_json_config(config_path: str) -> dict:
+    """加载JSON配置文件"""
+    full_path = Path(__file__).parent.parent / config_path
+    if full_path.exists():
+        with open(full_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+class BaseConfig:
+    """基础配置"""
+    # Flask配置 - SECRET_KEY安全处理
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    if not SECRET_KEY:
+        import secrets
+        SECRET_KEY = secrets.token_hex(32)  # 开发环境生成随机密钥
+    
+    # 数据库配置
+    BASE_DIR = Path(__file__).parent.parent.parent
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{BASE_DIR / "data" / "quant.db"}'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # SQLite 性能配置：每个新连接执行的 PRAGMA（见 app._init_sqlite）
+    # WAL 让读写互不阻塞，synchronous=NORMAL 在 WAL 下每次提交不再 fsync，
+    # busy_timeout 让并发写入排队等待而不是立即报 database is locked；
+    # auto_vacuum 只在建表前生效（必须排在 journal_mode 之前），新库因此可以增量回收空间
+    SQLITE_PRAGMAS = {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,              # 毫秒
+        'cache_size': -65536,              # 负数单位为KB，即64MB页缓存
+        'mmap_size': 256 * 1024 * 1024,    # 读取走内存映射
+        'temp_store': 'MEMORY'
+    }
+    
+    # 连接池：线程化部署时每个线程可持有一个连接，另留余量给后台线程
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'connect_args': {'check_same_thread': False, 'timeout': 5}
+    }
+    
+    # 云端LLM配置 - 从环境变量读取
+    CLOUD_LLM_API_KEY = os.environ.get('CLOUD_API_KEY', '')
+    CLOUD_LLM_BASE_URL = os.environ.get('CLOUD_BASE_URL', 'https://api.deepseek.com')
+    CLOUD_LLM_MODEL = os.environ.get('CLOUD_MODEL', 'deepseek-chat')
+    
+    # 备选云端LLM
+    MINIMAX_API_KEY = os.environ.get('MINIMAX_API_KEY', '')
+    KIMI_API_KEY = os.environ.get('KIMI_API_KEY', '')
+    
+    # 局域网LLM配置 - 从配置文件读取
+    LOCAL_LLM_CONFIG = load_json_config('config/llm_config.json')
+    
+    # 缓存配置
+    CACHE_CONFIG = LOCAL_LLM_CONFIG.get('cache', {
+        'memory_cache_size': 1000,
+        'memory_cache_ttl': 300
+    })
+    
+    # 数据获取并发配置（诊断前并发拉取各项数据）
+    DATA_FETCH_CONFIG = LOCAL_LLM_CONFIG.get('data_fetch', {
+        'max_workers': 8,
+        'timeout': 20,
+        'timeouts': {'daily_data': 60}
+    })
+    
+    # LLM传输层配置（按后端覆盖连接池与并发上限，见 llm_transport.DEFAULT_TRANSPORT_CONFIG）
+    LLM_TRANSPORT_CONFIG = LOCAL_LLM_CONFIG.get('llm_transport', {})
+    
+    # 批量诊断配置（自选股一次诊断多只，未命中缓存的按并发上限调用LLM）
+    BATCH_DIAGNOSE_CONFIG = LOCAL_LLM_CONFIG.get('batch_diagnose', {
+        'max_codes': 50,
+        'max_workers': 8,
+        'fetch_workers': 32,
+        'llm_concurrency': 3
+    })
+    
+    # 数据缓存配置（按函数名覆盖 ttl / max_entries / max_bytes，见 utils.ttl_cache.cached）
+    DATA_CACHE_CONFIG = LOCAL_LLM_CONFIG.get('data_cache', {})
+    
+    # AKShare上游熔断配置（default 为默认值，spot/hist/info/fund_flow 可单独覆盖）
+    CIRCUIT_BREAKER_CONFIG = LOCAL_LLM_CONFIG.get('circuit_breaker', {})
+    
+    # 出站频率限制（令牌桶，按上游配置 rate 每秒令牌数 / burst 突发容量；
+    # backend=sqlite 时桶状态存于本地文件，多个服务进程共享）
+    RATE_LIMIT_CONFIG = LOCAL_LLM_CONFIG.get('rate_limit', {})
+    
+    # 跨进程共享缓存（SQLite WAL，默认 data/shared_cache.db；多 worker 部署时
+    # 数据缓存、行情快照和分析结果L1由所有进程共用；create_app 时按当前配置类生效）
+    SHARED_CACHE_CONFIG = LOCAL_LLM_CONFIG.get('shared_cache', {})
+    
+    # 日线列式副本（每只股票一个内存映射的 .npy 文件，默认目录 data/bars；create_app 时按当前配置类生效）
+    COLUMNAR_STORE_CONFIG = LOCAL_LLM_CONFIG.get('columnar_store', {})
+    
+    # 交易日历配置（交易时段内用短TTL，休市期间缓存保持到下一次开盘）
+    TRADING_CALENDAR_CONFIG = LOCAL_LLM_CONFIG.get('trading_calendar', {
+        'timezone': 'Asia/Shanghai',
+        'sessions': [['09:30', '11:30'], ['13:00', '15:00']],
+        'settle_minutes': 5,
+        'refresh_days': 7
+    })
+
+
+class DevelopmentConfig(BaseConfig):
+    """开发环境配置"""
+    DEBUG = True
+    TESTING = False
+
+
+class ProductionConfig(BaseConfig):
+    """生产环境配置"""
+    DEBUG = False
+    TESTING = False
+    
+    # 连接池按每个 worker 的线程数（WEB_THREADS）放大
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        **BaseConfig.SQLALCHEMY_ENGINE_OPTIONS,
+        'pool_size': int(os.environ.get('WEB_THREADS', 8)) + 4,
+        'pool_recycle': 3600
+    }
+
+
+class TestingConfig(BaseConfig):
+    """测试环境配置"""
+    DEBUG = True
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    
+    # 内存库只有一个连接：所有线程（含后台写回线程）共用，否则各自看到空库
+    SQLITE_PRAGMAS = {
+        'synchronous': 'OFF',
+        'temp_store': 'MEMORY'
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False}
+    }
+    
+    # 测试不读写 data/ 下的持久文件，避免各次运行之间互相影响
+    SHARED_CACHE_CONFIG = {'enabled': False}
+    COLUMNAR_STORE_CONFIG = {'enabled': False}
+
+
+config = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+    'default': DevelopmentConfig
+}
@@ -1,7 +1,7 @@
-"""
-数据库模型模块
-"""
-from app.models.stock import Stock, StockDaily
-from app.models.analysis import AnalysisCache, UserOperation
-
-__all__ = ['Stock', 'StockDaily', 'AnalysisCache', 'UserOperation']
+"""
+数据库模型模块
+"""
+from app.models.stock import Stock, StockDaily
+from app.models.analysis import AnalysisCache, UserOperation
+
+__all__ = ['Stock', 'StockDaily', 'AnalysisCache', 'UserOperation']
@@ -1,10 +1,10 @@
-"""
-服务层模块
-"""
-from app.services.data_service import DataService
-from app.services.llm_service import LLMService
-from app.services.cache_service import CacheService
-from app.services.local_llm import LocalLLM
-from app.services.cloud_llm import CloudLLM
-
-__all__ = ['DataService', 'LLMService', 'CacheService', 'LocalLLM', 'CloudLLM']
+"""
+服务层模块
+"""
+from app.services.data_service import DataService
+from app.services.llm_service import LLMService
+from app.services.cache_service import CacheService
+from app.services.local_llm import LocalLLM
+from app.services.cloud_llm import CloudLLM
+
+__all__ = ['DataService', 'LLMService', 'CacheService', 'LocalLLM', 'CloudLLM']
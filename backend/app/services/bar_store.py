@@ -0,0 +1,345 @@
+"""
+日线数据本地存储 - 以 stock_daily 表作为读穿缓存
+
+首次请求某只股票时全量回填历史日线，之后只向AKShare请求
+最后两个已存交易日起的数据并追加，避免每次都下载全部历史。
+休市期间日线不会变化，同步后保持到下一次开盘才再次检查上游。
+
+每次写入同时更新列式副本（columnar_store，每只股票一个内存映射的 .npy 文件），
+读取优先走列式副本，直接得到连续的 float64 数组；副本缺失时回退到 stock_daily 表并重建。
+"""
+import akshare as ak
+import numpy as np
+import pandas as pd
+import logging
+import time
+from datetime import date
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.models.stock import StockDaily
+from app.services.columnar_store import columnar_store
+from app.services.trading_calendar import trading_calendar
+from app.services.upstream import call_upstream
+
+logger = logging.getLogger(__name__)
+
+# AKShare日线列名 -> stock_daily字段
+HIST_COLUMNS = {
+    '日期': 'trade_date',
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '涨跌幅': 'change_pct',
+    '换手率': 'turnover'
+}
+
+# 行情字段（不含代码和日期）
+BAR_FIELDS = ['open', 'close', 'high', 'low', 'volume', 'amount', 'change_pct', 'turnover']
+
+
+class BarStore:
+    """日线数据读穿存储"""
+
+    def __init__(self, sync_interval: int = 60):
+        """
+        Args:
+            sync_interval: 交易时段内同一股票两次增量同步的最小间隔（秒）
+        """
+        self.sync_interval = sync_interval
+        # 代码 -> 下次需要检查上游的时间戳
+        self._synced_until: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def get_bars(self, code: str, days: int = 60) -> List[Dict]:
+        """
+        获取最近N个交易日的日线（必要时先增量同步）
+
+        Args:
+            code: 股票代码
+            days: 获取天数
+
+        Returns:
+            日线数据列表（按日期升序）
+        """
+        return self.get_frame(code, days).to_dict('records')
+
+    def get_frame(self, code: str, days: int = 60) -> pd.DataFrame:
+        """
+        获取最近N个交易日的日线（列式DataFrame，必要时先增量同步）
+
+        Args:
+            code: 股票代码
+            days: 获取天数
+
+        Returns:
+            日线DataFrame（按日期升序，trade_date为ISO日期字符串）
+        """
+        try:
+            self.sync(code)
+        except Exception as e:
+            if self._last_trade_date(code) is None:
+                raise
+            # 本地已有数据，同步失败时退化为只读本地
+            logger.warning(f"日线增量同步失败，使用本地数据 [{code}]: {e}")
+
+        return self._load(code, days)
+
+    def sync(self, code: str, force: bool = False) -> int:
+        """
+        同步单只股票的日线到本地
+
+        Args:
+            code: 股票代码
+            force: 忽略同步间隔和交易时段，强制检查上游
+
+        Returns:
+            写入（含更新）的行数
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now < self._synced_until.get(code, 0):
+                return 0
+
+        last_date = self._last_trade_date(code)
+        if last_date is None:
+            written = self._backfill(code)
+        else:
+            written = self._append(code, last_date)
+
+        with self._lock:
+            self._synced_until[code] = now + trading_calendar.ttl(self.sync_interval)
+        return written
+
+    def get_local_frames(self, codes: List[str], days: int = 60) -> Dict[str, pd.DataFrame]:
+        """
+        批量读取多只股票最近N个交易日（只读本地，不同步上游）
+
+        Args:
+            codes: 股票代码列表
+            days: 每只股票的天数
+
+        Returns:
+            {股票代码: 日线DataFrame}，本地无数据的股票不包含在结果中
+        """
+        frames = {}
+        missing = []
+        for code in codes:
+            df = columnar_store.load_frame(code, days)
+            if df is not None and not df.empty:
+                frames[code] = df
+            else:
+                missing.append(code)
+        frames.update(self._load_db_many(missing, days))
+        return frames
+
+    def load_matrix(self, codes: Sequence[str], fields: Sequence[str],
+                    days: int = 60) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        批量读取多只股票的若干字段为右对齐矩阵（只读本地，不同步上游）
+
+        列式副本中的股票直接从内存映射文件拼出矩阵，其余从 stock_daily 表补齐。
+
+        Args:
+            codes: 股票代码列表
+            fields: 字段列表，如 ('close', 'high', 'low')
+            days: 矩阵列数
+
+        Returns:
+            (有数据的股票代码（保持传入顺序）, {字段: (股票数, days) 的float64矩阵})
+        """
+        found, matrices = columnar_store.load_matrix(codes, fields, days)
+        present = set(found)
+        frames = self._load_db_many([code for code in codes if code not in present], days)
+        if not frames:
+            return found, matrices
+
+        order = [code for code in codes if code in present or code in frames]
+        rows = {code: i for i, code in enumerate(found)}
+        result = {}
+        for field in fields:
+            matrix = np.full((len(order), days), np.nan)
+            for i, code in enumerate(order):
+                if code in rows:
+                    matrix[i] = matrices[field][rows[code]]
+                else:
+                    values = frames[code][field].to_numpy(dtype=np.float64)[-days:]
+                    matrix[i, days - len(values):] = values
+            result[field] = matrix
+        return order, result
+
+    def rebuild_columnar(self, code: str) -> int:
+        """
+        从 stock_daily 表全量重建某只股票的列式副本
+
+        Returns:
+            写入的天数
+        """
+        df = self._load_db(code, None)
+        columnar_store.write(code, df)
+        return len(df)
+
+    def _backfill(self, code: str, replace: bool = False) -> int:
+        """全量回填历史日线"""
+        df = self._fetch(code)
+        if replace:
+            StockDaily.query.filter_by(code=code).delete()
+        written = self._upsert(code, df)
+        if replace:
+            self.rebuild_columnar(code)
+        else:
+            self._write_through(code, df)
+        logger.info(f"日线全量回填完成 [{code}]: {written} 行")
+        return written
+
+    def _append(self, code: str, last_date: date) -> int:
+        """
+        从倒数第二个已存交易日开始增量拉取
+
+        最后一个已存交易日可能是盘中未收盘的K线，收盘价随时变化，直接覆盖更新；
+        除权除息检查放在倒数第二天（已收盘的K线）上：前复权价格与本地不一致时整体重新回填。
+        """
+        check_date = self._previous_trade_date(code, last_date)
+        df = self._fetch(code, start_date=check_date or last_date)
+        if df.empty:
+            return 0
+
+        if check_date is not None:
+            overlap = df[df['trade_date'] == check_date]
+            if not overlap.empty:
+                stored = StockDaily.query.filter_by(code=code, trade_date=check_date).first()
+                if stored and abs(float(overlap['close'].iloc[0]) - stored.close) > 1e-6:
+                    logger.info(f"检测到复权价格变化，重新回填 [{code}]")
+                    return self._backfill(code, replace=True)
+
+        written = self._upsert(code, df)
+        self._write_through(code, df)
+        return written
+
+    def _fetch(self, code: str, start_date: Optional[date] = None) -> pd.DataFrame:
+        """从AKShare拉取前复权日线（经 hist 熔断器），并转换为stock_daily字段"""
+        kwargs = {'symbol': code, 'period': 'daily', 'adjust': 'qfq'}
+        if start_date is not None:
+            kwargs['start_date'] = start_date.strftime('%Y%m%d')
+            kwargs['end_date'] = '20500101'
+
+        df = call_upstream('hist', ak.stock_zh_a_hist, **kwargs)
+        if df is None or df.empty:
+            return pd.DataFrame(columns=['trade_date'] + BAR_FIELDS)
+
+        df = df.rename(columns=HIST_COLUMNS)[['trade_date'] + BAR_FIELDS]
+        df['trade_date'] = pd.to_datetime(df['trade_date']).dt.date
+        df['turnover'] = df['turnover'].fillna(0)
+        return df
+
+    def _upsert(self, code: str, df: pd.DataFrame) -> int:
+        """按 (code, trade_date) 批量写入，已存在则更新"""
+        if df.empty:
+            db.session.commit()
+            return 0
+
+        rows = df.astype({f: float for f in BAR_FIELDS}).to_dict('records')
+        for row in rows:
+            row['code'] = code
+
+        stmt = sqlite_insert(StockDaily)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['code', 'trade_date'],
+            set_={f: stmt.excluded[f] for f in BAR_FIELDS}
+        )
+        try:
+            db.session.execute(stmt, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(rows)
+
+    def _write_through(self, code: str, df: pd.DataFrame):
+        """
+        将刚写入表中的日线合并到列式副本
+
+        副本缺失，或合并后的天数与表中行数不一致（如多个进程同时合并同一文件
+        丢失了更新）时，从表全量重建。副本写入失败不影响表中的数据。
+        """
+        if not columnar_store.enabled:
+            return
+        try:
+            merged = columnar_store.merge(code, df)
+            if merged is None or merged != StockDaily.query.filter_by(code=code).count():
+                self.rebuild_columnar(code)
+        except Exception as e:
+            logger.warning(f"更新列式日线失败 [{code}]: {e}")
+
+    def _last_trade_date(self, code: str) -> Optional[date]:
+        """本地最后一个交易日"""
+        return db.session.query(db.func.max(StockDaily.trade_date)).filter(
+            StockDaily.code == code
+        ).scalar()
+
+    def _previous_trade_date(self, code: str, before: date) -> Optional[date]:
+        """本地 before 之前的最后一个交易日"""
+        return db.session.query(db.func.max(StockDaily.trade_date)).filter(
+            StockDaily.code == code,
+            StockDaily.trade_date < before
+        ).scalar()
+
+    def _load(self, code: str, days: int) -> pd.DataFrame:
+        """读取本地最近N个交易日（优先列式副本，缺失时读表并重建副本）"""
+        df = columnar_store.load_frame(code, days)
+        if df is not None:
+            return df
+
+        df = self._load_db(code, days)
+        if not df.empty and columnar_store.enabled:
+            try:
+                self.rebuild_columnar(code)
+            except Exception as e:
+                logger.warning(f"重建列式日线失败 [{code}]: {e}")
+        return df
+
+    def _load_db(self, code: str, days: Optional[int]) -> pd.DataFrame:
+        """从表中读取最近N个交易日（按列构建，不经过ORM对象；days为None时读取全部）"""
+        columns = [StockDaily.trade_date] + [getattr(StockDaily, f) for f in BAR_FIELDS]
+        rows = db.session.execute(
+            db.select(*columns).where(StockDaily.code == code)
+            .order_by(StockDaily.trade_date.desc()).limit(days)
+        ).all()
+
+        df = pd.DataFrame.from_records(rows[::-1], columns=['trade_date'] + BAR_FIELDS)
+        df['trade_date'] = [d.isoformat() for d in df['trade_date']]
+        return df
+
+    def _load_db_many(self, codes: List[str], days: int) -> Dict[str, pd.DataFrame]:
+        """从表中批量读取多只股票最近N个交易日"""
+        if not codes:
+            return {}
+
+        # 窗口函数在一次查询内为每只股票取最近N行
+        row_number = db.func.row_number().over(
+            partition_by=StockDaily.code,
+            order_by=StockDaily.trade_date.desc()
+        ).label('rn')
+        columns = [StockDaily.code, StockDaily.trade_date] + [getattr(StockDaily, f) for f in BAR_FIELDS]
+        ranked = db.select(*columns, row_number).where(StockDaily.code.in_(codes)).subquery()
+        rows = db.session.execute(
+            db.select(*[c for c in ranked.c if c.name != 'rn'])
+            .where(ranked.c.rn <= days)
+            .order_by(ranked.c.code, ranked.c.trade_date)
+        ).all()
+
+        df = pd.DataFrame.from_records(rows, columns=['code', 'trade_date'] + BAR_FIELDS)
+        df['trade_date'] = [d.isoformat() for d in df['trade_date']]
+        return {
+            code: group.drop(columns='code').reset_index(drop=True)
+            for code, group in df.groupby('code', sort=False)
+        }
+
+
+# 单例
+bar_store = BarStore()
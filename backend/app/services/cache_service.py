@@ -1,225 +1,448 @@
-"""
-缓存服务 - 两级缓存策略
-L1: 内存缓存 (cachetools.TTLCache)
-L2: SQLite数据库 (analysis_cache表)
-"""
-from cachetools import TTLCache
-from hashlib import md5
-from datetime import datetime, timedelta
-from typing import Optional
-import json
-
-
-class CacheService:
-    """缓存服务"""
-    
-    def __init__(self):
-        # 从配置加载缓存参数
-        try:
-            from app.config import BaseConfig
-            cache_config = BaseConfig.CACHE_CONFIG
-        except:
-            cache_config = {}
-        
-        # L1: 内存缓存
-        self.memory_cache = TTLCache(
-            maxsize=cache_config.get('memory_cache_size', 1000),
-            ttl=cache_config.get('memory_cache_ttl', 300)  # 5分钟
-        )
-        
-        # 缓存过期配置
-        self.daily_expire_hour = cache_config.get('daily_expire_hour', 15)
-        self.daily_expire_minute = cache_config.get('daily_expire_minute', 30)
-        self.weekly_expire_day = cache_config.get('weekly_expire_day', 6)  # 周日
-        self.longterm_expire_days = cache_config.get('longterm_expire_days', 7)
-    
-    def _make_key(self, code: str, analysis_type: str, data_hash: str) -> str:
-        """生成缓存键"""
-        return f"{code}:{analysis_type}:{data_hash}"
-    
-    def make_data_hash(self, close_price: float, volume: float, date: str) -> str:
-        """
-        生成数据指纹，用于判断缓存是否有效
-        
-        Args:
-            close_price: 最新收盘价
-            volume: 最新成交量
-            date: 日期
-            
-        Returns:
-            数据指纹(MD5)
-        """
-        data_str = f"{close_price}:{volume}:{date}"
-        return md5(data_str.encode()).hexdigest()[:16]
-    
-    def get(self, code: str, analysis_type: str, data_hash: str) -> Optional[dict]:
-        """
-        获取缓存
-        
-        Args:
-            code: 股票代码
-            analysis_type: 分析类型
-            data_hash: 数据指纹
-            
-        Returns:
-            缓存的分析结果，未命中返回None
-        """
-        key = self._make_key(code, analysis_type, data_hash)
-        
-        # 先查L1内存缓存
-        if key in self.memory_cache:
-            return self.memory_cache[key]
-        
-        # 再查L2数据库缓存
-        cached = self._get_from_db(code, analysis_type, data_hash)
-        if cached:
-            # 回填L1缓存
-            self.memory_cache[key] = cached
-            return cached
-        
-        return None
-    
-    def set(self, code: str, analysis_type: str, data_hash: str, 
-            result: dict, prompt: str = None):
-        """
-        设置缓存
-        
-        Args:
-            code: 股票代码
-            analysis_type: 分析类型
-            data_hash: 数据指纹
-            result: 分析结果
-            prompt: 使用的Prompt
-        """
-        key = self._make_key(code, analysis_type, data_hash)
-        
-        # 设置L1
-        self.memory_cache[key] = result
-        
-        # 设置L2
-        expires_at = self._calc_expiry(analysis_type)
-        self._save_to_db(code, analysis_type, data_hash, result, prompt, expires_at)
-    
-    def invalidate(self, code: str, analysis_type: str = None):
-        """
-        清除指定股票的缓存
-        
-        Args:
-            code: 股票代码
-            analysis_type: 分析类型（可选，不传则清除所有类型）
-        """
-        # 清除L1缓存
-        keys_to_remove = []
-        for key in self.memory_cache.keys():
-            if key.startswith(f"{code}:"):
-                if analysis_type is None or key.startswith(f"{code}:{analysis_type}:"):
-                    keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self.memory_cache[key]
-        
-        # 清除L2缓存
-        self._delete_from_db(code, analysis_type)
-    
-    def _calc_expiry(self, analysis_type: str) -> datetime:
-        """
-        计算过期时间
-        
-        Args:
-            analysis_type: 分析类型
-            
-        Returns:
-            过期时间
-        """
-        now = datetime.now()
-        
-        if analysis_type == 'daily':
-            # 当日收盘后过期（15:30）
-            expiry = now.replace(
-                hour=self.daily_expire_hour, 
-                minute=self.daily_expire_minute, 
-                second=0, 
-                microsecond=0
-            )
-            if now >= expiry:
-                # 已过收盘时间，设置为明天
-                expiry += timedelta(days=1)
-            return expiry
-        
-        elif analysis_type == 'weekly':
-            # 本周日过期
-            days_until_expire = self.weekly_expire_day - now.weekday()
-            if days_until_expire <= 0:
-                days_until_expire += 7
-            return now + timedelta(days=days_until_expire)
-        
-        else:
-            # 长线分析7天后过期
-            return now + timedelta(days=self.longterm_expire_days)
-    
-    def _get_from_db(self, code: str, analysis_type: str, data_hash: str) -> Optional[dict]:
-        """从数据库获取缓存"""
-        try:
-            from app import db
-            from app.models.analysis import AnalysisCache
-            
-            cached = AnalysisCache.query.filter_by(
-                code=code,
-                analysis_type=analysis_type,
-                data_hash=data_hash
-            ).first()
-            
-            if cached and not cached.is_expired():
-                return json.loads(cached.result)
-            
-            return None
-        except Exception as e:
-            print(f"从数据库获取缓存失败: {e}")
-            return None
-    
-    def _save_to_db(self, code: str, analysis_type: str, data_hash: str,
-                    result: dict, prompt: str, expires_at: datetime):
-        """保存缓存到数据库"""
-        try:
-            from app import db
-            from app.models.analysis import AnalysisCache
-            
-            # 先删除旧缓存
-            AnalysisCache.query.filter_by(
-                code=code,
-                analysis_type=analysis_type
-            ).delete()
-            
-            # 创建新缓存
-            cache = AnalysisCache(
-                code=code,
-                analysis_type=analysis_type,
-                data_hash=data_hash,
-                prompt=prompt,
-                result=json.dumps(result, ensure_ascii=False),
-                expires_at=expires_at
-            )
-            
-            db.session.add(cache)
-            db.session.commit()
-        except Exception as e:
-            print(f"保存缓存到数据库失败: {e}")
-    
-    def _delete_from_db(self, code: str, analysis_type: str = None):
-        """从数据库删除缓存"""
-        try:
-            from app import db
-            from app.models.analysis import AnalysisCache
-            
-            query = AnalysisCache.query.filter_by(code=code)
-            if analysis_type:
-                query = query.filter_by(analysis_type=analysis_type)
-            
-            query.delete()
-            db.session.commit()
-        except Exception as e:
-            print(f"从数据库删除缓存失败: {e}")
-
-
-# 单例
-cache_service = CacheService()
+"""
+缓存服务 - 两级缓存策略
+L1: 内存缓存 (cachetools.TTLCache)；启用跨进程共享缓存时改用共享层，
+    多 worker 部署下各进程看到同一份L1，失效也对所有进程同时生效
+L2: SQLite数据库 (analysis_cache表)
+
+L2写入走后台写回队列（write-behind）：请求线程只写L1并入队，
+后台线程按批 upsert 并在同一事务中删除同一 (code, analysis_type) 的旧指纹，
+SQLite 的提交/fsync 不再计入用户请求耗时。
+
+过期后的宽限期内 lookup 仍返回旧结果（STALE），临近过期时按 XFetch 概率
+提示提前刷新（EARLY），由调用方在后台重新生成，用户请求不必等待LLM。
+"""
+from cachetools import TTLCache
+from hashlib import md5
+from datetime import datetime, time as dtime, timedelta
+from typing import Iterable, List, Optional, Tuple
+import atexit
+import json
+import queue
+import threading
+import time
+
+from app.utils.shared_cache import get_shared_cache
+from app.utils.ttl_cache import EARLY, FRESH, MISS, STALE, should_refresh_early
+
+
+class CacheService:
+    """缓存服务"""
+    
+    def __init__(self):
+        # 从配置加载缓存参数
+        try:
+            from app.config import BaseConfig
+            cache_config = BaseConfig.CACHE_CONFIG
+        except:
+            cache_config = {}
+        
+        # L1: 内存缓存
+        self.memory_cache_ttl = cache_config.get('memory_cache_ttl', 300)  # 5分钟
+        self.memory_cache = TTLCache(
+            maxsize=cache_config.get('memory_cache_size', 1000),
+            ttl=self.memory_cache_ttl
+        )
+        # 跨进程共享的L1（init_app 时按应用配置确定；未启用时为None，使用进程内 memory_cache）
+        self.shared_l1 = cache_config.get('shared_l1', True)
+        self.shared = None
+        
+        # 缓存过期配置
+        self.daily_expire_hour = cache_config.get('daily_expire_hour', 15)
+        self.daily_expire_minute = cache_config.get('daily_expire_minute', 30)
+        self.weekly_expire_day = cache_config.get('weekly_expire_day', 6)  # 周日
+        self.longterm_expire_days = cache_config.get('longterm_expire_days', 7)
+        
+        # 过期后仍返回旧结果的宽限期（秒），以及 XFetch 提前刷新参数
+        # （delta 为重新生成一次分析的预估耗时）
+        self.stale_grace = cache_config.get('stale_grace', 3600)
+        self.early_refresh_delta = cache_config.get('early_refresh_delta', 30)
+        self.early_refresh_beta = cache_config.get('early_refresh_beta', 1.0)
+        
+        # L2写回队列配置（init_app 启动后台线程前，写入仍同步执行）
+        self.write_batch_size = cache_config.get('write_batch_size', 100)
+        self.write_flush_interval = cache_config.get('write_flush_interval', 0.5)
+        self._app = None
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+    
+    def init_app(self, app):
+        """
+        绑定Flask应用：确定L1是否使用共享缓存，确保复合唯一索引存在并启动后台写回线程
+        
+        Args:
+            app: Flask应用
+        """
+        self._app = app
+        self.shared = get_shared_cache() if self.shared_l1 else None
+        with app.app_context():
+            self._ensure_schema()
+        
+        if self._writer is None:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(
+                target=self._run_writer,
+                name='cache-write-behind',
+                daemon=True
+            )
+            self._writer.start()
+            atexit.register(self.shutdown)
+    
+    def flush(self, timeout: float = 10) -> bool:
+        """
+        等待写回队列中已有的写入全部落库
+        
+        Returns:
+            是否在超时前完成
+        """
+        if self._queue is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+    
+    def shutdown(self, timeout: float = 10):
+        """退出前落库剩余写入并停止后台线程"""
+        if self._writer is None:
+            return
+        self.flush(timeout)
+        self._queue.put(None)
+        self._writer.join(timeout)
+        self._writer = None
+        self._queue = None
+    
+    def _make_key(self, code: str, analysis_type: str, data_hash: str) -> str:
+        """生成缓存键"""
+        return f"{code}:{analysis_type}:{data_hash}"
+    
+    def make_data_hash(self, close_price: float, volume: float, date: str) -> str:
+        """
+        生成数据指纹，用于判断缓存是否有效
+        
+        Args:
+            close_price: 最新收盘价
+            volume: 最新成交量
+            date: 日期
+            
+        Returns:
+            数据指纹(MD5)
+        """
+        data_str = f"{close_price}:{volume}:{date}"
+        return md5(data_str.encode()).hexdigest()[:16]
+    
+    def get(self, code: str, analysis_type: str, data_hash: str) -> Optional[dict]:
+        """
+        获取缓存
+        
+        Args:
+            code: 股票代码
+            analysis_type: 分析类型
+            data_hash: 数据指纹
+            
+        Returns:
+            缓存的分析结果，未命中或已过期返回None
+        """
+        result, state = self.lookup(code, analysis_type, data_hash)
+        return result if state in (FRESH, EARLY) else None
+    
+    def lookup(self, code: str, analysis_type: str, data_hash: str) -> Tuple[Optional[dict], str]:
+        """
+        获取缓存及其状态（支持 stale-while-revalidate）
+        
+        Args:
+            code: 股票代码
+            analysis_type: 分析类型
+            data_hash: 数据指纹
+            
+        Returns:
+            (分析结果, 状态)：FRESH 有效；EARLY 有效但建议后台提前刷新；
+            STALE 已过期但在宽限期内；MISS 未命中（结果为None）
+        """
+        key = self._make_key(code, analysis_type, data_hash)
+        
+        # 先查L1内存缓存，再查L2数据库缓存
+        cached = self._l1_get(key)
+        if cached is None:
+            cached = self._get_from_db(code, analysis_type, data_hash)
+            if cached is None:
+                return None, MISS
+            # 回填L1缓存
+            self._l1_set(key, cached)
+        
+        result, expires_at = cached
+        now = time.time()
+        deadline = expires_at.timestamp()
+        if now >= deadline + self.stale_grace:
+            return None, MISS
+        
+        self._touch(code, analysis_type, data_hash)
+        if now >= deadline:
+            return result, STALE
+        if should_refresh_early(deadline, self.early_refresh_delta, self.early_refresh_beta, now):
+            return result, EARLY
+        return result, FRESH
+    
+    def set(self, code: str, analysis_type: str, data_hash: str, 
+            result: dict, prompt: str = None):
+        """
+        设置缓存
+        
+        Args:
+            code: 股票代码
+            analysis_type: 分析类型
+            data_hash: 数据指纹
+            result: 分析结果
+            prompt: 使用的Prompt
+        """
+        key = self._make_key(code, analysis_type, data_hash)
+        
+        # 设置L1
+        expires_at = self._calc_expiry(analysis_type)
+        self._l1_set(key, (result, expires_at))
+        
+        # 设置L2（有后台线程时入队异步写入）
+        entry = {
+            'code': code,
+            'analysis_type': analysis_type,
+            'data_hash': data_hash,
+            'prompt': prompt,
+            'result': json.dumps(result, ensure_ascii=False),
+            'created_at': datetime.now(),
+            'expires_at': expires_at
+        }
+        if self._queue is not None:
+            self._queue.put(entry)
+        else:
+            self._save_to_db([entry])
+    
+    def _touch(self, code: str, analysis_type: str, data_hash: str):
+        """记录命中时间（经写回队列批量更新 last_hit_at，供容量淘汰按LRU排序）"""
+        if self._queue is not None:
+            self._queue.put((code, analysis_type, data_hash))
+    
+    def invalidate(self, code: str, analysis_type: str = None):
+        """
+        清除指定股票的缓存
+        
+        Args:
+            code: 股票代码
+            analysis_type: 分析类型（可选，不传则清除所有类型）
+        """
+        # 清除L1缓存
+        prefix = f"{code}:" if analysis_type is None else f"{code}:{analysis_type}:"
+        if self.shared is not None:
+            self.shared.delete_prefix(f"analysis:{prefix}")
+        
+        keys_to_remove = [key for key in self.memory_cache.keys() if key.startswith(prefix)]
+        for key in keys_to_remove:
+            del self.memory_cache[key]
+        
+        # 清除L2缓存（先让排队中的写入落库，避免删除后又被写回）
+        self.flush()
+        self._delete_from_db(code, analysis_type)
+    
+    def _l1_get(self, key: str) -> Optional[Tuple[dict, datetime]]:
+        """读取L1（共享层或进程内）"""
+        if self.shared is not None:
+            item = self.shared.get(f"analysis:{key}")
+            return item[0] if item is not None else None
+        return self.memory_cache.get(key)
+    
+    def _l1_set(self, key: str, cached: Tuple[dict, datetime]):
+        """写入L1（共享层或进程内），L1条目按 memory_cache_ttl 过期"""
+        if self.shared is not None:
+            self.shared.set(f"analysis:{key}", cached, time.time() + self.memory_cache_ttl)
+        else:
+            self.memory_cache[key] = cached
+    
+    def _calc_expiry(self, analysis_type: str) -> datetime:
+        """
+        计算过期时间（按交易日历，休市期间不会过期）
+        
+        Args:
+            analysis_type: 分析类型
+            
+        Returns:
+            过期时间
+        """
+        from app.services.trading_calendar import trading_calendar
+        
+        now = datetime.now()
+        
+        if analysis_type == 'daily':
+            # 下一个交易日收盘后过期（15:30）；当日已收盘或非交易日时顺延
+            return trading_calendar.at_time_on_trading_day(
+                now, dtime(self.daily_expire_hour, self.daily_expire_minute)
+            )
+        
+        elif analysis_type == 'weekly':
+            # 本周日之后的第一次开盘时过期
+            days_until_expire = self.weekly_expire_day - now.weekday()
+            if days_until_expire <= 0:
+                days_until_expire += 7
+            week_end = (now + timedelta(days=days_until_expire)).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            return trading_calendar.hold_until_open(week_end)
+        
+        else:
+            # 长线分析7天后过期，落在休市期间时顺延到下一次开盘
+            return trading_calendar.hold_until_open(now + timedelta(days=self.longterm_expire_days))
+    
+    def _get_from_db(self, code: str, analysis_type: str, data_hash: str) -> Optional[Tuple[dict, datetime]]:
+        """从数据库获取缓存（含宽限期内的过期缓存），返回 (结果, 过期时间)"""
+        try:
+            from app import db
+            from app.models.analysis import AnalysisCache
+            
+            cached = AnalysisCache.query.filter_by(
+                code=code,
+                analysis_type=analysis_type,
+                data_hash=data_hash
+            ).first()
+            
+            if cached and cached.expires_at and datetime.now() < cached.expires_at + timedelta(seconds=self.stale_grace):
+                return json.loads(cached.result), cached.expires_at
+            
+            return None
+        except Exception as e:
+            print(f"从数据库获取缓存失败: {e}")
+            return None
+    
+    def _save_to_db(self, entries: List[dict], touches: Iterable[tuple] = ()):
+        """
+        批量写入缓存：按 (code, analysis_type, data_hash) upsert，
+        删除同一 (code, analysis_type) 下其他指纹的旧缓存，并更新命中时间，一次提交
+        """
+        try:
+            from app import db
+            from app.models.analysis import AnalysisCache
+            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+            
+            # 同一批内同一 (code, analysis_type) 只保留最后一次写入
+            latest = {}
+            for entry in entries:
+                latest[(entry['code'], entry['analysis_type'])] = entry
+            rows = list(latest.values())
+            
+            if rows:
+                stmt = sqlite_insert(AnalysisCache)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['code', 'analysis_type', 'data_hash'],
+                    set_={
+                        'prompt': stmt.excluded.prompt,
+                        'result': stmt.excluded.result,
+                        'created_at': stmt.excluded.created_at,
+                        'expires_at': stmt.excluded.expires_at
+                    }
+                )
+                db.session.execute(stmt, rows)
+                
+                for row in rows:
+                    AnalysisCache.query.filter(
+                        AnalysisCache.code == row['code'],
+                        AnalysisCache.analysis_type == row['analysis_type'],
+                        AnalysisCache.data_hash != row['data_hash']
+                    ).delete(synchronize_session=False)
+            
+            if touches:
+                db.session.execute(
+                    db.text(
+                        "UPDATE analysis_cache SET last_hit_at = :now "
+                        "WHERE code = :code AND analysis_type = :analysis_type AND data_hash = :data_hash"
+                    ),
+                    [
+                        {'now': datetime.now(), 'code': c, 'analysis_type': t, 'data_hash': h}
+                        for c, t, h in touches
+                    ]
+                )
+            
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"保存缓存到数据库失败: {e}")
+    
+    def _run_writer(self):
+        """后台写回线程：攒批后一次写入"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            batch, touches, waiters = [], set(), []
+            deadline = time.monotonic() + self.write_flush_interval
+            while True:
+                if item is None:
+                    # 停止信号放回队列，本批写完后退出
+                    self._queue.put(None)
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                if isinstance(item, tuple):
+                    touches.add(item)
+                else:
+                    batch.append(item)
+                if len(batch) + len(touches) >= self.write_batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            
+            if batch or touches:
+                with self._app.app_context():
+                    self._save_to_db(batch, touches)
+            for waiter in waiters:
+                waiter.set()
+    
+    def _ensure_schema(self):
+        """
+        为已有的 analysis_cache 表补齐新增的列和索引
+        
+        create_all 不会修改已存在的表；旧库中可能有重复行，建唯一索引前先按键保留最新一条。
+        """
+        try:
+            from app import db
+            from app.models.analysis import AnalysisCache
+            
+            table = AnalysisCache.__table__
+            inspector = db.inspect(db.engine)
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            
+            if 'last_hit_at' not in columns:
+                db.session.execute(db.text("ALTER TABLE analysis_cache ADD COLUMN last_hit_at DATETIME"))
+                db.session.commit()
+            
+            for index in table.indexes:
+                if index.name in indexes:
+                    continue
+                if index.unique:
+                    db.session.execute(db.text(
+                        "DELETE FROM analysis_cache WHERE id NOT IN ("
+                        "SELECT MAX(id) FROM analysis_cache GROUP BY code, analysis_type, data_hash)"
+                    ))
+                    db.session.commit()
+                index.create(db.engine)
+        except Exception as e:
+            db.session.rollback()
+            print(f"更新缓存表结构失败: {e}")
+    
+    def _delete_from_db(self, code: str, analysis_type: str = None):
+        """从数据库删除缓存"""
+        try:
+            from app import db
+            from app.models.analysis import AnalysisCache
+            
+            query = AnalysisCache.query.filter_by(code=code)
+            if analysis_type:
+                query = query.filter_by(analysis_type=analysis_type)
+            
+            query.delete()
+            db.session.commit()
+        except Exception as e:
+            print(f"从数据库删除缓存失败: {e}")
+
+
+# 单例
+cache_service = CacheService()
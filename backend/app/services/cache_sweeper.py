@@ -0,0 +1,219 @@
+"""
+分析缓存清理 - 后台定期清理 analysis_cache 表
+
+- 过期清理：按批删除已超过宽限期（stale_grace）的过期行（每批单独提交，不长时间占用写锁）
+- 容量上限：行数或字节数超过预算时，按最近命中时间（LRU）淘汰
+- 空间回收：每轮用 incremental_vacuum 把空闲页还给文件系统。新建的数据库在建表前
+  即为 auto_vacuum=INCREMENTAL（见 SQLITE_PRAGMAS）；已有数据库需停服后执行一次
+  python vacuum_db.py 转换（完整 VACUUM），清理线程自身从不执行完整 VACUUM
+
+多 worker 部署时每个进程都会启动清理线程，但只有拿到 data/cache_sweeper.lock
+文件锁的那个进程执行清理；持锁进程退出后锁自动释放，由其他进程接手。
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# 行大小估算（字节）：结果与Prompt的字节长度
+_ROW_SIZE = "LENGTH(CAST(result AS BLOB)) + COALESCE(LENGTH(CAST(prompt AS BLOB)), 0)"
+# 淘汰顺序：从未命中的按创建时间
+_LRU_ORDER = "COALESCE(last_hit_at, created_at)"
+
+
+class CacheSweeper:
+    """analysis_cache 清理器"""
+
+    def __init__(self):
+        try:
+            from app.config import BaseConfig
+            cache_config = BaseConfig.CACHE_CONFIG
+        except:
+            cache_config = {}
+
+        self.interval = cache_config.get('sweep_interval', 600)        # 秒，0 表示不启动后台线程
+        self.batch_size = cache_config.get('sweep_batch_size', 500)
+        self.max_rows = cache_config.get('max_rows', 50000)             # 0 表示不限
+        self.max_bytes = cache_config.get('max_bytes', 0)               # 0 表示不限
+        self.vacuum_pages = cache_config.get('vacuum_pages', 2000)
+        # 宽限期内的过期行仍会作为旧结果返回（见 CacheService.lookup），不能删除
+        self.stale_grace = cache_config.get('stale_grace', 3600)
+
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._vacuum_mode: Optional[int] = None
+        # 持有的进程间文件锁（持有期间本进程负责清理）
+        self._lock_path: Optional[Path] = None
+        self._lock_file: Optional[TextIO] = None
+
+    def init_app(self, app):
+        """绑定Flask应用并启动后台清理线程"""
+        self._app = app
+        self._lock_path = Path(app.config['BASE_DIR']) / 'data' / 'cache_sweeper.lock'
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name='cache-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        执行一轮清理（需在应用上下文中调用）
+
+        Returns:
+            {'expired': 删除的过期行数, 'evicted': 淘汰行数, 'vacuumed_pages': 回收页数}
+        """
+        stats = {
+            'expired': self._delete_expired(),
+            'evicted': self._evict_over_budget(),
+            'vacuumed_pages': 0
+        }
+        if stats['expired'] or stats['evicted']:
+            stats['vacuumed_pages'] = self._incremental_vacuum()
+        if any(stats.values()):
+            logger.info(f"分析缓存清理: {stats}")
+        return stats
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        把已有数据库转换为 auto_vacuum=INCREMENTAL（执行一次完整 VACUUM，
+        期间锁住整个数据库，只应在停服维护时调用，见 vacuum_db.py）
+
+        Returns:
+            是否执行了转换（已是增量模式或内存库时返回False）
+        """
+        if db.engine.url.database in (None, '', ':memory:'):
+            return False
+
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+                return False
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        self._vacuum_mode = 2
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._hold_lock():
+                continue
+            try:
+                with self._app.app_context():
+                    self.sweep()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"分析缓存清理失败: {e}")
+
+    def _delete_expired(self) -> int:
+        """按批删除超过宽限期的过期行"""
+        cutoff = datetime.now() - timedelta(seconds=self.stale_grace)
+        total = 0
+        while True:
+            result = db.session.execute(db.text(
+                "DELETE FROM analysis_cache WHERE id IN ("
+                "SELECT id FROM analysis_cache WHERE expires_at < :cutoff LIMIT :limit)"
+            ), {'cutoff': cutoff, 'limit': self.batch_size})
+            db.session.commit()
+            total += result.rowcount
+            if result.rowcount < self.batch_size:
+                return total
+
+    def _evict_over_budget(self) -> int:
+        """行数或字节数超出预算时按LRU淘汰"""
+        if not self.max_rows and not self.max_bytes:
+            return 0
+
+        rows_excess = 0
+        if self.max_rows:
+            count = db.session.execute(db.text("SELECT COUNT(*) FROM analysis_cache")).scalar()
+            rows_excess = count - self.max_rows
+        bytes_excess = 0
+        if self.max_bytes:
+            size = db.session.execute(db.text(
+                f"SELECT COALESCE(SUM({_ROW_SIZE}), 0) FROM analysis_cache"
+            )).scalar()
+            bytes_excess = size - self.max_bytes
+
+        evicted = 0
+        while rows_excess > 0 or bytes_excess > 0:
+            candidates = db.session.execute(db.text(
+                f"SELECT id, {_ROW_SIZE} FROM analysis_cache ORDER BY {_LRU_ORDER} LIMIT :limit"
+            ), {'limit': self.batch_size}).all()
+            if not candidates:
+                break
+
+            victims: List[int] = []
+            for row_id, row_size in candidates:
+                if rows_excess <= 0 and bytes_excess <= 0:
+                    break
+                victims.append(row_id)
+                rows_excess -= 1
+                bytes_excess -= row_size or 0
+
+            db.session.execute(
+                db.text("DELETE FROM analysis_cache WHERE id = :id"),
+                [{'id': row_id} for row_id in victims]
+            )
+            db.session.commit()
+            evicted += len(victims)
+        return evicted
+
+    def _hold_lock(self) -> bool:
+        """尝试获取（或确认已持有）清理文件锁，不阻塞"""
+        if self._lock_file is not None:
+            return True
+        if self._lock_path is None:
+            return False
+
+        try:
+            self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = open(self._lock_path, 'a+')
+        except OSError as e:
+            logger.warning(f"无法打开清理锁文件: {e}")
+            return False
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # 其他进程正在负责清理
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _incremental_vacuum(self) -> int:
+        """回收空闲页（数据库不是增量 auto_vacuum 模式时跳过）"""
+        if db.engine.url.database in (None, '', ':memory:'):
+            return 0
+
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            if self._vacuum_mode is None:
+                self._vacuum_mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+                if self._vacuum_mode != 2:
+                    logger.warning("数据库不是 auto_vacuum=INCREMENTAL 模式，空闲页不会回收；"
+                                   "请停服后执行 python vacuum_db.py 转换")
+            if self._vacuum_mode != 2:
+                return 0
+
+            before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+            after = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            return before - after
+
+
+# 单例
+cache_sweeper = CacheSweeper()
@@ -1,115 +1,174 @@
-"""
-云端LLM服务 - 通过环境变量配置
-"""
-import os
-import httpx
-from typing import Optional
-
-
-class CloudLLM:
-    """云端LLM封装（默认使用DeepSeek，支持兼容OpenAI格式的API）"""
-    
-    def __init__(self):
-        self.api_key = os.environ.get('CLOUD_API_KEY', '')
-        self.base_url = os.environ.get('CLOUD_BASE_URL', 'https://api.deepseek.com')
-        self.model = os.environ.get('CLOUD_MODEL', 'deepseek-chat')
-        self.timeout = 60
-        self.max_tokens = 2000
-        self.temperature = 0.7
-        # 复用HTTP Client
-        self._client = None
-    
-    def _get_client(self) -> httpx.Client:
-        """获取或创建HTTP Client"""
-        if self._client is None:
-            self._client = httpx.Client(
-                timeout=self.timeout,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-            )
-        return self._client
-    
-    def __del__(self):
-        """清理HTTP Client"""
-        if self._client is not None:
-            try:
-                self._client.close()
-            except:
-                pass
-    
-    @property
-    def enabled(self) -> bool:
-        """检查是否配置了API密钥"""
-        return bool(self.api_key)
-    
-    def complete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """
-        调用云端LLM生成回复
-        
-        Args:
-            prompt: 用户输入
-            system_prompt: 系统提示词（可选）
-            
-        Returns:
-            LLM生成的内容
-        """
-        # 打印请求内容
-        print("=" * 50)
-        print("[云端LLM请求]")
-        print(f"模型: {self.model}")
-        print(f"URL: {self.base_url}/v1/chat/completions")
-        if system_prompt:
-            print(f"\n[系统提示词]\n{system_prompt[:500]}...")
-        print(f"\n[用户提示词]\n{prompt[:1000]}...")
-        print("=" * 50)
-        
-        if not self.enabled:
-            raise RuntimeError("未配置 CLOUD_API_KEY 环境变量")
-        
-        # 构建消息
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
-        
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": self.max_tokens,
-            "temperature": self.temperature,
-            "stream": False
-        }
-        
-        try:
-            client = self._get_client()
-            response = client.post(
-                f"{self.base_url}/v1/chat/completions",
-                json=payload
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        except httpx.TimeoutException:
-            raise RuntimeError(f"云端LLM请求超时（{self.timeout}秒）")
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"云端LLM请求失败: {e.response.status_code} - {e.response.text}")
-        except Exception as e:
-            raise RuntimeError(f"云端LLM调用错误: {str(e)}")
-    
-    def health_check(self) -> bool:
-        """检查云端LLM服务是否可用"""
-        if not self.enabled:
-            return False
-        
-        try:
-            # 发送一个简单的测试请求
-            result = self.complete("Hello", system_prompt="Reply with 'OK' only.")
-            return True
-        except:
-            return False
-
-
-# 单例
-cloud_llm = CloudLLM()
+"""
+云端LLM服务 - 通过环境变量配置
+"""
+import os
+import httpx
+from typing import Iterator, Optional
+
+from app.services.llm_transport import LLMTransport, create_transport
+from app.utils.sse import iter_chat_deltas
+
+
+class CloudLLM:
+    """云端LLM封装（默认使用DeepSeek，支持兼容OpenAI格式的API）"""
+    
+    def __init__(self):
+        self.api_key = os.environ.get('CLOUD_API_KEY', '')
+        self.base_url = os.environ.get('CLOUD_BASE_URL', 'https://api.deepseek.com')
+        self.model = os.environ.get('CLOUD_MODEL', 'deepseek-chat')
+        self.timeout = 60
+        self.max_tokens = 2000
+        self.temperature = 0.7
+        # 共享连接池（keep-alive / HTTP/2 / 并发上限），首次调用时创建
+        self._transport = None
+    
+    @property
+    def transport(self) -> LLMTransport:
+        """云端LLM传输层"""
+        if self._transport is None:
+            self._transport = create_transport(
+                'cloud',
+                timeout=self.timeout,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+        return self._transport
+    
+    @property
+    def enabled(self) -> bool:
+        """检查是否配置了API密钥"""
+        return bool(self.api_key)
+    
+    def complete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        """
+        调用云端LLM生成回复
+        
+        Args:
+            prompt: 用户输入
+            system_prompt: 系统提示词（可选）
+            
+        Returns:
+            LLM生成的内容
+        """
+        payload = self._build_payload(prompt, system_prompt, stream=False)
+        
+        try:
+            response = self.transport.post(
+                f"{self.base_url}/v1/chat/completions",
+                json=payload
+            )
+            response.raise_for_status()
+            result = response.json()
+            return result['choices'][0]['message']['content']
+        except httpx.TimeoutException:
+            raise RuntimeError(f"云端LLM请求超时（{self.timeout}秒）")
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError(f"云端LLM请求失败: {e.response.status_code} - {e.response.text}")
+        except Exception as e:
+            raise RuntimeError(f"云端LLM调用错误: {str(e)}")
+    
+    async def acomplete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        """
+        异步调用云端LLM生成回复
+        
+        Args:
+            prompt: 用户输入
+            system_prompt: 系统提示词（可选）
+            
+        Returns:
+            LLM生成的内容
+        """
+        payload = self._build_payload(prompt, system_prompt, stream=False)
+        
+        try:
+            response = await self.transport.apost(
+                f"{self.base_url}/v1/chat/completions",
+                json=payload
+            )
+            response.raise_for_status()
+            result = response.json()
+            return result['choices'][0]['message']['content']
+        except httpx.TimeoutException:
+            raise RuntimeError(f"云端LLM请求超时（{self.timeout}秒）")
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError(f"云端LLM请求失败: {e.response.status_code} - {e.response.text}")
+        except Exception as e:
+            raise RuntimeError(f"云端LLM调用错误: {str(e)}")
+    
+    def stream(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        """
+        流式调用云端LLM，边生成边返回
+        
+        Args:
+            prompt: 用户输入
+            system_prompt: 系统提示词（可选）
+            
+        Yields:
+            依次生成的内容片段
+        """
+        payload = self._build_payload(prompt, system_prompt, stream=True)
+        
+        try:
+            with self.transport.stream(
+                'POST',
+                f"{self.base_url}/v1/chat/completions",
+                json=payload
+            ) as response:
+                if response.is_error:
+                    response.read()
+                response.raise_for_status()
+                yield from iter_chat_deltas(response.iter_lines())
+        except httpx.TimeoutException:
+            raise RuntimeError(f"云端LLM请求超时（{self.timeout}秒）")
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError(f"云端LLM请求失败: {e.response.status_code} - {e.response.text}")
+        except Exception as e:
+            raise RuntimeError(f"云端LLM调用错误: {str(e)}")
+    
+    def _build_payload(self, prompt: str, system_prompt: Optional[str], stream: bool) -> dict:
+        """构建聊天补全请求体"""
+        # 打印请求内容
+        print("=" * 50)
+        print("[云端LLM请求]")
+        print(f"模型: {self.model}")
+        print(f"URL: {self.base_url}/v1/chat/completions")
+        if system_prompt:
+            print(f"\n[系统提示词]\n{system_prompt[:500]}...")
+        print(f"\n[用户提示词]\n{prompt[:1000]}...")
+        print("=" * 50)
+        
+        if not self.enabled:
+            raise RuntimeError("未配置 CLOUD_API_KEY 环境变量")
+        
+        # 构建消息
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": stream
+        }
+        return payload
+    
+    def health_check(self) -> bool:
+        """检查云端LLM服务是否可用"""
+        if not self.enabled:
+            return False
+        
+        try:
+            # 发送一个简单的测试请求
+            result = self.complete("Hello", system_prompt="Reply with 'OK' only.")
+            return True
+        except:
+            return False
+
+
+# 单例
+cloud_llm = CloudLLM()
@@ -0,0 +1,251 @@
+"""
+日线列式存储 - 每只股票一个内存映射的 .npy 文件
+
+文件内容为 float64 矩阵 (1 + 字段数, 天数)：第0行是交易日序号（date.toordinal），
+其余各行依次为 BAR_FIELDS，按日期升序。读取时用 np.load(mmap_mode='r') 映射文件，
+返回的是页缓存上的只读视图，不经过ORM、不解析文本，批量扫描多年历史只受内存带宽限制。
+
+stock_daily 表仍是权威数据，本存储是它的列式副本：BarStore 每次写入后同步更新，
+文件缺失或与表中行数不一致时从表重建。写入先写临时文件再原子替换，
+已映射旧文件的读者不受影响，下次读取时按 inode / 修改时间发现新文件。
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 行情字段（与 bar_store.BAR_FIELDS 一致；顺序即文件中的行顺序）
+FIELDS = ['open', 'close', 'high', 'low', 'volume', 'amount', 'change_pct', 'turnover']
+
+# 行号：第0行为日期，之后为各字段
+ROW = {field: i + 1 for i, field in enumerate(FIELDS)}
+
+
+def _ordinals(values) -> np.ndarray:
+    """日期列（date 或 ISO 字符串）转为 float64 日序号"""
+    return np.array([
+        (v if isinstance(v, date) else date.fromisoformat(str(v)[:10])).toordinal()
+        for v in values
+    ], dtype=np.float64)
+
+
+class ColumnarStore:
+    """按股票分文件的内存映射列式日线存储"""
+
+    def __init__(self, root: Optional[str] = None, enabled: bool = False, max_open: int = 1024):
+        """
+        Args:
+            root: 存储目录
+            enabled: 是否启用（未启用时读取总是返回None，写入忽略；init_app 按应用配置设置）
+            max_open: 同时保持映射的文件数上限（按LRU关闭）
+        """
+        self.root = Path(root) if root else None
+        self.enabled = enabled and self.root is not None
+        self.max_open = max_open
+        # 代码 -> ((inode, 修改时间, 文件大小), 映射数组)
+        self._handles: 'OrderedDict[str, Tuple[tuple, np.ndarray]]' = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        """
+        按应用配置（COLUMNAR_STORE_CONFIG）设置存储目录与开关，默认目录 data/bars
+
+        Args:
+            app: Flask应用
+        """
+        config = app.config.get('COLUMNAR_STORE_CONFIG') or {}
+        with self._lock:
+            self._handles.clear()
+            self.root = Path(config.get('path') or Path(app.config['BASE_DIR']) / 'data' / 'bars')
+            self.enabled = config.get('enabled', True)
+            self.max_open = config.get('max_open', self.max_open)
+
+    def read(self, code: str, days: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        读取最近N个交易日（零拷贝视图）
+
+        Args:
+            code: 股票代码
+            days: 天数，None表示全部
+
+        Returns:
+            只读矩阵 (1 + 字段数, n)，第0行为日序号；文件不存在返回None
+        """
+        array = self._open(code)
+        if array is None or days is None:
+            return array
+        return array[:, -days:] if days > 0 else array[:, :0]
+
+    def length(self, code: str) -> Optional[int]:
+        """已存储的天数，文件不存在返回None"""
+        array = self._open(code)
+        return None if array is None else array.shape[1]
+
+    def last_date(self, code: str) -> Optional[date]:
+        array = self._open(code)
+        if array is None or array.shape[1] == 0:
+            return None
+        return date.fromordinal(int(array[0, -1]))
+
+    def load_frame(self, code: str, days: int = 60) -> Optional[pd.DataFrame]:
+        """
+        读取最近N个交易日为DataFrame（与 BarStore 的列格式一致）
+
+        Returns:
+            日线DataFrame（trade_date 为ISO日期字符串），文件不存在返回None
+        """
+        array = self.read(code, days)
+        if array is None:
+            return None
+        df = pd.DataFrame({field: array[ROW[field]] for field in FIELDS})
+        df.insert(0, 'trade_date', [date.fromordinal(int(d)).isoformat() for d in array[0]])
+        return df
+
+    def load_matrix(self, codes: Sequence[str], fields: Sequence[str],
+                    days: int) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        批量读取多只股票的若干字段为右对齐矩阵（左侧不足部分填充NaN）
+
+        Args:
+            codes: 股票代码列表
+            fields: 字段列表，如 ('close', 'high', 'low')
+            days: 矩阵列数
+
+        Returns:
+            (有数据的股票代码, {字段: (股票数, days) 的float64矩阵})
+        """
+        arrays = []
+        found = []
+        for code in codes:
+            array = self.read(code, days)
+            if array is not None and array.shape[1]:
+                found.append(code)
+                arrays.append(array)
+
+        matrices = {}
+        for field in fields:
+            matrix = np.full((len(found), days), np.nan)
+            row = ROW[field]
+            for i, array in enumerate(arrays):
+                matrix[i, days - array.shape[1]:] = array[row]
+            matrices[field] = matrix
+        return found, matrices
+
+    def write(self, code: str, df: pd.DataFrame):
+        """
+        用完整历史覆盖写入
+
+        Args:
+            code: 股票代码
+            df: 日线DataFrame（trade_date + FIELDS，trade_date 为 date 或 ISO 字符串）
+        """
+        if not self.enabled:
+            return
+        if df.empty:
+            self._save(code, np.empty((1 + len(FIELDS), 0)))
+            return
+        df = df.sort_values('trade_date')
+        array = np.vstack([_ordinals(df['trade_date'])] + [
+            df[field].to_numpy(dtype=np.float64) for field in FIELDS
+        ])
+        self._save(code, array)
+
+    def merge(self, code: str, df: pd.DataFrame) -> Optional[int]:
+        """
+        合并新日线：同日期的行被覆盖，其余按日期插入
+
+        Returns:
+            合并后的天数；文件不存在时不写入并返回None（由调用方全量重建）
+        """
+        if not self.enabled:
+            return None
+        existing = self._open(code)
+        if existing is None:
+            return None
+        if df.empty:
+            return existing.shape[1]
+
+        incoming = np.vstack([_ordinals(df['trade_date'])] + [
+            df[field].to_numpy(dtype=np.float64) for field in FIELDS
+        ])
+        keep = ~np.isin(existing[0], incoming[0])
+        merged = np.concatenate([existing[:, keep], incoming], axis=1)
+        merged = merged[:, np.argsort(merged[0], kind='stable')]
+        self._save(code, merged)
+        return merged.shape[1]
+
+    def delete(self, code: str):
+        with self._lock:
+            self._handles.pop(code, None)
+        try:
+            self._path(code).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _path(self, code: str) -> Path:
+        return self.root / f"{code}.npy"
+
+    def _open(self, code: str) -> Optional[np.ndarray]:
+        """返回映射数组；文件被替换（inode、修改时间或大小变化）后重新映射"""
+        if not self.enabled:
+            return None
+        path = self._path(code)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._handles.pop(code, None)
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            handle = self._handles.get(code)
+            if handle is not None and handle[0] == key:
+                self._handles.move_to_end(code)
+                return handle[1]
+
+        try:
+            array = np.load(path, mmap_mode='r')
+        except Exception as e:
+            logger.warning(f"读取列式日线失败 [{code}]: {e}")
+            return None
+        if array.ndim != 2 or array.shape[0] != 1 + len(FIELDS):
+            return None  # 字段布局已变化，视为不存在，由调用方重建
+
+        with self._lock:
+            self._handles[code] = (key, array)
+            self._handles.move_to_end(code)
+            while len(self._handles) > self.max_open:
+                self._handles.popitem(last=False)
+        return array
+
+    def _save(self, code: str, array: np.ndarray):
+        """原子写入（先写临时文件再替换）"""
+        path = self._path(code)
+        tmp_path = path.with_name(f"{code}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            np.save(tmp_path, np.ascontiguousarray(array, dtype=np.float64))
+            with self._lock:
+                # Windows 下仍被映射的文件无法替换，先释放本进程持有的映射
+                self._handles.pop(code, None)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入列式日线失败 [{code}]: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+
+# 单例
+columnar_store = ColumnarStore()
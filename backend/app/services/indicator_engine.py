@@ -0,0 +1,403 @@
+"""
+向量化技术指标引擎 - 对 (股票数 × 交易日) 价格矩阵批量计算指标
+
+MA/EMA/MACD/KDJ/RSI 均以NumPy整列运算完成：递推类指标只沿时间轴循环，
+每一步同时处理所有股票，因此全市场计算与单只股票的代价几乎相同。
+
+矩阵约定：每行一只股票，按日期升序右对齐；历史较短的股票左侧以NaN填充。
+
+IndicatorState 保存单只股票在某个K线窗口上的递推状态，盘中报价到来时O(1)试算。
+"""
+import numpy as np
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Optional, Sequence
+
+# 默认参数（与原单股票计算保持一致）
+MA_PERIODS = (5, 10, 20)
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+KDJ_N, KDJ_M1, KDJ_M2 = 9, 3, 3
+RSI_PERIOD = 14
+
+# 序列输出字段
+SERIES_FIELDS = (
+    'ma5', 'ma10', 'ma20',
+    'macd', 'macd_signal', 'macd_hist',
+    'k', 'd', 'j', 'rsi'
+)
+
+
+def to_matrix(rows: Sequence[np.ndarray], length: Optional[int] = None) -> np.ndarray:
+    """
+    将不等长的一维序列右对齐堆叠为矩阵（左侧填充NaN）
+
+    Args:
+        rows: 每只股票的价格序列（按日期升序）
+        length: 矩阵列数，默认取最长序列长度
+
+    Returns:
+        (len(rows), length) 的float64矩阵
+    """
+    if length is None:
+        length = max((len(r) for r in rows), default=0)
+    matrix = np.full((len(rows), length), np.nan)
+    for i, row in enumerate(rows):
+        row = np.asarray(row, dtype=np.float64)
+        if length and len(row):
+            row = row[-length:]
+            matrix[i, length - len(row):] = row
+    return matrix
+
+
+def sma(x: np.ndarray, period: int) -> np.ndarray:
+    """简单移动平均，窗口内有NaN或数据不足时为NaN"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= period:
+        out[:, period - 1:] = sliding_window_view(x, period, axis=1).mean(axis=-1)
+    return out
+
+
+def ema(x: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    指数移动平均（等价于 pandas ewm(adjust=False)）
+
+    沿时间轴递推，每一步同时更新所有股票；每行从第一个有效值开始。
+    """
+    out = np.empty(x.shape)
+    prev = np.full(x.shape[0], np.nan)
+    for t in range(x.shape[1]):
+        xt = x[:, t]
+        prev = np.where(np.isnan(prev), xt, (1 - alpha) * prev + alpha * xt)
+        out[:, t] = prev
+    return out
+
+
+def rolling_min(x: np.ndarray, period: int) -> np.ndarray:
+    """滚动最小值"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= period:
+        out[:, period - 1:] = sliding_window_view(x, period, axis=1).min(axis=-1)
+    return out
+
+
+def rolling_max(x: np.ndarray, period: int) -> np.ndarray:
+    """滚动最大值"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= period:
+        out[:, period - 1:] = sliding_window_view(x, period, axis=1).max(axis=-1)
+    return out
+
+
+def macd(close: np.ndarray, fast: int = MACD_FAST, slow: int = MACD_SLOW,
+         signal: int = MACD_SIGNAL):
+    """
+    MACD
+
+    Returns:
+        (macd_line, signal_line, histogram)
+    """
+    macd_line = ema(close, 2 / (fast + 1)) - ema(close, 2 / (slow + 1))
+    signal_line = ema(macd_line, 2 / (signal + 1))
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def kdj(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+        n: int = KDJ_N, m1: int = KDJ_M1, m2: int = KDJ_M2):
+    """
+    KDJ（RSV不足N日时按50处理）
+
+    Returns:
+        (k, d, j)
+    """
+    llv = rolling_min(low, n)
+    hhv = rolling_max(high, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = (close - llv) / (hhv - llv) * 100
+    # 只在股票自身历史范围内补50，左侧填充区保持NaN
+    rsv = np.where(np.isnan(rsv) & ~np.isnan(close), 50.0, rsv)
+
+    k = ema(rsv, 1 / m1)
+    d = ema(k, 1 / m2)
+    return k, d, 3 * k - 2 * d
+
+
+def rsi(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """RSI（最近N日涨跌幅简单平均）"""
+    out = np.full(close.shape, np.nan)
+    if close.shape[1] < period + 1:
+        return out
+
+    deltas = np.diff(close, axis=1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+    # 保留NaN，使填充区的窗口结果为NaN
+    gains[np.isnan(deltas)] = np.nan
+    losses[np.isnan(deltas)] = np.nan
+
+    avg_gain = sliding_window_view(gains, period, axis=1).mean(axis=-1)
+    avg_loss = sliding_window_view(losses, period, axis=1).mean(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100 - 100 / (1 + avg_gain / avg_loss)
+    values = np.where(avg_loss == 0, 100.0, values)
+    out[:, period:] = values
+    return out
+
+
+def compute(close: np.ndarray, high: np.ndarray, low: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    计算全部指标的完整序列
+
+    Args:
+        close/high/low: (股票数, 交易日) 价格矩阵
+
+    Returns:
+        {指标名: 同形状矩阵}
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    high = np.atleast_2d(np.asarray(high, dtype=np.float64))
+    low = np.atleast_2d(np.asarray(low, dtype=np.float64))
+
+    series = {f'ma{p}': sma(close, p) for p in MA_PERIODS}
+    series['macd'], series['macd_signal'], series['macd_hist'] = macd(close)
+    series['k'], series['d'], series['j'] = kdj(close, high, low)
+    series['rsi'] = rsi(close)
+    # 每只股票的有效交易日数，用于判断数据是否充足
+    series['valid_days'] = (~np.isnan(close)).sum(axis=1)
+    return series
+
+
+def last_values(series: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    只取每只股票的最新指标值
+
+    Returns:
+        {指标名: (股票数,) 数组}；另附 macd_hist_prev 供金叉/死叉判断
+    """
+    result = {name: values[:, -1] for name, values in series.items() if name != 'valid_days'}
+    hist = series['macd_hist']
+    result['macd_hist_prev'] = hist[:, -2] if hist.shape[1] >= 2 else np.full(hist.shape[0], np.nan)
+    result['valid_days'] = series['valid_days']
+    return result
+
+
+def macd_signal_text(hist: float, hist_prev: float, valid_days: int) -> str:
+    """MACD信号：金叉/死叉/多头/空头"""
+    if valid_days < MACD_SLOW + MACD_SIGNAL:
+        return "数据不足"
+    if hist_prev < 0 and hist > 0:
+        return "金叉"
+    if hist_prev > 0 and hist < 0:
+        return "死叉"
+    return "多头" if hist > 0 else "空头"
+
+
+def kdj_signal_text(k: Optional[float]) -> str:
+    """KDJ信号：超买/超卖/中性"""
+    if k is None:
+        return "数据不足"
+    return "超买" if k > 80 else ("超卖" if k < 20 else "中性")
+
+
+def summarize(last: Dict[str, np.ndarray], row: int = 0) -> Dict:
+    """
+    将某只股票的最新指标整理为接口使用的技术指标字典
+
+    Args:
+        last: last_values() 的结果
+        row: 股票所在行
+
+    Returns:
+        技术指标字典
+    """
+    valid_days = int(last['valid_days'][row])
+
+    def value(name: str, min_days: int) -> Optional[float]:
+        v = float(last[name][row])
+        if valid_days < min_days or np.isnan(v):
+            return None
+        return v
+
+    ma = {p: value(f'ma{p}', p) for p in MA_PERIODS}
+    macd_value = value('macd', MACD_SLOW + MACD_SIGNAL)
+    k = value('k', KDJ_N)
+    d = value('d', KDJ_N)
+    j = value('j', KDJ_N)
+    rsi_value = value('rsi', RSI_PERIOD + 1)
+
+    return {
+        'ma5': round(ma[5], 2) if ma[5] else None,
+        'ma10': round(ma[10], 2) if ma[10] else None,
+        'ma20': round(ma[20], 2) if ma[20] else None,
+        'macd': {
+            'value': round(macd_value, 4) if macd_value else None,
+            'signal': macd_signal_text(
+                float(last['macd_hist'][row]),
+                float(last['macd_hist_prev'][row]),
+                valid_days
+            )
+        },
+        'kdj': {
+            'k': round(k, 2) if k else None,
+            'd': round(d, 2) if d else None,
+            'j': round(j, 2) if j else None,
+            'signal': kdj_signal_text(k)
+        },
+        'rsi': round(rsi_value, 2) if rsi_value else None
+    }
+
+
+def series_payload(series: Dict[str, np.ndarray], row: int = 0,
+                   fields: Sequence[str] = SERIES_FIELDS) -> Dict[str, List[Optional[float]]]:
+    """
+    导出某只股票的完整指标序列（供前端绘图，NaN转为None）
+
+    Returns:
+        {指标名: 数值列表}
+    """
+    payload = {}
+    for name in fields:
+        values = np.round(series[name][row], 4)
+        payload[name] = [None if np.isnan(v) else float(v) for v in values]
+    return payload
+
+
+class IndicatorState:
+    """
+    单只股票的增量指标状态
+
+    保存EMA快/慢/信号线、KDJ的K/D、RSI涨跌窗口以及各滚动窗口缓冲，
+    追加一根新K线或试算一笔盘中报价都是常数时间。
+    递推类指标（EMA、KDJ）依赖起点，状态只对应从 first_date 开始的这一段K线：
+    对同一段K线序列，结果与 compute() 全量重算逐位一致。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.first_date: Optional[str] = None
+        self.first_close: Optional[float] = None
+        self.last_date: Optional[str] = None
+        self.last_close: Optional[float] = None
+        self.ema_fast: Optional[float] = None
+        self.ema_slow: Optional[float] = None
+        self.ema_signal: Optional[float] = None
+        self.k: Optional[float] = None
+        self.d: Optional[float] = None
+        self.hist: float = np.nan
+        # 滚动窗口缓冲
+        self.closes = deque(maxlen=max(MA_PERIODS))
+        self.highs = deque(maxlen=KDJ_N)
+        self.lows = deque(maxlen=KDJ_N)
+        self.gains = deque(maxlen=RSI_PERIOD)
+        self.losses = deque(maxlen=RSI_PERIOD)
+
+    @classmethod
+    def from_bars(cls, close: Sequence[float], high: Sequence[float], low: Sequence[float],
+                  dates: Optional[Sequence[str]] = None) -> 'IndicatorState':
+        """
+        由一段历史K线初始化状态（逐根回放）
+
+        Args:
+            close/high/low: 价格序列（按日期升序）
+            dates: 对应交易日
+
+        Returns:
+            指标状态
+        """
+        state = cls()
+        for i in range(len(close)):
+            state.update(close[i], high[i], low[i], dates[i] if dates is not None else None)
+        return state
+
+    def update(self, close: float, high: float, low: float, trade_date: Optional[str] = None):
+        """
+        追加一根已确定的K线（O(1)）
+
+        Args:
+            close/high/low: 新K线价格
+            trade_date: 交易日
+        """
+        step = self._step(float(close), float(high), float(low))
+        (self.ema_fast, self.ema_slow, self.ema_signal,
+         self.k, self.d, self.hist, gain, loss) = step[:8]
+
+        if self.last_close is not None:
+            self.gains.append(gain)
+            self.losses.append(loss)
+        else:
+            self.first_date = trade_date
+            self.first_close = float(close)
+        self.closes.append(float(close))
+        self.highs.append(float(high))
+        self.lows.append(float(low))
+        self.last_close = float(close)
+        self.last_date = trade_date
+        self.count += 1
+
+    def peek(self, close: float, high: float, low: float) -> Dict:
+        """
+        试算：假设下一根K线（如盘中实时报价）为给定价格时的指标，不修改状态
+
+        Returns:
+            技术指标字典（格式同 summarize）
+        """
+        return summarize(self._last_values(float(close), float(high), float(low)))
+
+    def _step(self, close: float, high: float, low: float):
+        """计算追加一根K线后的递推量（不修改状态）"""
+        ema_fast = self._ema(self.ema_fast, close, 2 / (MACD_FAST + 1))
+        ema_slow = self._ema(self.ema_slow, close, 2 / (MACD_SLOW + 1))
+        macd_line = ema_fast - ema_slow
+        ema_signal = self._ema(self.ema_signal, macd_line, 2 / (MACD_SIGNAL + 1))
+
+        rsv = 50.0
+        if self.count + 1 >= KDJ_N:
+            llv = np.min(np.array(list(self.lows)[1 - KDJ_N:] + [low]))
+            hhv = np.max(np.array(list(self.highs)[1 - KDJ_N:] + [high]))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                value = (np.float64(close) - llv) / (hhv - llv) * 100
+            if not np.isnan(value):
+                rsv = float(value)
+        k = self._ema(self.k, rsv, 1 / KDJ_M1)
+        d = self._ema(self.d, k, 1 / KDJ_M2)
+
+        gain = loss = 0.0
+        if self.last_close is not None:
+            delta = close - self.last_close
+            gain = delta if delta > 0 else 0.0
+            loss = -delta if delta < 0 else 0.0
+
+        return ema_fast, ema_slow, ema_signal, k, d, macd_line - ema_signal, gain, loss, macd_line
+
+    def _last_values(self, close: float, high: float, low: float) -> Dict[str, np.ndarray]:
+        """构造与 last_values() 相同格式的单行结果"""
+        ema_fast, ema_slow, ema_signal, k, d, hist, gain, loss, macd_line = self._step(close, high, low)
+        count = self.count + 1
+        closes = list(self.closes) + [close]
+
+        values = {}
+        for p in MA_PERIODS:
+            values[f'ma{p}'] = np.mean(np.array(closes[-p:])) if count >= p else np.nan
+        values['macd'] = macd_line
+        values['macd_signal'] = ema_signal
+        values['macd_hist'] = hist
+        values['macd_hist_prev'] = self.hist
+        values['k'] = k
+        values['d'] = d
+        values['j'] = 3 * k - 2 * d
+
+        values['rsi'] = np.nan
+        if count >= RSI_PERIOD + 1:
+            avg_gain = np.mean(np.array(list(self.gains)[1 - RSI_PERIOD:] + [gain]))
+            avg_loss = np.mean(np.array(list(self.losses)[1 - RSI_PERIOD:] + [loss]))
+            values['rsi'] = 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+
+        last = {name: np.array([value], dtype=np.float64) for name, value in values.items()}
+        last['valid_days'] = np.array([count])
+        return last
+
+    @staticmethod
+    def _ema(prev: Optional[float], value: float, alpha: float) -> float:
+        """EMA递推一步（与 ema() 使用相同的计算顺序）"""
+        if prev is None:
+            return value
+        return (1 - alpha) * prev + alpha * value
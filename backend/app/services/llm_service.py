@@ -1,230 +1,564 @@
-"""
-LLM服务 - 整合局域网LLM和云端LLM
-"""
-import json
-import logging
-from typing import Dict, Optional
-from app.services.local_llm import local_llm
-from app.services.cloud_llm import cloud_llm
-from app.services.data_service import data_service
-from app.services.cache_service import cache_service
-from app.utils.prompts import (
-    DATA_STRUCTURE_PROMPT,
-    STOCK_ANALYSIS_PROMPT,
-    SYSTEM_PROMPT
-)
-
-logger = logging.getLogger(__name__)
-
-class LLMService:
-    """LLM服务 - 协调端侧和云端LLM"""
-    
-    def __init__(self):
-        self.local_llm = local_llm
-        self.cloud_llm = cloud_llm
-        self.data_service = data_service
-        self.cache_service = cache_service
-    
-    def diagnose_stock(self, code: str, user_preference: str = "",
-                       force_refresh: bool = False) -> Dict:
-        """
-        个股诊断 - 核心功能
-        
-        Args:
-            code: 股票代码
-            user_preference: 用户投资偏好描述（可选，由LLM自主分析）
-            force_refresh: 是否强制刷新缓存
-            
-        Returns:
-            诊断结果
-        """
-        # 1. 获取股票基本信息和实时行情
-        stock_info = self.data_service.get_stock_info(code)
-        if not stock_info:
-            raise ValueError(f"无法获取股票 {code} 的信息，请检查股票代码是否正确")
-        
-        realtime = self.data_service.get_realtime_quote(code)
-        if realtime:
-            stock_info['current_price'] = realtime['current_price']
-            stock_info['change_pct'] = realtime['change_pct']
-        
-        # 2. 获取日线数据
-        daily_data = self.data_service.get_daily_data(code, 60)
-        if not daily_data:
-            raise ValueError(f"无法获取股票 {code} 的历史数据")
-        
-        # 3. 计算数据指纹
-        latest = daily_data[-1]
-        data_hash = self.cache_service.make_data_hash(
-            latest['close'], 
-            latest['volume'], 
-            latest['trade_date']
-        )
-        
-        # 4. 检查缓存（除非强制刷新）
-        if not force_refresh:
-            cached_result = self._get_cached_analysis(code, data_hash)
-            if cached_result:
-                return {
-                    'stock_info': stock_info,
-                    'analysis': cached_result,
-                    'cached': True,
-                    'generated_at': None  # 来自缓存
-                }
-        
-        # 5. 获取技术指标
-        technical = self.data_service.get_technical_indicators(code)
-        
-        # 6. 获取资金流向（可选）
-        fund_flow = self.data_service.get_fund_flow(code)
-        
-        # 7. 调用LLM进行分析
-        analysis_result = self._analyze_with_llm(
-            stock_info=stock_info,
-            daily_data=daily_data[-20:],  # 只取最近20天
-            technical=technical,
-            fund_flow=fund_flow,
-            user_preference=user_preference
-        )
-        
-        # 8. 合并技术指标到结果
-        analysis_result['technical_indicators'] = technical
-        
-        # 9. 缓存结果
-        self._cache_analysis(code, data_hash, analysis_result)
-        
-        from datetime import datetime
-        return {
-            'stock_info': stock_info,
-            'analysis': analysis_result,
-            'cached': False,
-            'generated_at': datetime.now().isoformat()
-        }
-    
-    def _analyze_with_llm(self, stock_info: Dict, daily_data: list,
-                          technical: Dict, fund_flow: Optional[Dict],
-                          user_preference: str) -> Dict:
-        """
-        使用云端LLM进行分析
-        
-        流程：
-        1. 准备数据摘要
-        2. 直接使用云端LLM进行分析（LLM自主给出策略）
-        """
-        # 检查云端LLM是否可用
-        if not self.cloud_llm.enabled:
-            raise RuntimeError("未配置云端LLM，无法进行分析")
-        
-        # 准备数据摘要
-        data_summary = self._prepare_data_summary(
-            stock_info, daily_data, technical, fund_flow
-        )
-        
-        # 使用云端LLM进行分析
-        analysis_prompt = STOCK_ANALYSIS_PROMPT.format(
-            stock_name=stock_info.get('name', ''),
-            stock_code=stock_info.get('code', ''),
-            structured_data=data_summary,
-            user_preference=user_preference if user_preference else "无特殊偏好，请自主分析并给出完整策略建议"
-        )
-        
-        try:
-            response = self.cloud_llm.complete(
-                analysis_prompt, 
-                system_prompt=SYSTEM_PROMPT
-            )
-            
-            # 解析JSON响应
-            return self._parse_analysis_response(response)
-        except Exception as e:
-            raise RuntimeError(f"云端LLM分析失败: {e}")
-    
-    def _prepare_data_summary(self, stock_info: Dict, daily_data: list,
-                              technical: Dict, fund_flow: Optional[Dict]) -> str:
-        """准备数据摘要"""
-        summary = f"""
-## 股票基本信息
-- 股票名称: {stock_info.get('name', 'N/A')}
-- 股票代码: {stock_info.get('code', 'N/A')}
-- 所属行业: {stock_info.get('industry', 'N/A')}
-- 市盈率: {stock_info.get('pe_ratio', 'N/A')}
-- 市净率: {stock_info.get('pb_ratio', 'N/A')}
-- 当前价格: {stock_info.get('current_price', 'N/A')}
-- 涨跌幅: {stock_info.get('change_pct', 'N/A')}%
-
-## 近期走势（最近5日）
-"""
-        # 添加最近5天的数据
-        for day in daily_data[-5:]:
-            summary += f"- {day['trade_date']}: 开{day['open']} 收{day['close']} 高{day['high']} 低{day['low']} 涨跌{day['change_pct']}%\n"
-        
-        # 添加技术指标
-        if technical:
-            summary += f"""
-## 技术指标
-- MA5: {technical.get('ma5', 'N/A')}
-- MA10: {technical.get('ma10', 'N/A')}
-- MA20: {technical.get('ma20', 'N/A')}
-- MACD: {technical.get('macd', {}).get('signal', 'N/A')}
-- KDJ: K={technical.get('kdj', {}).get('k', 'N/A')}, D={technical.get('kdj', {}).get('d', 'N/A')}, J={technical.get('kdj', {}).get('j', 'N/A')}
-- RSI: {technical.get('rsi', 'N/A')}
-"""
-        
-        # 添加资金流向
-        if fund_flow:
-            summary += f"""
-## 资金流向
-- 主力净流入: {fund_flow.get('main_net_inflow', 'N/A')}
-- 主力净流入占比: {fund_flow.get('main_net_inflow_pct', 'N/A')}%
-"""
-        
-        return summary
-    
-    def _parse_analysis_response(self, response: str) -> Dict:
-        """解析LLM的分析响应"""
-        try:
-            # 尝试提取JSON
-            import re
-            json_match = re.search(r'\{[\s\S]*\}', response)
-            if json_match:
-                return json.loads(json_match.group())
-        except json.JSONDecodeError:
-            pass
-        
-        # 如果无法解析JSON，返回文本格式
-        return {
-            'summary': response,
-            'daily': {
-                'trend': '无法解析',
-                'suggestion': '请查看综合分析',
-                'confidence': 0.5,
-                'reason': response[:200]
-            },
-            'weekly': {
-                'trend': '无法解析',
-                'suggestion': '请查看综合分析',
-                'confidence': 0.5,
-                'reason': ''
-            },
-            'longterm': {
-                'trend': '无法解析',
-                'suggestion': '请查看综合分析',
-                'confidence': 0.5,
-                'reason': ''
-            }
-        }
-    
-    def _get_cached_analysis(self, code: str, data_hash: str) -> Optional[Dict]:
-        """获取缓存的分析结果"""
-        # 简化缓存：只使用一个键
-        cached = self.cache_service.get(code, 'analysis', data_hash)
-        return cached
-    
-    def _cache_analysis(self, code: str, data_hash: str, result: Dict):
-        """缓存分析结果"""
-        # 简化缓存：只存储一次
-        self.cache_service.set(code, 'analysis', data_hash, result)
-
-
-# 单例
-llm_service = LLMService()
+"""
+LLM服务 - 整合局域网LLM和云端LLM
+"""
+import json
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.services.local_llm import local_llm
+from app.services.cloud_llm import cloud_llm
+from app.services.data_service import data_service
+from app.services.cache_service import cache_service
+from app.services.market_context import MarketDataContext
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.fanout import FanOut
+from app.utils.preference import PreferenceProfile, normalize_preference
+from app.utils.single_flight import SingleFlight
+from app.utils.ttl_cache import FRESH, MISS, STALE
+from app.utils.prompts import (
+    ANALYSIS_SYSTEM_PROMPT,
+    DATA_STRUCTURE_PROMPT,
+    DATA_STRUCTURE_SYSTEM_PROMPT,
+    STOCK_ANALYSIS_PROMPT
+)
+
+logger = logging.getLogger(__name__)
+
+class LLMService:
+    """LLM服务 - 协调端侧和云端LLM"""
+    
+    def __init__(self):
+        self.local_llm = local_llm
+        self.cloud_llm = cloud_llm
+        self.data_service = data_service
+        self.cache_service = cache_service
+        # 合并并发的相同诊断请求：重复的云端LLM调用耗时20-60秒且需付费
+        self._flight = SingleFlight()
+        # 正在后台重新生成的 (股票代码, 画像)，同一键同时只有一次后台刷新
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        
+        # 诊断前的数据获取并发执行（线程池在所有请求间共享）
+        try:
+            from app.config import BaseConfig
+            fetch_config = BaseConfig.DATA_FETCH_CONFIG
+            batch_config = BaseConfig.BATCH_DIAGNOSE_CONFIG
+            llm_config = BaseConfig.LOCAL_LLM_CONFIG
+        except:
+            fetch_config = {}
+            batch_config = {}
+            llm_config = {}
+        self.fetch_timeouts = fetch_config.get('timeouts', {})
+        self.fanout = FanOut(
+            max_workers=fetch_config.get('max_workers', 8),
+            default_timeout=fetch_config.get('timeout', 20),
+            thread_name_prefix='diagnose-fetch'
+        )
+        
+        # 批量诊断：数据准备与缓存检查并发执行；未命中缓存的LLM分析
+        # 进入独立的小线程池，线程数即LLM并发上限（所有批量请求共享）
+        self.batch_max_codes = batch_config.get('max_codes', 50)
+        self.batch_fanout = FanOut(
+            max_workers=batch_config.get('max_workers', 8),
+            thread_name_prefix='diagnose-batch'
+        )
+        # 批量诊断的数据获取使用独立线程池，冷启动的大批量不会占满单只诊断的 diagnose-fetch；
+        # 默认每个数据准备线程对应4个获取线程（基本信息、行情、日线、资金流向），获取任务无需排队
+        self.batch_fetch = FanOut(
+            max_workers=batch_config.get('fetch_workers', self.batch_fanout.max_workers * 4),
+            default_timeout=self.fanout.default_timeout,
+            thread_name_prefix='diagnose-batch-fetch'
+        )
+        self.batch_llm = FanOut(
+            max_workers=batch_config.get('llm_concurrency', 3),
+            thread_name_prefix='diagnose-llm'
+        )
+        
+        # 分析流水线：direct 直接把数据摘要发给云端LLM；two_stage 先由局域网LLM
+        # 整理成结构化摘要（按数据指纹缓存，与用户偏好无关），云端只看该摘要
+        pipeline_config = llm_config.get('pipeline', {})
+        self.pipeline_mode = pipeline_config.get('mode', 'direct')
+        self.pipeline_raw_days = pipeline_config.get('raw_days', 20)
+        fallback_config = llm_config.get('fallback', {})
+        self.fallback_to_raw = (
+            fallback_config.get('enabled', True)
+            and fallback_config.get('use_cloud_on_local_failure', True)
+        )
+    
+    def diagnose_stock(self, code: str, user_preference: str = "",
+                       force_refresh: bool = False) -> Dict:
+        """
+        个股诊断 - 核心功能
+        
+        偏好描述先归一化为标准画像（投资期限 + 风险偏好），语义相同的偏好共用缓存；
+        相同股票和画像的并发请求只会执行一次，其余请求等待并共享结果。
+        
+        Args:
+            code: 股票代码
+            user_preference: 用户投资偏好描述（可选，归一化为投资期限和风险偏好画像）
+            force_refresh: 是否强制刷新缓存
+            
+        Returns:
+            诊断结果
+        """
+        profile = normalize_preference(user_preference)
+        return self._flight.do(
+            ('diagnose', code, profile.key, force_refresh),
+            self._diagnose_stock, code, profile, force_refresh
+        )
+    
+    def diagnose_batch(self, codes: List[str], user_preference: str = "",
+                       force_refresh: bool = False) -> Iterator[Tuple[str, Optional[Dict], Optional[Exception]]]:
+        """
+        批量诊断 - 按完成顺序逐只产出结果
+        
+        缓存命中的股票不等待LLM，最先返回；未命中的排队进入LLM线程池，
+        与单只诊断共用合并键，同一股票同时被单独诊断时只调用一次LLM。
+        
+        Args:
+            codes: 已校验并去重的股票代码列表
+            user_preference: 所有股票共用的投资偏好描述
+            force_refresh: 是否强制刷新缓存
+            
+        Yields:
+            (股票代码, 诊断结果, 异常)，成功时异常为None，失败时结果为None
+        """
+        profile = normalize_preference(user_preference)
+        pending = {
+            self.batch_fanout.submit(
+                self._prepare_diagnosis, code, profile, force_refresh, self.batch_fetch
+            ): (code, 'prepare')
+            for code in codes
+        }
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    code, stage = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.warning(f"批量诊断失败 [{code}]: {e}")
+                        yield code, None, e
+                        continue
+                    
+                    if stage == 'prepare':
+                        ctx, data_hash, cached = result
+                        if cached is None:
+                            analyze = self.batch_llm.submit(
+                                self._flight.do,
+                                ('diagnose', code, profile.key, force_refresh),
+                                self._run_analysis, ctx, data_hash, profile
+                            )
+                            pending[analyze] = (code, 'analyze')
+                            continue
+                        result = cached
+                    yield code, result, None
+        finally:
+            # 客户端提前断开时取消尚未开始的任务，避免无人接收的LLM调用
+            for future in pending:
+                future.cancel()
+    
+    def diagnose_stock_stream(self, code: str, user_preference: str = "",
+                              force_refresh: bool = False) -> Iterator[Tuple[str, Any]]:
+        """
+        流式个股诊断 - 先产出已有数据，再逐段产出LLM生成内容
+        
+        事件依次为：
+        - ('stock_info', 基本信息)：基本信息获取完成后立即产出，不等待其他数据
+        - ('technical', 技术指标)：日线等数据准备完成后产出
+        - ('token', 内容片段)：LLM生成过程中逐段产出（缓存命中时没有）
+        - ('result', 诊断结果)：与 diagnose_stock 返回值结构相同
+        
+        与单只、批量诊断共用合并键：流式请求执行期间，相同股票和画像的其他请求
+        等待并共享其结果；相同诊断已在进行时，本请求只等待并产出 result。
+        
+        Args:
+            code: 股票代码
+            user_preference: 用户投资偏好描述（可选）
+            force_refresh: 是否强制刷新缓存
+            
+        Yields:
+            (事件名, 事件数据)
+        """
+        profile = normalize_preference(user_preference)
+        key = ('diagnose', code, profile.key, force_refresh)
+        call = self._flight.lead(key)
+        if call is None:
+            yield 'result', self._flight.do(key, self._diagnose_stock, code, profile, force_refresh)
+            return
+        
+        try:
+            result = yield from self._stream_diagnosis(code, profile, force_refresh)
+        except GeneratorExit:
+            # 客户端断开：等待者收到错误后可自行重试
+            self._flight.finish(key, call, error=RuntimeError("流式诊断已中断，请重试"))
+            raise
+        except BaseException as e:
+            self._flight.finish(key, call, error=e)
+            raise
+        self._flight.finish(key, call, result=result)
+        yield 'result', result
+    
+    def _stream_diagnosis(self, code: str, profile: PreferenceProfile,
+                          force_refresh: bool) -> Iterator[Tuple[str, Any]]:
+        """流式诊断的实际执行流程：产出 stock_info/technical/token 事件，返回诊断结果"""
+        # 基本信息返回后立即产出，不等待日线、资金流向等较慢的数据
+        ctx = MarketDataContext(code, self.data_service, days=60).start(
+            self.fanout, timeouts=self.fetch_timeouts
+        )
+        stock_info = ctx.wait_stock_info()
+        if stock_info:
+            yield 'stock_info', stock_info
+        
+        ctx, data_hash, cached = self._check_prepared(ctx.finish(), profile, force_refresh)
+        yield 'technical', ctx.technical
+        
+        if cached is not None:
+            return cached
+        
+        if not self.cloud_llm.enabled:
+            raise RuntimeError("未配置云端LLM，无法进行分析")
+        
+        analysis_prompt = self._build_analysis_prompt(ctx, profile)
+        chunks = []
+        for delta in self.cloud_llm.stream(analysis_prompt, system_prompt=ANALYSIS_SYSTEM_PROMPT):
+            chunks.append(delta)
+            yield 'token', delta
+        
+        analysis_result = self._parse_analysis_response(''.join(chunks))
+        analysis_result['technical_indicators'] = ctx.technical
+        self._cache_analysis(code, data_hash, analysis_result, profile)
+        
+        from datetime import datetime
+        return {
+            'stock_info': ctx.stock_info,
+            'analysis': analysis_result,
+            'preference': profile.to_dict(),
+            'cached': False,
+            'stale': False,
+            'generated_at': datetime.now().isoformat()
+        }
+    
+    def _diagnose_stock(self, code: str, profile: PreferenceProfile,
+                        force_refresh: bool) -> Dict:
+        """个股诊断的实际执行流程"""
+        ctx, data_hash, cached = self._prepare_diagnosis(code, profile, force_refresh)
+        if cached is not None:
+            return cached
+        return self._run_analysis(ctx, data_hash, profile)
+    
+    def _prepare_diagnosis(self, code: str, profile: PreferenceProfile, force_refresh: bool,
+                           fanout: Optional[FanOut] = None) -> Tuple[MarketDataContext, str, Optional[Dict]]:
+        """
+        获取诊断所需数据并检查缓存
+        
+        Args:
+            fanout: 数据获取线程池，默认为单只诊断共用的 diagnose-fetch
+        
+        Returns:
+            (数据上下文, 数据指纹, 缓存命中时的诊断结果，未命中为None)
+        """
+        # 1-2. 并发获取基本信息、实时行情、日线和资金流向到请求级上下文
+        #      （互相独立的网络请求，总耗时取决于最慢的一个）
+        ctx = MarketDataContext(code, self.data_service, days=60).load(
+            fanout or self.fanout, timeouts=self.fetch_timeouts
+        )
+        return self._check_prepared(ctx, profile, force_refresh)
+    
+    def _check_prepared(self, ctx: MarketDataContext, profile: PreferenceProfile,
+                        force_refresh: bool) -> Tuple[MarketDataContext, str, Optional[Dict]]:
+        """校验已加载的数据并检查缓存（返回值同 _prepare_diagnosis）"""
+        code = ctx.code
+        stock_info = ctx.stock_info
+        if not stock_info:
+            self._raise_if_fetch_failed(ctx, 'stock_info', '基本信息')
+            raise ValueError(f"无法获取股票 {code} 的信息，请检查股票代码是否正确")
+        
+        if ctx.daily.empty:
+            self._raise_if_fetch_failed(ctx, 'daily_data', '历史数据')
+            raise ValueError(f"无法获取股票 {code} 的历史数据")
+        
+        # 3. 计算数据指纹
+        data_hash = ctx.data_hash(self.cache_service)
+        
+        # 4. 检查缓存（除非强制刷新）；已过期但在宽限期内的旧结果直接返回，
+        #    并在后台重新生成（临近过期的热点股票也会提前刷新）
+        if not force_refresh:
+            cached_result, state = self._get_cached_analysis(code, data_hash, profile)
+            if state != MISS:
+                if state != FRESH:
+                    self._revalidate(ctx, data_hash, profile)
+                return ctx, data_hash, {
+                    'stock_info': stock_info,
+                    'analysis': cached_result,
+                    'preference': profile.to_dict(),
+                    'cached': True,
+                    'stale': state == STALE,
+                    'generated_at': None  # 来自缓存
+                }
+        
+        return ctx, data_hash, None
+    
+    @staticmethod
+    def _raise_if_fetch_failed(ctx: MarketDataContext, name: str, label: str):
+        """
+        数据缺失是因为获取失败（熔断、超时、限流等）时抛出 RuntimeError（503），
+        而不是误报为股票代码错误；只有上游明确返回无数据时才由调用方按400处理
+        """
+        error = ctx.errors.get(name)
+        if isinstance(error, CircuitOpenError):
+            raise error
+        if error is not None:
+            raise RuntimeError(f"获取股票 {ctx.code} 的{label}失败，请稍后重试: {error}") from error
+    
+    def _revalidate(self, ctx: MarketDataContext, data_hash: str, profile: PreferenceProfile):
+        """在LLM线程池中后台重新生成分析并写入缓存（与强制刷新共用合并键）"""
+        key = (ctx.code, profile.key)
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        
+        def task():
+            try:
+                self._flight.do(
+                    ('diagnose', ctx.code, profile.key, True),
+                    self._run_analysis, ctx, data_hash, profile
+                )
+            except Exception as e:
+                logger.warning(f"后台刷新分析失败 [{ctx.code}]: {e}")
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+        
+        self.batch_llm.submit(task)
+    
+    def _run_analysis(self, ctx: MarketDataContext, data_hash: str, profile: PreferenceProfile) -> Dict:
+        """调用LLM分析并缓存结果"""
+        # 5-6. 技术指标基于上下文中的日线计算，不再重复请求历史数据
+        technical = ctx.technical
+        
+        # 7. 调用LLM进行分析
+        analysis_result = self._analyze_with_llm(ctx, profile)
+        
+        # 8. 合并技术指标到结果
+        analysis_result['technical_indicators'] = technical
+        
+        # 9. 缓存结果
+        self._cache_analysis(ctx.code, data_hash, analysis_result, profile)
+        
+        from datetime import datetime
+        return {
+            'stock_info': ctx.stock_info,
+            'analysis': analysis_result,
+            'preference': profile.to_dict(),
+            'cached': False,
+            'stale': False,
+            'generated_at': datetime.now().isoformat()
+        }
+    
+    def _analyze_with_llm(self, ctx: MarketDataContext, profile: PreferenceProfile) -> Dict:
+        """
+        使用云端LLM进行分析
+        
+        流程：
+        1. 准备数据摘要（two_stage 模式下先由局域网LLM整理原始数据）
+        2. 使用云端LLM进行分析（LLM自主给出策略）
+        """
+        # 检查云端LLM是否可用
+        if not self.cloud_llm.enabled:
+            raise RuntimeError("未配置云端LLM，无法进行分析")
+        
+        # 使用云端LLM进行分析
+        analysis_prompt = self._build_analysis_prompt(ctx, profile)
+        
+        try:
+            response = self.cloud_llm.complete(
+                analysis_prompt, 
+                system_prompt=ANALYSIS_SYSTEM_PROMPT
+            )
+            
+            # 解析JSON响应
+            return self._parse_analysis_response(response)
+        except Exception as e:
+            raise RuntimeError(f"云端LLM分析失败: {e}")
+    
+    def _build_analysis_prompt(self, ctx: MarketDataContext, profile: PreferenceProfile) -> str:
+        """
+        构建分析请求的用户消息（只含可变数据）
+        
+        固定指令都在 ANALYSIS_SYSTEM_PROMPT 中，各次请求的前缀完全相同，可命中前缀缓存。
+        """
+        stock_info = ctx.stock_info
+        if self.pipeline_mode == 'two_stage':
+            data_summary = self._prepare_structured_summary(ctx)
+        else:
+            data_summary = self._prepare_data_summary(ctx)
+        return STOCK_ANALYSIS_PROMPT.format(
+            stock_name=stock_info.get('name', ''),
+            stock_code=stock_info.get('code', ''),
+            structured_data=data_summary,
+            user_preference=profile.describe()
+        )
+    
+    def _prepare_structured_summary(self, ctx: MarketDataContext) -> str:
+        """
+        两阶段流水线的数据摘要：基本信息 + 局域网LLM整理的结构化摘要
+        
+        局域网LLM不可用或失败时，按 fallback 配置退回原始数据摘要或报错。
+        """
+        data_hash = ctx.data_hash(self.cache_service)
+        try:
+            structured = self._flight.do(
+                ('structured', ctx.code, data_hash),
+                self._structure_data, ctx, data_hash
+            )
+        except Exception as e:
+            if not self.fallback_to_raw:
+                raise RuntimeError(f"局域网LLM数据整理失败: {e}")
+            logger.warning(f"局域网LLM数据整理失败，改用原始数据摘要 [{ctx.code}]: {e}")
+            return self._prepare_data_summary(ctx)
+        
+        return self._prepare_basic_info(ctx) + f"""
+## 数据整理摘要
+{structured}
+"""
+    
+    def _structure_data(self, ctx: MarketDataContext, data_hash: str) -> str:
+        """第一阶段：局域网LLM将原始行情、指标和资金流向压缩为结构化摘要"""
+        cached = self.cache_service.get(ctx.code, 'structured', data_hash)
+        if cached:
+            return cached['summary']
+        
+        if not self.local_llm.enabled:
+            raise RuntimeError("局域网LLM未启用")
+        
+        prompt = DATA_STRUCTURE_PROMPT.format(raw_data=self._prepare_raw_data(ctx))
+        summary = self.local_llm.complete(prompt, system_prompt=DATA_STRUCTURE_SYSTEM_PROMPT).strip()
+        if not summary:
+            raise RuntimeError("局域网LLM返回空摘要")
+        
+        self.cache_service.set(ctx.code, 'structured', data_hash, {'summary': summary})
+        return summary
+    
+    def _prepare_raw_data(self, ctx: MarketDataContext) -> str:
+        """准备交给局域网LLM整理的原始数据（比直连摘要包含更多交易日和字段）"""
+        technical = ctx.technical
+        fund_flow = ctx.fund_flow
+        raw = self._prepare_basic_info(ctx) + f"""
+## 日线数据（最近{self.pipeline_raw_days}日）
+日期 开盘 收盘 最高 最低 涨跌幅% 成交量 换手率%
+"""
+        for day in ctx.recent_bars(self.pipeline_raw_days).itertuples(index=False):
+            raw += (f"{day.trade_date} {day.open:.2f} {day.close:.2f} {day.high:.2f} {day.low:.2f} "
+                    f"{day.change_pct:.2f} {day.volume:.0f} {day.turnover:.2f}\n")
+        
+        if technical:
+            raw += f"""
+## 技术指标
+{json.dumps(technical, ensure_ascii=False)}
+"""
+        
+        if fund_flow:
+            raw += f"""
+## 资金流向
+{json.dumps(fund_flow, ensure_ascii=False)}
+"""
+        
+        return raw
+    
+    def _prepare_basic_info(self, ctx: MarketDataContext) -> str:
+        """股票基本信息段落"""
+        stock_info = ctx.stock_info
+        return f"""
+## 股票基本信息
+- 股票名称: {stock_info.get('name', 'N/A')}
+- 股票代码: {stock_info.get('code', 'N/A')}
+- 所属行业: {stock_info.get('industry', 'N/A')}
+- 市盈率: {stock_info.get('pe_ratio', 'N/A')}
+- 市净率: {stock_info.get('pb_ratio', 'N/A')}
+- 当前价格: {stock_info.get('current_price', 'N/A')}
+- 涨跌幅: {stock_info.get('change_pct', 'N/A')}%
+"""
+    
+    def _prepare_data_summary(self, ctx: MarketDataContext) -> str:
+        """准备数据摘要"""
+        technical = ctx.technical
+        fund_flow = ctx.fund_flow
+        summary = self._prepare_basic_info(ctx) + """
+## 近期走势（最近5日）
+"""
+        # 添加最近5天的数据
+        for day in ctx.recent_bars(5).itertuples(index=False):
+            summary += f"- {day.trade_date}: 开{day.open} 收{day.close} 高{day.high} 低{day.low} 涨跌{day.change_pct}%\n"
+        
+        # 添加技术指标
+        if technical:
+            summary += f"""
+## 技术指标
+- MA5: {technical.get('ma5', 'N/A')}
+- MA10: {technical.get('ma10', 'N/A')}
+- MA20: {technical.get('ma20', 'N/A')}
+- MACD: {technical.get('macd', {}).get('signal', 'N/A')}
+- KDJ: K={technical.get('kdj', {}).get('k', 'N/A')}, D={technical.get('kdj', {}).get('d', 'N/A')}, J={technical.get('kdj', {}).get('j', 'N/A')}
+- RSI: {technical.get('rsi', 'N/A')}
+"""
+        
+        # 添加资金流向
+        if fund_flow:
+            summary += f"""
+## 资金流向
+- 主力净流入: {fund_flow.get('main_net_inflow', 'N/A')}
+- 主力净流入占比: {fund_flow.get('main_net_inflow_pct', 'N/A')}%
+"""
+        
+        return summary
+    
+    def _parse_analysis_response(self, response: str) -> Dict:
+        """解析LLM的分析响应"""
+        try:
+            # 尝试提取JSON
+            import re
+            json_match = re.search(r'\{[\s\S]*\}', response)
+            if json_match:
+                return json.loads(json_match.group())
+        except json.JSONDecodeError:
+            pass
+        
+        # 如果无法解析JSON，返回文本格式
+        return {
+            'summary': response,
+            'daily': {
+                'trend': '无法解析',
+                'suggestion': '请查看综合分析',
+                'confidence': 0.5,
+                'reason': response[:200]
+            },
+            'weekly': {
+                'trend': '无法解析',
+                'suggestion': '请查看综合分析',
+                'confidence': 0.5,
+                'reason': ''
+            },
+            'longterm': {
+                'trend': '无法解析',
+                'suggestion': '请查看综合分析',
+                'confidence': 0.5,
+                'reason': ''
+            }
+        }
+    
+    def _get_cached_analysis(self, code: str, data_hash: str,
+                             profile: PreferenceProfile) -> Tuple[Optional[Dict], str]:
+        """获取缓存的分析结果及其状态（按偏好画像区分，如 analysis@long-low）"""
+        return self.cache_service.lookup(code, profile.cache_type, data_hash)
+    
+    def _cache_analysis(self, code: str, data_hash: str, result: Dict,
+                        profile: PreferenceProfile):
+        """缓存分析结果"""
+        self.cache_service.set(code, profile.cache_type, data_hash, result)
+
+# 单例
+llm_service = LLMService()
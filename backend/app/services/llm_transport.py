@@ -0,0 +1,184 @@
+"""
+LLM HTTP传输层 - 各LLM后端共享的连接池
+
+- 每个后端一个长连接客户端：显式的连接池上限和keep-alive，
+  并发诊断复用已建立的TCP/TLS连接，不再每次握手
+- 安装了 h2 时启用 HTTP/2（云端API多路复用同一连接）
+- 每个后端独立的并发上限，避免大量并发诊断压垮提供方
+- 每个后端的请求经令牌桶限速（{name}_llm，多个服务进程共享配额）
+- 同步客户端供Flask线程使用；异步客户端按事件循环各建一个
+"""
+import asyncio
+import logging
+import weakref
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from typing import Dict, Iterator, Optional
+
+import httpx
+
+from app.utils.rate_limiter import RateLimiter, get_limiter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 各后端默认参数，可在 llm_config.json 的 llm_transport 段按后端覆盖
+DEFAULT_TRANSPORT_CONFIG = {
+    'max_connections': 20,
+    'max_keepalive_connections': 10,
+    'keepalive_expiry': 60,
+    'max_concurrency': 8,
+    'http2': True
+}
+
+
+class LLMTransport:
+    """单个LLM后端的连接池与并发上限"""
+
+    def __init__(self, name: str, timeout: float = 60, headers: Optional[Dict[str, str]] = None,
+                 max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 60, max_concurrency: int = 8, http2: bool = True,
+                 limiter: Optional[RateLimiter] = None):
+        """
+        Args:
+            name: 后端名称（日志用）
+            timeout: 默认请求超时（秒）
+            headers: 每个请求都携带的请求头（如认证）
+            max_connections: 连接池最大连接数
+            max_keepalive_connections: 保持空闲的最大连接数
+            keepalive_expiry: 空闲连接保留时间（秒）
+            max_concurrency: 同时进行的请求上限
+            http2: 是否尝试HTTP/2（需安装 h2）
+            limiter: 请求频率限制器（不传则不限速）
+        """
+        self.name = name
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.max_concurrency = max_concurrency
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.limiter = limiter
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+
+        self._slots = BoundedSemaphore(max_concurrency)
+        self._client: Optional[httpx.Client] = None
+        self._lock = Lock()
+        # 异步客户端和信号量只能在创建它们的事件循环中使用
+        self._async: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> httpx.Client:
+        """共享的同步客户端（线程安全，懒创建）"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        timeout=self.timeout,
+                        headers=self.headers,
+                        limits=self._limits,
+                        http2=self.http2
+                    )
+        return self._client
+
+    def post(self, url: str, json: dict, headers: Optional[Dict[str, str]] = None,
+             timeout: Optional[float] = None) -> httpx.Response:
+        """在频率限制和并发上限内发送POST请求"""
+        self._acquire_rate()
+        with self._slots:
+            return self.client.post(url, json=json, headers=headers,
+                                    timeout=timeout or self.timeout)
+
+    @contextmanager
+    def stream(self, method: str, url: str, json: Optional[dict] = None,
+               headers: Optional[Dict[str, str]] = None,
+               timeout: Optional[float] = None) -> Iterator[httpx.Response]:
+        """在频率限制和并发上限内发送流式请求，响应读取完毕前一直占用名额"""
+        self._acquire_rate()
+        with self._slots:
+            with self.client.stream(method, url, json=json, headers=headers,
+                                    timeout=timeout or self.timeout) as response:
+                yield response
+
+    def get(self, url: str, timeout: Optional[float] = None) -> httpx.Response:
+        """发送GET请求（健康检查等轻量请求，不占用并发名额）"""
+        return self.client.get(url, timeout=timeout or self.timeout)
+
+    async def apost(self, url: str, json: dict, headers: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None) -> httpx.Response:
+        """异步发送POST请求（每个事件循环独立的连接池和并发上限）"""
+        if self.limiter is not None:
+            await self.limiter.aacquire_or_raise()
+        client, slots = self._async_resources()
+        async with slots:
+            return await client.post(url, json=json, headers=headers,
+                                     timeout=timeout or self.timeout)
+
+    def _acquire_rate(self):
+        """等待令牌，超时抛出 RateLimitExceeded"""
+        if self.limiter is not None:
+            self.limiter.acquire_or_raise()
+
+    def _async_resources(self):
+        """获取当前事件循环的异步客户端和信号量"""
+        loop = asyncio.get_running_loop()
+        resources = self._async.get(loop)
+        if resources is None:
+            resources = (
+                httpx.AsyncClient(
+                    timeout=self.timeout,
+                    headers=self.headers,
+                    limits=self._limits,
+                    http2=self.http2
+                ),
+                asyncio.Semaphore(self.max_concurrency)
+            )
+            self._async[loop] = resources
+        return resources
+
+    def close(self):
+        """关闭同步客户端"""
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception:
+                    pass
+                self._client = None
+
+
+def create_transport(name: str, timeout: float = 60, headers: Optional[Dict[str, str]] = None,
+                     **defaults) -> LLMTransport:
+    """
+    按配置创建后端传输层
+
+    Args:
+        name: 后端名称，对应 llm_config.json 中 llm_transport 下的键（cloud / local）
+        timeout: 请求超时（秒）
+        headers: 默认请求头
+        **defaults: 覆盖 DEFAULT_TRANSPORT_CONFIG 的后端默认值
+
+    Returns:
+        LLMTransport
+    """
+    try:
+        from app.config import BaseConfig
+        overrides = BaseConfig.LLM_TRANSPORT_CONFIG.get(name, {})
+    except:
+        overrides = {}
+
+    options = dict(DEFAULT_TRANSPORT_CONFIG)
+    options.update(defaults)
+    options.update(overrides)
+    if options['http2'] and not HTTP2_AVAILABLE:
+        logger.info(f"[{name}] 未安装 h2，LLM请求使用 HTTP/1.1")
+    return LLMTransport(name, timeout=timeout, headers=headers,
+                        limiter=get_limiter(f'{name}_llm'), **options)
@@ -1,122 +1,251 @@
-"""
-局域网LLM服务 - 通过llama.cpp server调用
-"""
-import httpx
-from typing import Optional
-from flask import current_app
-
-
-class LocalLLM:
-    """局域网LLM封装（llama.cpp server）"""
-    
-    def __init__(self):
-        self._config = None
-    
-    @property
-    def config(self) -> dict:
-        """获取局域网LLM配置"""
-        if self._config is None:
-            try:
-                from app.config import BaseConfig
-                self._config = BaseConfig.LOCAL_LLM_CONFIG.get('local_llm', {})
-            except:
-                self._config = {}
-        return self._config
-    
-    @property
-    def enabled(self) -> bool:
-        return self.config.get('enabled', False)
-    
-    @property
-    def api_url(self) -> str:
-        return self.config.get('api_url', 'http://localhost:8080')
-    
-    @property
-    def api_key(self) -> str:
-        return self.config.get('api_key', '')
-    
-    @property
-    def timeout(self) -> int:
-        return self.config.get('timeout', 120)
-    
-    @property
-    def max_tokens(self) -> int:
-        return self.config.get('max_tokens', 4096)
-    
-    @property
-    def temperature(self) -> float:
-        return self.config.get('temperature', 0.7)
-    
-    def complete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """
-        调用局域网LLM生成回复
-        
-        Args:
-            prompt: 用户输入
-            system_prompt: 系统提示词（可选）
-            
-        Returns:
-            LLM生成的内容
-        """
-        # 打印请求内容
-        print("=" * 50)
-        print("[局域网LLM请求]")
-        print(f"URL: {self.api_url}/v1/chat/completions")
-        if system_prompt:
-            print(f"\n[系统提示词]\n{system_prompt[:500]}...")
-        print(f"\n[用户提示词]\n{prompt[:1000]}...")
-        print("=" * 50)
-        
-        if not self.enabled:
-            raise RuntimeError("局域网LLM未启用，请检查配置文件")
-        
-        headers = {'Content-Type': 'application/json'}
-        if self.api_key:
-            headers['Authorization'] = f'Bearer {self.api_key}'
-        
-        # 构建消息
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
-        
-        # llama.cpp server 兼容 OpenAI API 格式
-        payload = {
-            "messages": messages,
-            "max_tokens": self.max_tokens,
-            "temperature": self.temperature,
-            "stream": False
-        }
-        
-        try:
-            with httpx.Client(timeout=self.timeout) as client:
-                response = client.post(
-                    f"{self.api_url}/v1/chat/completions",
-                    json=payload,
-                    headers=headers
-                )
-                response.raise_for_status()
-                result = response.json()
-                return result['choices'][0]['message']['content']
-        except httpx.TimeoutException:
-            raise RuntimeError(f"局域网LLM请求超时（{self.timeout}秒）")
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"局域网LLM请求失败: {e.response.status_code}")
-        except Exception as e:
-            raise RuntimeError(f"局域网LLM调用错误: {str(e)}")
-    
-    def health_check(self) -> bool:
-        """检查局域网LLM服务是否可用"""
-        if not self.enabled:
-            return False
-        
-        try:
-            with httpx.Client(timeout=5) as client:
-                response = client.get(f"{self.api_url}/health")
-                return response.status_code == 200
-        except:
-            return False
-
-
-# 单例
-local_llm = LocalLLM()
+"""
+局域网LLM服务 - 通过llama.cpp server调用
+
+支持配置多台服务器（api_urls），请求路由到最空闲的健康端点，见 local_llm_pool。
+"""
+import httpx
+from typing import Iterator, List, Optional
+from flask import current_app
+
+from app.services.llm_transport import create_transport
+from app.services.local_llm_pool import EndpointPool
+from app.utils.sse import iter_chat_deltas
+
+
+class LocalLLM:
+    """局域网LLM封装（llama.cpp server）"""
+    
+    def __init__(self):
+        self._config = None
+        self._pool = None
+    
+    @property
+    def config(self) -> dict:
+        """获取局域网LLM配置"""
+        if self._config is None:
+            try:
+                from app.config import BaseConfig
+                self._config = BaseConfig.LOCAL_LLM_CONFIG.get('local_llm', {})
+            except:
+                self._config = {}
+        return self._config
+    
+    @property
+    def enabled(self) -> bool:
+        return self.config.get('enabled', False)
+    
+    @property
+    def api_urls(self) -> List[str]:
+        """所有端点地址（api_urls 优先，兼容单个 api_url）"""
+        urls = self.config.get('api_urls')
+        if urls:
+            return list(urls)
+        return [self.config.get('api_url', 'http://localhost:8080')]
+    
+    @property
+    def api_url(self) -> str:
+        """端点地址（多台时以逗号分隔，用于展示）"""
+        return ', '.join(self.api_urls)
+    
+    @property
+    def api_key(self) -> str:
+        return self.config.get('api_key', '')
+    
+    @property
+    def timeout(self) -> int:
+        return self.config.get('timeout', 120)
+    
+    @property
+    def max_tokens(self) -> int:
+        return self.config.get('max_tokens', 4096)
+    
+    @property
+    def temperature(self) -> float:
+        return self.config.get('temperature', 0.7)
+    
+    @property
+    def cache_prompt(self) -> bool:
+        """
+        是否让 llama.cpp 复用相同前缀的KV缓存（不指定槽位：server 会把请求分给
+        缓存前缀最相近的空闲槽位，所有槽位都能并行处理）
+        """
+        return self.config.get('cache_prompt', True)
+    
+    @property
+    def pool(self) -> EndpointPool:
+        """端点池（每台服务器独立的长连接和并发上限，llama.cpp 并行槽位有限，默认并发较低）"""
+        if self._pool is None:
+            balancer = self.config.get('balancer', {})
+            self._pool = EndpointPool(
+                self.api_urls,
+                transport_factory=lambda url: create_transport(
+                    'local',
+                    timeout=self.timeout,
+                    max_concurrency=4,
+                    http2=False
+                ),
+                health_interval=balancer.get('health_check_interval', 10),
+                health_timeout=balancer.get('health_check_timeout', 5),
+                fail_threshold=balancer.get('fail_threshold', 3),
+                ewma_alpha=balancer.get('latency_ewma_alpha', 0.3)
+            )
+        return self._pool
+    
+    def complete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        """
+        调用局域网LLM生成回复
+        
+        Args:
+            prompt: 用户输入
+            system_prompt: 系统提示词（可选）
+            
+        Returns:
+            LLM生成的内容
+        """
+        payload, headers = self._build_request(prompt, system_prompt, stream=False)
+        tried = set()
+        
+        try:
+            while True:
+                try:
+                    with self.pool.lease(exclude=tried) as endpoint:
+                        tried.add(endpoint.url)
+                        response = endpoint.transport.post(
+                            f"{endpoint.url}/v1/chat/completions",
+                            json=payload,
+                            headers=headers
+                        )
+                        response.raise_for_status()
+                        result = response.json()
+                        return result['choices'][0]['message']['content']
+                except httpx.ConnectError:
+                    # 连接失败时请求尚未发出，换一台重试
+                    if len(tried) >= len(self.pool.endpoints):
+                        raise
+        except httpx.TimeoutException:
+            raise RuntimeError(f"局域网LLM请求超时（{self.timeout}秒）")
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError(f"局域网LLM请求失败: {e.response.status_code}")
+        except Exception as e:
+            raise RuntimeError(f"局域网LLM调用错误: {str(e)}")
+    
+    async def acomplete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        """
+        异步调用局域网LLM生成回复
+        
+        Args:
+            prompt: 用户输入
+            system_prompt: 系统提示词（可选）
+            
+        Returns:
+            LLM生成的内容
+        """
+        payload, headers = self._build_request(prompt, system_prompt, stream=False)
+        tried = set()
+        
+        try:
+            while True:
+                try:
+                    with self.pool.lease(exclude=tried) as endpoint:
+                        tried.add(endpoint.url)
+                        response = await endpoint.transport.apost(
+                            f"{endpoint.url}/v1/chat/completions",
+                            json=payload,
+                            headers=headers
+                        )
+                        response.raise_for_status()
+                        result = response.json()
+                        return result['choices'][0]['message']['content']
+                except httpx.ConnectError:
+                    if len(tried) >= len(self.pool.endpoints):
+                        raise
+        except httpx.TimeoutException:
+            raise RuntimeError(f"局域网LLM请求超时（{self.timeout}秒）")
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError(f"局域网LLM请求失败: {e.response.status_code}")
+        except Exception as e:
+            raise RuntimeError(f"局域网LLM调用错误: {str(e)}")
+    
+    def stream(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        """
+        流式调用局域网LLM，边生成边返回
+        
+        Args:
+            prompt: 用户输入
+            system_prompt: 系统提示词（可选）
+            
+        Yields:
+            依次生成的内容片段
+        """
+        payload, headers = self._build_request(prompt, system_prompt, stream=True)
+        
+        try:
+            with self.pool.lease() as endpoint:
+                with endpoint.transport.stream(
+                    'POST',
+                    f"{endpoint.url}/v1/chat/completions",
+                    json=payload,
+                    headers=headers
+                ) as response:
+                    response.raise_for_status()
+                    yield from iter_chat_deltas(response.iter_lines())
+        except httpx.TimeoutException:
+            raise RuntimeError(f"局域网LLM请求超时（{self.timeout}秒）")
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError(f"局域网LLM请求失败: {e.response.status_code}")
+        except Exception as e:
+            raise RuntimeError(f"局域网LLM调用错误: {str(e)}")
+    
+    def _build_request(self, prompt: str, system_prompt: Optional[str], stream: bool) -> tuple:
+        """构建聊天补全请求体和请求头"""
+        # 打印请求内容
+        print("=" * 50)
+        print("[局域网LLM请求]")
+        print(f"URL: {self.api_url}")
+        if system_prompt:
+            print(f"\n[系统提示词]\n{system_prompt[:500]}...")
+        print(f"\n[用户提示词]\n{prompt[:1000]}...")
+        print("=" * 50)
+        
+        if not self.enabled:
+            raise RuntimeError("局域网LLM未启用，请检查配置文件")
+        
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        
+        # 构建消息
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        # llama.cpp server 兼容 OpenAI API 格式
+        payload = {
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": stream,
+            "cache_prompt": self.cache_prompt
+        }
+        return payload, headers
+    
+    def health_check(self) -> bool:
+        """立即检查所有端点，至少一台可用即返回True"""
+        if not self.enabled:
+            return False
+        
+        try:
+            return self.pool.check_all()
+        except:
+            return False
+    
+    def get_stats(self) -> List[dict]:
+        """各端点的健康状态、进行中请求数和近期延迟"""
+        if self._pool is None:
+            return []
+        return self._pool.get_stats()
+
+
+# 单例
+local_llm = LocalLLM()
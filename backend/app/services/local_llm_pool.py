@@ -0,0 +1,199 @@
+"""
+局域网LLM端点池 - 多台 llama.cpp server 负载均衡
+
+- 路由：在健康端点中选择 (进行中请求数 + 1) × 近期延迟(EWMA) 最小的一台，
+  新请求优先流向空闲且响应快的机器
+- 被动摘除：连续失败（连接错误、超时、5xx）达到阈值即摘除
+- 主动探测：后台线程定期请求 /health，恢复的端点自动重新加入
+- 每个端点有自己的连接池和并发上限，总吞吐随机器数量线性增加
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+import httpx
+
+from app.services.llm_transport import LLMTransport
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    """单个 llama.cpp server 端点"""
+
+    def __init__(self, url: str, transport: LLMTransport):
+        self.url = url.rstrip('/')
+        self.transport = transport
+        self.healthy = True
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # 成功请求耗时的指数加权平均（秒）
+        self.failures = 0                     # 连续失败次数
+
+    def score(self, default_latency: float) -> float:
+        """路由得分（越小越优先）"""
+        latency = self.latency if self.latency is not None else default_latency
+        return (self.in_flight + 1) * latency
+
+    def to_dict(self) -> Dict:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'failures': self.failures
+        }
+
+
+def is_endpoint_failure(error: Exception) -> bool:
+    """请求异常是否说明端点本身有问题（4xx属于请求问题，不计入）"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.HTTPError)
+
+
+class EndpointPool:
+    """局域网LLM端点池"""
+
+    def __init__(self, urls: List[str], transport_factory: Callable[[str], LLMTransport],
+                 health_interval: float = 10, health_timeout: float = 5,
+                 fail_threshold: int = 3, ewma_alpha: float = 0.3):
+        """
+        Args:
+            urls: 端点地址列表
+            transport_factory: 为每个端点创建传输层的函数
+            health_interval: 后台健康检查间隔（秒）
+            health_timeout: 健康检查超时（秒）
+            fail_threshold: 连续失败多少次后摘除
+            ewma_alpha: 延迟平滑系数
+        """
+        self.endpoints = [Endpoint(url, transport_factory(url)) for url in urls]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.fail_threshold = fail_threshold
+        self.ewma_alpha = ewma_alpha
+
+        self._lock = threading.Lock()
+        self._checker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def acquire(self, exclude: Optional[Set[str]] = None) -> Endpoint:
+        """
+        选择当前最优端点并占用一个请求名额
+
+        所有端点都被摘除时仍按得分选择（尽力而为，不直接拒绝请求）。
+
+        Args:
+            exclude: 本次请求已尝试失败的端点地址
+
+        Returns:
+            Endpoint（使用完毕必须调用 release）
+        """
+        self._ensure_checker()
+        exclude = exclude or set()
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep.url not in exclude] or self.endpoints
+            healthy = [ep for ep in candidates if ep.healthy]
+            pool = healthy or candidates
+
+            known = [ep.latency for ep in self.endpoints if ep.latency is not None]
+            default_latency = sum(known) / len(known) if known else 1.0
+            endpoint = min(pool, key=lambda ep: ep.score(default_latency))
+            endpoint.in_flight += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, elapsed: Optional[float] = None,
+                error: Optional[Exception] = None):
+        """
+        释放请求名额并记录结果
+
+        Args:
+            endpoint: acquire 返回的端点
+            elapsed: 成功请求的耗时（秒）
+            error: 请求异常（无异常表示成功）
+        """
+        with self._lock:
+            endpoint.in_flight -= 1
+            if error is None:
+                endpoint.failures = 0
+                if elapsed is not None:
+                    if endpoint.latency is None:
+                        endpoint.latency = elapsed
+                    else:
+                        endpoint.latency += self.ewma_alpha * (elapsed - endpoint.latency)
+            elif is_endpoint_failure(error):
+                endpoint.failures += 1
+                if endpoint.healthy and endpoint.failures >= self.fail_threshold:
+                    endpoint.healthy = False
+                    logger.warning(f"局域网LLM端点连续失败 {endpoint.failures} 次，已摘除: {endpoint.url}")
+
+    @contextmanager
+    def lease(self, exclude: Optional[Set[str]] = None) -> Iterator[Endpoint]:
+        """占用一个端点执行请求，自动记录耗时和失败"""
+        endpoint = self.acquire(exclude)
+        start = time.monotonic()
+        error = None
+        completed = False
+        try:
+            yield endpoint
+            completed = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # 流式响应被调用方中途放弃时只归还名额，不计入延迟
+            elapsed = time.monotonic() - start if completed else None
+            self.release(endpoint, elapsed=elapsed, error=error)
+
+    def check(self, endpoint: Endpoint) -> bool:
+        """探测单个端点并更新其状态"""
+        try:
+            response = endpoint.transport.get(f"{endpoint.url}/health", timeout=self.health_timeout)
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+
+        with self._lock:
+            if ok:
+                if not endpoint.healthy:
+                    logger.info(f"局域网LLM端点恢复，重新加入: {endpoint.url}")
+                endpoint.healthy = True
+                endpoint.failures = 0
+            elif endpoint.healthy:
+                endpoint.healthy = False
+                logger.warning(f"局域网LLM端点健康检查失败，已摘除: {endpoint.url}")
+        return ok
+
+    def check_all(self) -> bool:
+        """探测所有端点，返回是否至少有一个健康"""
+        return any([self.check(ep) for ep in self.endpoints])
+
+    def get_stats(self) -> List[Dict]:
+        """各端点状态"""
+        with self._lock:
+            return [ep.to_dict() for ep in self.endpoints]
+
+    def close(self):
+        """停止后台健康检查并关闭连接"""
+        self._stop.set()
+        for ep in self.endpoints:
+            ep.transport.close()
+
+    def _ensure_checker(self):
+        """首次使用时启动后台健康检查线程"""
+        if self._checker is not None or self.health_interval <= 0:
+            return
+        with self._lock:
+            if self._checker is None:
+                self._checker = threading.Thread(
+                    target=self._run_checker,
+                    name='local-llm-health',
+                    daemon=True
+                )
+                self._checker.start()
+
+    def _run_checker(self):
+        while not self._stop.wait(self.health_interval):
+            for ep in self.endpoints:
+                self.check(ep)
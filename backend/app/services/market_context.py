@@ -0,0 +1,122 @@
+"""
+请求级行情数据上下文 - 一次诊断中每份数据只获取一次
+
+日线以列式DataFrame保存；技术指标、数据摘要和缓存指纹都从这里读取，
+不再重复请求历史数据，也不再在 DataFrame 与 dict 列表之间来回转换。
+"""
+import pandas as pd
+from typing import Dict, Optional
+
+from app.utils.fanout import FanOut, FanOutTasks
+
+
+class MarketDataContext:
+    """单次诊断请求的数据上下文"""
+
+    def __init__(self, code: str, data_service, days: int = 60):
+        """
+        Args:
+            code: 股票代码
+            data_service: 数据服务
+            days: 日线天数
+        """
+        self.code = code
+        self.days = days
+        self.data_service = data_service
+
+        self.stock_info: Optional[Dict] = None
+        self.realtime: Optional[Dict] = None
+        self.daily: pd.DataFrame = pd.DataFrame()
+        self.fund_flow: Optional[Dict] = None
+        self._technical: Optional[Dict] = None
+        # 获取失败的数据项及异常（如上游熔断）
+        self.errors: Dict[str, Exception] = {}
+        # start() 提交、尚未 finish() 的获取任务
+        self._pending: Optional[FanOutTasks] = None
+
+    def load(self, fanout: FanOut, timeouts: Optional[Dict[str, float]] = None) -> 'MarketDataContext':
+        """
+        并发获取基本信息、实时行情、日线和资金流向
+
+        Args:
+            fanout: 并发扇出执行器
+            timeouts: 各项数据的超时配置
+
+        Returns:
+            self
+        """
+        return self.start(fanout, timeouts).finish()
+
+    def start(self, fanout: FanOut, timeouts: Optional[Dict[str, float]] = None) -> 'MarketDataContext':
+        """
+        提交各项数据的获取，不等待（之后调用 finish()；流式接口可先取基本信息）
+
+        Returns:
+            self
+        """
+        code, ds = self.code, self.data_service
+        self._pending = fanout.start({
+            'stock_info': lambda: ds.get_stock_info(code),
+            'realtime': lambda: ds.get_realtime_quote(code),
+            'daily_data': lambda: ds.get_daily_frame(code, self.days),
+            'fund_flow': lambda: ds.get_fund_flow(code)
+        }, timeouts=timeouts)
+        return self
+
+    def wait_stock_info(self) -> Optional[Dict]:
+        """
+        只等待基本信息（实时行情已返回时一并补充价格），不等待日线和资金流向
+
+        Returns:
+            基本信息，获取失败为None
+        """
+        realtime = self._pending.get('realtime') if self._pending.done('realtime') else None
+        return self._merge_quote(self._pending.get('stock_info'), realtime)
+
+    def finish(self) -> 'MarketDataContext':
+        """
+        等待 start() 提交的全部数据
+
+        Returns:
+            self
+        """
+        data, self.errors = self._pending.collect()
+        self.realtime = data.get('realtime')
+        self.stock_info = self._merge_quote(data.get('stock_info'), self.realtime)
+
+        daily = data.get('daily_data')
+        if daily is not None:
+            self.daily = daily
+        self.fund_flow = data.get('fund_flow')
+        return self
+
+    @staticmethod
+    def _merge_quote(stock_info: Optional[Dict], realtime: Optional[Dict]) -> Optional[Dict]:
+        """基本信息补充行情价格（基本信息可能被并发请求共享，复制后再修改）"""
+        if not stock_info:
+            return None
+        stock_info = dict(stock_info)
+        if realtime:
+            stock_info['current_price'] = realtime['current_price']
+            stock_info['change_pct'] = realtime['change_pct']
+        return stock_info
+
+    @property
+    def technical(self) -> Dict:
+        """技术指标（基于已加载的日线计算一次）"""
+        if self._technical is None:
+            self._technical = self.data_service.calc_technical_indicators(self.daily, code=self.code)
+        return self._technical
+
+    def recent_bars(self, n: int) -> pd.DataFrame:
+        """最近N个交易日"""
+        return self.daily.tail(n)
+
+    def data_hash(self, cache_service) -> str:
+        """基于最新一根K线生成数据指纹"""
+        latest = self.daily.iloc[-1]
+        return cache_service.make_data_hash(
+            latest['close'],
+            latest['volume'],
+            latest['trade_date']
+        )
@@ -0,0 +1,214 @@
+"""
+全市场行情快照 - 每个刷新周期只下载一次 stock_zh_a_spot_em
+
+将约5000行的现货行情表压缩为 代码->行号 索引 + 数值矩阵，
+任意股票的行情查询均为O(1)字典查找，不再逐次扫描DataFrame。
+
+刷新周期跟随交易日历：交易时段内按 refresh_interval 刷新，休市期间快照保持到下一次开盘。
+已有快照时过期刷新在后台进行，读取不等待下载；刷新失败时沿用旧快照，
+retry_interval 秒后再重试（期间的请求不再逐个访问上游）。
+启用跨进程共享缓存时，快照同时发布到共享层，多 worker 部署下每个周期只有一个进程下载。
+"""
+import akshare as ak
+import numpy as np
+import pandas as pd
+import logging
+import threading
+import time
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+from app.services.trading_calendar import trading_calendar
+from app.services.upstream import call_upstream
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.shared_cache import get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+# 行情字段 -> AKShare现货列名
+QUOTE_COLUMNS = {
+    'current_price': '最新价',
+    'change_pct': '涨跌幅',
+    'change_amount': '涨跌额',
+    'volume': '成交量',
+    'amount': '成交额',
+    'high': '最高',
+    'low': '最低',
+    'open': '今开',
+    'prev_close': '昨收',
+    'turnover': '换手率',
+    'amplitude': '振幅'
+}
+
+# 共享缓存中的键
+SHARED_KEY = 'quote_snapshot:spot'
+
+# 缺失时按0处理的字段（与原逐行解析逻辑一致）
+ZERO_IF_MISSING = ('turnover', 'amplitude')
+
+
+class QuoteSnapshot:
+    """全市场行情快照"""
+
+    def __init__(self, refresh_interval: int = 30, retry_interval: int = 10):
+        """
+        Args:
+            refresh_interval: 交易时段内的快照刷新间隔（秒）
+            retry_interval: 刷新失败、沿用旧快照时，距下次重试的间隔（秒）
+        """
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        # (代码->行号索引, 名称列表, 数值矩阵)，整体替换保证读线程看到一致的快照
+        self._snapshot = ({}, [], np.empty((0, len(QUOTE_COLUMNS))))
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self._lock = Lock()
+        # 是否有后台刷新正在进行
+        self._refreshing = False
+
+    @property
+    def fetched_at(self) -> float:
+        """快照生成时间戳"""
+        return self._fetched_at
+
+    def get(self, code: str) -> Optional[Dict]:
+        """
+        获取单只股票行情
+
+        Args:
+            code: 股票代码
+
+        Returns:
+            行情字典，快照中不存在返回None
+        """
+        self._ensure_fresh()
+        return self._lookup(code)
+
+    def get_many(self, codes: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批量获取行情（共用同一份快照）
+
+        Args:
+            codes: 股票代码列表
+
+        Returns:
+            {代码: 行情字典}，不存在的代码不包含在结果中
+        """
+        self._ensure_fresh()
+        result = {}
+        for code in codes:
+            quote = self._lookup(code)
+            if quote is not None:
+                result[code] = quote
+        return result
+
+    def refresh(self):
+        """
+        下载并重建快照（经 spot 熔断器；上游故障时快速失败，不在请求线程上等待重试）
+        """
+        try:
+            df = call_upstream('spot', ak.stock_zh_a_spot_em)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"获取全市场行情失败: {e}") from e
+        self._build(df)
+
+    def _ensure_fresh(self):
+        """
+        快照过期时刷新；并发请求只触发一次下载
+
+        已有快照时直接使用旧快照，由一个后台线程刷新（不阻塞读取）；
+        只有还没有任何快照时，请求才等待下载完成。
+        """
+        if time.time() < self._expires_at:
+            return
+
+        if self._snapshot[0]:
+            self._refresh_in_background()
+            return
+
+        with self._lock:
+            # 双重检查：等待锁期间其他线程可能已完成刷新
+            if time.time() < self._expires_at or self._adopt_shared():
+                return
+            self.refresh()
+
+    def _refresh_in_background(self):
+        """启动后台刷新（已有刷新进行中时直接返回）"""
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._refreshing or time.time() < self._expires_at:
+                return
+            self._refreshing = True
+        finally:
+            self._lock.release()
+        threading.Thread(target=self._background_refresh, name='quote-refresh', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            if not self._adopt_shared():
+                self.refresh()
+        except Exception as e:
+            # 刷新失败时继续使用旧快照，短暂间隔后再重试（熔断中则等到可以探测时）
+            retry = self.retry_interval
+            if isinstance(e, CircuitOpenError):
+                retry = max(retry, e.retry_after)
+            self._expires_at = time.time() + retry
+            logger.warning(f"行情快照刷新失败，沿用旧快照，{retry:.0f}秒后重试: {e}")
+        finally:
+            self._refreshing = False
+
+    def _build(self, df: pd.DataFrame):
+        """将现货行情表转换为 索引 + 数值矩阵"""
+        codes = df['代码'].astype(str).tolist()
+        values = np.column_stack([
+            pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+            for column in QUOTE_COLUMNS.values()
+        ])
+
+        names = df['名称'].astype(str).tolist()
+        fetched_at = time.time()
+        expires_at = fetched_at + trading_calendar.ttl(self.refresh_interval)
+        self._install(codes, names, values, fetched_at, expires_at)
+
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.set(SHARED_KEY, (codes, names, values, fetched_at), expires_at)
+
+    def _adopt_shared(self) -> bool:
+        """使用其他进程已发布的未过期快照，成功返回True"""
+        shared = get_shared_cache()
+        item = shared.get(SHARED_KEY) if shared is not None else None
+        if item is None:
+            return False
+        (codes, names, values, fetched_at), expires_at, _ = item
+        if fetched_at <= self._fetched_at or time.time() >= expires_at:
+            return False
+        self._install(codes, names, values, fetched_at, expires_at)
+        return True
+
+    def _install(self, codes, names, values, fetched_at: float, expires_at: float):
+        index = {code: i for i, code in enumerate(codes)}
+        self._snapshot = (index, names, values)
+        self._fetched_at = fetched_at
+        self._expires_at = expires_at
+
+    def _lookup(self, code: str) -> Optional[Dict]:
+        """O(1)查找单只股票"""
+        index, names, values = self._snapshot
+        i = index.get(code)
+        if i is None:
+            return None
+
+        quote = {'code': code, 'name': names[i]}
+        for field, value in zip(QUOTE_COLUMNS, values[i].tolist()):
+            if value != value:  # NaN
+                value = 0 if field in ZERO_IF_MISSING else None
+            quote[field] = value
+        return quote
+
+
+# 单例
+quote_snapshot = QuoteSnapshot()
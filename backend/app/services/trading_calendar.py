@@ -0,0 +1,266 @@
+"""
+交易日历 - A股交易日与交易时段
+
+交易日列表来自 AKShare（新浪交易日历），缓存在本地JSON文件中，每隔数天才刷新一次；
+获取失败且没有本地缓存时按周一至周五近似。
+
+各级缓存据此决定有效期：连续竞价时段内使用短TTL，休市期间（午休、收盘后、
+周末和节假日）数据不会变化，直接保持到下一次开盘。
+"""
+import akshare as ak
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from pathlib import Path
+from threading import Lock
+from typing import FrozenSet, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from app.services.upstream import call_upstream
+
+logger = logging.getLogger(__name__)
+
+# 默认交易时段（连续竞价）
+DEFAULT_SESSIONS = [['09:30', '11:30'], ['13:00', '15:00']]
+
+# 获取交易日历失败后的重试间隔（秒）
+RETRY_INTERVAL = 3600
+
+# 向后查找下一个交易日的最大天数（超过即认为日历异常）
+MAX_LOOKAHEAD_DAYS = 60
+
+
+def _parse_time(value: str) -> dtime:
+    hour, minute = value.split(':')
+    return dtime(int(hour), int(minute))
+
+
+class TradingCalendar:
+    """交易日历"""
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """
+        Args:
+            cache_path: 本地缓存文件路径（默认 data/trade_calendar.json）
+        """
+        try:
+            from app.config import BaseConfig
+            calendar_config = BaseConfig.TRADING_CALENDAR_CONFIG
+            default_path = BaseConfig.BASE_DIR / 'data' / 'trade_calendar.json'
+        except:
+            calendar_config = {}
+            default_path = Path('data') / 'trade_calendar.json'
+
+        self.tz = ZoneInfo(calendar_config.get('timezone', 'Asia/Shanghai'))
+        self.sessions: List[Tuple[dtime, dtime]] = [
+            (_parse_time(start), _parse_time(end))
+            for start, end in calendar_config.get('sessions', DEFAULT_SESSIONS)
+        ]
+        # 每个时段结束后仍按盘中处理的分钟数，保证收盘后至少再取一次最终数据
+        self.settle = timedelta(minutes=calendar_config.get('settle_minutes', 5))
+        self.refresh_days = calendar_config.get('refresh_days', 7)
+        self.cache_path = Path(cache_path or calendar_config.get('cache_file') or default_path)
+
+        self._days: Optional[FrozenSet[date]] = None
+        self._range: Optional[Tuple[date, date]] = None
+        self._reload_at = 0.0
+        self._lock = Lock()
+
+    def is_trading_day(self, day: date) -> bool:
+        """是否为交易日（日历范围外按周一至周五近似）"""
+        days = self._trade_days()
+        if days is not None and self._range[0] <= day <= self._range[1]:
+            return day in days
+        return day.weekday() < 5
+
+    def is_trading_time(self, now: Optional[datetime] = None) -> bool:
+        """当前是否处于交易时段（含每个时段结束后的结算缓冲）"""
+        now = self._localize(now)
+        if not self.is_trading_day(now.date()):
+            return False
+        for start, end in self._session_bounds(now.date()):
+            if start <= now < end:
+                return True
+        return False
+
+    def next_session_open(self, now: Optional[datetime] = None) -> datetime:
+        """
+        下一个交易时段的开始时间（now 已在时段内时返回 now）
+
+        Returns:
+            交易所时区的带时区时间
+        """
+        now = self._localize(now)
+        day = now.date()
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if self.is_trading_day(day):
+                for start, end in self._session_bounds(day):
+                    if now < end:
+                        return max(now, start)
+            day += timedelta(days=1)
+        raise RuntimeError(f"{MAX_LOOKAHEAD_DAYS}天内没有交易日，请检查交易日历")
+
+    def next_trading_day(self, day: date, include_today: bool = True) -> date:
+        """day 当天或之后的第一个交易日"""
+        if not include_today:
+            day += timedelta(days=1)
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if self.is_trading_day(day):
+                return day
+            day += timedelta(days=1)
+        raise RuntimeError(f"{MAX_LOOKAHEAD_DAYS}天内没有交易日，请检查交易日历")
+
+    def ttl(self, live_ttl: float, now: Optional[datetime] = None) -> float:
+        """
+        按交易时段计算缓存有效期
+
+        Args:
+            live_ttl: 交易时段内的有效期（秒）
+
+        Returns:
+            交易时段内返回 live_ttl；休市时返回距下一次开盘的秒数（不小于 live_ttl）
+        """
+        now = self._localize(now)
+        if self.is_trading_time(now):
+            return live_ttl
+        try:
+            return max(live_ttl, (self.next_session_open(now) - now).total_seconds())
+        except RuntimeError as e:
+            logger.warning(f"{e}，使用盘中有效期")
+            return live_ttl
+
+    def hold_until_open(self, expiry: datetime) -> datetime:
+        """
+        过期时间落在休市期间时顺延到下一次开盘
+
+        Args:
+            expiry: 过期时间（无时区时按本机时区理解）
+
+        Returns:
+            与传入值同类型（带/不带时区）的过期时间
+        """
+        local = self._localize(expiry)
+        if self.is_trading_time(local):
+            return expiry
+        return self._like(self.next_session_open(local), expiry)
+
+    def at_time_on_trading_day(self, now: datetime, at: dtime, include_today: bool = True) -> datetime:
+        """
+        now 之后第一个“交易日的 at 时刻”，如下一个交易日收盘后的 15:30
+
+        Returns:
+            与 now 同类型（带/不带时区）的时间
+        """
+        local = self._localize(now)
+        day = self.next_trading_day(local.date(), include_today)
+        moment = datetime.combine(day, at, tzinfo=self.tz)
+        if moment <= local:
+            moment = datetime.combine(self.next_trading_day(day, include_today=False), at, tzinfo=self.tz)
+        return self._like(moment, now)
+
+    def reload(self):
+        """强制从上游刷新交易日历"""
+        with self._lock:
+            self._reload_at = 0.0
+            self._load(force=True)
+
+    def _session_bounds(self, day: date) -> List[Tuple[datetime, datetime]]:
+        return [
+            (datetime.combine(day, start, tzinfo=self.tz),
+             datetime.combine(day, end, tzinfo=self.tz) + self.settle)
+            for start, end in self.sessions
+        ]
+
+    def _localize(self, moment: Optional[datetime]) -> datetime:
+        """转换到交易所时区（无时区的时间按本机时区理解，与 datetime.now() 一致）"""
+        if moment is None:
+            return datetime.now(self.tz)
+        return moment.astimezone(self.tz)
+
+    @staticmethod
+    def _like(moment: datetime, reference: datetime) -> datetime:
+        """按 reference 的类型返回：无时区时转为本机时区的无时区时间"""
+        if reference.tzinfo is None:
+            return moment.astimezone().replace(tzinfo=None)
+        return moment.astimezone(reference.tzinfo)
+
+    def _trade_days(self) -> Optional[FrozenSet[date]]:
+        """交易日集合；只在 _reload_at 到期时加载（失败后也要等重试间隔，不会每次调用都请求上游）"""
+        if time.time() >= self._reload_at:
+            with self._lock:
+                if time.time() >= self._reload_at:
+                    self._load()
+        return self._days
+
+    def _load(self, force: bool = False):
+        """读取本地缓存，过期或缺失时从上游刷新"""
+        cached = None if force else self._read_cache()
+        if cached is not None:
+            fetched_at, days = cached
+            age = time.time() - fetched_at
+            if age < self.refresh_days * 86400 and max(days) >= datetime.now(self.tz).date():
+                self._set_days(days)
+                self._reload_at = fetched_at + self.refresh_days * 86400
+                return
+
+        try:
+            df = call_upstream('calendar', ak.tool_trade_date_hist_sina)
+            days = [d if isinstance(d, date) else date.fromisoformat(str(d)[:10])
+                    for d in df['trade_date']]
+            self._write_cache(days)
+            self._set_days(days)
+            self._reload_at = time.time() + self.refresh_days * 86400
+            logger.info(f"交易日历已更新: {min(days)} ~ {max(days)}，共 {len(days)} 个交易日")
+        except Exception as e:
+            if cached is not None:
+                self._set_days(cached[1])
+                logger.warning(f"交易日历刷新失败，沿用本地缓存: {e}")
+            elif self._days is None:
+                logger.warning(f"获取交易日历失败，按周一至周五近似: {e}")
+                self._set_days(self._weekdays())
+            else:
+                logger.warning(f"交易日历刷新失败，沿用已加载的日历: {e}")
+            self._reload_at = time.time() + RETRY_INTERVAL
+
+    def _weekdays(self) -> List[date]:
+        """近似日历：今天前后一段时间内的周一至周五（上游恢复后在重试时替换）"""
+        today = datetime.now(self.tz).date()
+        start = today - timedelta(days=366)
+        return [
+            start + timedelta(days=i)
+            for i in range(366 + MAX_LOOKAHEAD_DAYS * 2)
+            if (start + timedelta(days=i)).weekday() < 5
+        ]
+
+    def _set_days(self, days: List[date]):
+        self._days = frozenset(days)
+        self._range = (min(days), max(days))
+
+    def _read_cache(self) -> Optional[Tuple[float, List[date]]]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            days = [date.fromisoformat(d) for d in data['days']]
+            return (data['fetched_at'], days) if days else None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取交易日历缓存失败: {e}")
+            return None
+
+    def _write_cache(self, days: List[date]):
+        """原子写入本地缓存（先写临时文件再替换）"""
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fetched_at': time.time(), 'days': [d.isoformat() for d in sorted(days)]}, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"写入交易日历缓存失败: {e}")
+
+
+# 单例
+trading_calendar = TradingCalendar()
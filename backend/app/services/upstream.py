@@ -0,0 +1,78 @@
+"""
+上游调用 - 所有 AKShare 接口统一经由按上游区分的熔断器和频率限制器
+
+上游名称：
+- spot：全市场实时行情（stock_zh_a_spot_em）
+- hist：个股日线（stock_zh_a_hist）
+- info：个股基本信息（stock_individual_info_em）
+- fund_flow：个股资金流向（stock_individual_fund_flow）
+- calendar：交易日历（tool_trade_date_hist_sina）
+- universe：A股代码名称列表（stock_info_a_code_name，回填命令使用）
+
+熔断参数在 llm_config.json 的 circuit_breaker 节配置（default 为默认值，其余键按上游覆盖），
+频率限制在 rate_limit 节按上游名称配置。
+"""
+from typing import Any, Callable, List, Optional
+
+from app.utils.circuit_breaker import CircuitBreakerRegistry
+from app.utils.fanout import remaining_time
+from app.utils.rate_limiter import get_limiter, rate_limiters
+
+try:
+    from app.config import BaseConfig
+    _breaker_config = dict(BaseConfig.CIRCUIT_BREAKER_CONFIG)
+except:
+    _breaker_config = {}
+
+breakers = CircuitBreakerRegistry(
+    defaults=_breaker_config.pop('default', {}),
+    overrides=_breaker_config
+)
+
+
+def call_upstream(name: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    经频率限制器和熔断器调用上游接口
+
+    Args:
+        name: 上游名称
+        func: AKShare 接口函数
+
+    Raises:
+        CircuitOpenError: 熔断器打开时立即抛出，不再等待令牌或上游超时；取得令牌后并发已满时同样抛出
+        RateLimitExceeded: 等待令牌超时（在扇出任务中以任务剩余时间为上限）
+    """
+    breaker = breakers.get(name)
+    # 熔断中直接拒绝，不消耗令牌；等待令牌期间不占用并发名额，
+    # 并发上限只统计实际在调用上游的请求
+    breaker.check()
+    limiter = get_limiter(name)
+    limiter.acquire_or_raise(timeout=_token_timeout(limiter))
+    probe = breaker.admit()
+
+    try:
+        result = func(*args, **kwargs)
+    except Exception:
+        breaker.finish(probe, success=False)
+        raise
+    breaker.finish(probe, success=True)
+    return result
+
+
+def _token_timeout(limiter) -> Optional[float]:
+    """令牌等待上限：在扇出任务中不超过任务剩余时间，超时的任务不会继续排队等令牌"""
+    budget = remaining_time()
+    if budget is None:
+        return None
+    return max(0.0, min(limiter.acquire_timeout, budget))
+
+
+def upstream_stats() -> List[dict]:
+    """各上游熔断器状态"""
+    return breakers.get_stats()
+
+
+def rate_limit_stats() -> List[dict]:
+    """各上游（含LLM）频率限制器状态"""
+    return rate_limiters.get_stats()
+
@@ -1,7 +1,20 @@
-"""
-工具模块初始化
-"""
-from app.utils.prompts import DATA_STRUCTURE_PROMPT, STOCK_ANALYSIS_PROMPT, SYSTEM_PROMPT
-from app.utils.rate_limiter import RateLimiter
-
-__all__ = ['DATA_STRUCTURE_PROMPT', 'STOCK_ANALYSIS_PROMPT', 'SYSTEM_PROMPT', 'RateLimiter']
+"""
+工具模块初始化
+"""
+from app.utils.prompts import (
+    ANALYSIS_SYSTEM_PROMPT,
+    DATA_STRUCTURE_PROMPT,
+    DATA_STRUCTURE_SYSTEM_PROMPT,
+    STOCK_ANALYSIS_PROMPT,
+    SYSTEM_PROMPT
+)
+from app.utils.rate_limiter import RateLimiter, RateLimitExceeded, get_limiter
+from app.utils.shared_cache import SharedCache, get_shared_cache, init_shared_cache
+from app.utils.single_flight import SingleFlight
+from app.utils.ttl_cache import LRUTTLCache, cache_stats, cached
+
+__all__ = [
+    'ANALYSIS_SYSTEM_PROMPT', 'DATA_STRUCTURE_PROMPT', 'DATA_STRUCTURE_SYSTEM_PROMPT',
+    'STOCK_ANALYSIS_PROMPT', 'SYSTEM_PROMPT', 'RateLimiter', 'RateLimitExceeded', 'get_limiter',
+    'SharedCache', 'get_shared_cache', 'init_shared_cache', 'SingleFlight', 'LRUTTLCache', 'cache_stats', 'cached'
+]
@@ -0,0 +1,231 @@
+"""
+熔断器 - 上游接口连续失败时快速失败，按指数退避 + 抖动探测恢复
+
+状态：
+- closed：正常放行，连续失败达到阈值后转为 open
+- open：直接抛出 CircuitOpenError，不再占用工作线程等待超时；
+  打开时长随连续熔断次数指数增长（带随机抖动，避免多个进程同时探测）
+- half_open：打开时长结束后只放行少量探测请求，成功则恢复 closed，失败则再次 open
+
+同时限制每个上游的并发调用数（舱壁），上游挂起时工作线程不会全部堆积在同一个接口上。
+"""
+import random
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开或并发已满，调用被拒绝"""
+
+    def __init__(self, name: str, retry_after: float = 0, reason: str = '熔断中'):
+        self.name = name
+        self.retry_after = retry_after
+        message = f"上游接口 {name} {reason}"
+        if retry_after > 0:
+            message += f"，约 {retry_after:.0f} 秒后重试"
+        super().__init__(message)
+
+
+class CircuitBreaker:
+    """单个上游的熔断器"""
+
+    def __init__(self, name: str, fail_threshold: int = 5, reset_timeout: float = 10,
+                 max_reset_timeout: float = 300, jitter: float = 0.2,
+                 half_open_calls: int = 1, max_in_flight: int = 16):
+        """
+        Args:
+            name: 上游名称
+            fail_threshold: 连续失败多少次后打开
+            reset_timeout: 首次打开时长（秒）
+            max_reset_timeout: 打开时长上限（秒）
+            jitter: 打开时长的随机抖动比例（0.2 表示 ±20%）
+            half_open_calls: 半开状态下同时放行的探测请求数
+            max_in_flight: 同时进行的最大调用数（0表示不限）
+        """
+        self.name = name
+        self.fail_threshold = fail_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.jitter = jitter
+        self.half_open_calls = half_open_calls
+        self.max_in_flight = max_in_flight
+
+        self._state = CLOSED
+        self._failures = 0          # 连续失败次数
+        self._trips = 0             # 连续熔断次数（决定退避时长）
+        self._open_until = 0.0
+        self._probes = 0
+        self._in_flight = 0
+        self._lock = Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        经熔断器调用上游
+
+        Raises:
+            CircuitOpenError: 熔断器打开或并发已满
+        """
+        probe = self._acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._release(probe, success=False)
+            raise
+        self._release(probe, success=True)
+        return result
+
+    def check(self):
+        """
+        只检查熔断状态和半开探测名额，不占用许可（用于等待令牌之前快速失败）
+
+        Raises:
+            CircuitOpenError: 熔断器打开或正在探测恢复
+        """
+        with self._lock:
+            self._check_state(time.monotonic())
+
+    def admit(self) -> bool:
+        """
+        申请一次调用许可（熔断状态、半开探测名额、并发上限），与 finish() 成对使用
+
+        Returns:
+            是否为半开探测
+
+        Raises:
+            CircuitOpenError: 熔断器打开或并发已满
+        """
+        return self._acquire()
+
+    def finish(self, probe: bool, success: Optional[bool]):
+        """
+        归还 admit() 取得的许可
+
+        Args:
+            probe: admit() 的返回值
+            success: 调用是否成功；None 表示未实际调用上游（如等待令牌超时），不计入成败
+        """
+        self._release(probe, success)
+
+    def reset(self):
+        """手动恢复为 closed"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trips = 0
+            self._probes = 0
+
+    def get_stats(self) -> dict:
+        """
+        获取统计信息
+
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'name': self.name,
+                'state': self._current_state(now),
+                'consecutive_failures': self._failures,
+                'retry_after': round(max(0.0, self._open_until - now), 1),
+                'in_flight': self._in_flight,
+                **self._stats
+            }
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now >= self._open_until:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _acquire(self) -> bool:
+        """申请一次调用许可，返回是否为半开探测"""
+        with self._lock:
+            state = self._check_state(time.monotonic())
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                self._stats['rejected'] += 1
+                raise CircuitOpenError(self.name, reason=f'并发已满（{self.max_in_flight}）')
+
+            probe = state == HALF_OPEN
+            if probe:
+                self._probes += 1
+            self._in_flight += 1
+            self._stats['calls'] += 1
+            return probe
+
+    def _check_state(self, now: float) -> str:
+        """熔断打开或半开探测名额已满时拒绝，返回当前状态（需持有锁）"""
+        state = self._current_state(now)
+        if state == OPEN:
+            self._stats['rejected'] += 1
+            raise CircuitOpenError(self.name, self._open_until - now)
+        if state == HALF_OPEN and self._probes >= self.half_open_calls:
+            self._stats['rejected'] += 1
+            raise CircuitOpenError(self.name, reason='正在探测恢复')
+        return state
+
+    def _release(self, probe: bool, success: Optional[bool]):
+        with self._lock:
+            self._in_flight -= 1
+            if probe:
+                self._probes -= 1
+
+            if success is None:
+                self._stats['calls'] -= 1
+                return
+            if success:
+                self._failures = 0
+                if probe or self._state == HALF_OPEN:
+                    self._state = CLOSED
+                    self._trips = 0
+                return
+
+            self._stats['failures'] += 1
+            self._failures += 1
+            if probe or (self._state == CLOSED and self._failures >= self.fail_threshold):
+                self._trip()
+
+    def _trip(self):
+        """打开熔断器：时长按连续熔断次数指数退避并加抖动"""
+        backoff = min(self.max_reset_timeout, self.reset_timeout * (2 ** self._trips))
+        backoff *= 1 + random.uniform(-self.jitter, self.jitter)
+        self._state = OPEN
+        self._open_until = time.monotonic() + backoff
+        self._trips += 1
+        self._failures = 0
+        self._stats['opened'] += 1
+
+
+class CircuitBreakerRegistry:
+    """按名称管理熔断器，参数可按上游覆盖"""
+
+    def __init__(self, defaults: Optional[Dict] = None, overrides: Optional[Dict[str, Dict]] = None):
+        self.defaults = defaults or {}
+        self.overrides = overrides or {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                options = dict(self.defaults)
+                options.update(self.overrides.get(name, {}))
+                breaker = self._breakers[name] = CircuitBreaker(name, **options)
+            return breaker
+
+    def get_stats(self) -> List[dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.get_stats() for breaker in breakers]
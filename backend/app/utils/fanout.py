@@ -0,0 +1,185 @@
+"""
+并发扇出 - 在有界线程池上并发执行互相独立的阻塞调用
+
+关键路径从各调用耗时之和变为最慢的单个调用；每个调用有独立超时，
+任务在工作线程中自动进入当前Flask应用上下文（数据库会话等依赖它）。
+
+超时从任务开始运行时计起，排队等待工作线程的时间不占用执行时间；排队同样以超时为限，
+超时仍未开始的任务被取消。任务运行期间 remaining_time() 返回剩余时间，
+上游调用据此缩短令牌等待，超时的任务不会继续占用工作线程排队等令牌。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# 当前工作线程正在执行的扇出任务的截止时刻（time.monotonic）
+_local = threading.local()
+
+
+def remaining_time() -> Optional[float]:
+    """
+    当前扇出任务剩余的执行时间（秒）
+
+    Returns:
+        剩余秒数（可能为负）；不在 FanOut.run 的任务中时返回None
+    """
+    deadline = getattr(_local, 'deadline', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class _Task:
+    """一个扇出任务：开始运行的时刻决定其截止时间"""
+
+    def __init__(self, name: str, func: Callable, timeout: float):
+        self.name = name
+        self.func = func
+        self.timeout = timeout
+        self.submitted = time.monotonic()
+        self.started = threading.Event()
+        self.began: Optional[float] = None
+        self.future = None
+
+    def __call__(self):
+        self.began = time.monotonic()
+        self.started.set()
+        _local.deadline = self.began + self.timeout
+        try:
+            return self.func()
+        finally:
+            _local.deadline = None
+
+    def result(self) -> Any:
+        """
+        等待任务结果（提交后排队最多 timeout 秒，开始运行后再最多 timeout 秒）
+
+        Raises:
+            TimeoutError: 排队或执行超时
+        """
+        queue_left = self.submitted + self.timeout - time.monotonic()
+        if not self.started.wait(max(0, queue_left)) and self.future.cancel():
+            raise TimeoutError(f"{self.name} 排队超时")
+        began = self.began if self.began is not None else time.monotonic()
+        try:
+            return self.future.result(timeout=max(0, began + self.timeout - time.monotonic()))
+        except FutureTimeoutError:
+            # 超时任务无法中断，留在线程池内自然结束
+            raise TimeoutError(f"{self.name} 超时") from None
+
+
+class FanOutTasks:
+    """一组已提交的扇出任务"""
+
+    def __init__(self, tasks: List[_Task]):
+        self._tasks = {task.name: task for task in tasks}
+        self._results: Dict[str, Any] = {}
+        self._errors: Dict[str, Exception] = {}
+
+    def get(self, name: str) -> Any:
+        """
+        等待单个任务的结果
+
+        Returns:
+            任务结果；失败或超时时为None（异常见 collect() 的 errors）
+        """
+        if name not in self._results and name not in self._errors:
+            task = self._tasks[name]
+            try:
+                self._results[name] = task.result()
+            except TimeoutError as e:
+                self._errors[name] = e
+                logger.warning(f"并发任务超时: {e}")
+            except Exception as e:
+                self._errors[name] = e
+                logger.warning(f"并发任务失败: {name}: {e}")
+        return self._results.get(name)
+
+    def done(self, name: str) -> bool:
+        """任务是否已结束（不等待）"""
+        return self._tasks[name].future.done()
+
+    def collect(self) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """
+        等待全部任务
+
+        Returns:
+            (results, errors)：成功的结果；失败或超时的异常
+        """
+        for name in self._tasks:
+            self.get(name)
+        return dict(self._results), dict(self._errors)
+
+
+class FanOut:
+    """有界并发扇出执行器"""
+
+    def __init__(self, max_workers: int = 8, default_timeout: float = 20,
+                 thread_name_prefix: str = 'fanout'):
+        """
+        Args:
+            max_workers: 线程池大小（所有请求共享）
+            default_timeout: 默认单个调用超时（秒）
+            thread_name_prefix: 工作线程名前缀
+        """
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=thread_name_prefix
+        )
+
+    def submit(self, func: Callable, *args, **kwargs):
+        """提交单个任务（携带当前应用上下文）"""
+        return self._executor.submit(self._bind_app_context(func), *args, **kwargs)
+
+    def run(self, tasks: Dict[str, Callable],
+            timeouts: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """
+        并发执行一组无参任务并合并结果
+
+        Args:
+            tasks: {名称: 无参可调用对象}
+            timeouts: {名称: 超时秒数}，未指定的使用默认超时（从任务开始运行时计起）
+
+        Returns:
+            (results, errors)：成功的结果；失败或超时的异常
+        """
+        return self.start(tasks, timeouts).collect()
+
+    def start(self, tasks: Dict[str, Callable],
+              timeouts: Optional[Dict[str, float]] = None) -> 'FanOutTasks':
+        """
+        提交一组无参任务，不等待结果（可先取部分任务的结果，见 FanOutTasks.get）
+
+        Args:
+            tasks: {名称: 无参可调用对象}
+            timeouts: {名称: 超时秒数}，未指定的使用默认超时（从任务开始运行时计起）
+
+        Returns:
+            已提交的任务组
+        """
+        timeouts = timeouts or {}
+        pending = []
+        for name, func in tasks.items():
+            task = _Task(name, func, timeouts.get(name, self.default_timeout))
+            task.future = self.submit(task)
+            pending.append(task)
+        return FanOutTasks(pending)
+
+    @staticmethod
+    def _bind_app_context(func: Callable) -> Callable:
+        """将当前Flask应用上下文传递到工作线程"""
+        if not has_app_context():
+            return func
+
+        app = current_app._get_current_object()
+
+        def wrapper(*args, **kwargs):
+            with app.app_context():
+                return func(*args, **kwargs)
+        return wrapper
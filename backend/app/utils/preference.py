@@ -0,0 +1,168 @@
+"""
+投资偏好归一化 - 把用户自由描述的偏好映射为标准画像
+
+画像只有两个维度：投资期限（short/mid/long/any）和风险偏好（low/mid/high/any）。
+语义相同的描述得到同一个画像、共用同一条分析缓存；LLM收到的也是画像的标准描述
+而不是原文，保证缓存中的分析与缓存键一致。
+
+描述中含有关键词以外的内容（如持仓成本、关注的行业、被否定的说法）时无法完整归一化：
+画像会带上原文（note），LLM同时收到原文，缓存按原文的摘要单独存放。
+"""
+import re
+from hashlib import md5
+from typing import Dict, List, Tuple
+
+# 投资期限关键词
+HORIZON_KEYWORDS: Dict[str, List[str]] = {
+    'short': ['短线', '短期', '超短', '日内', '做t', 't+0', '打板', '隔夜', '快进快出', '几天'],
+    'mid': ['中线', '中期', '波段', '几周', '数周', '几个月', '数月', '1-3个月', '一到三个月'],
+    'long': ['长线', '长期', '价值投资', '价值型', '长期持有', '一年以上', '多年', '定投', '养老', '十年']
+}
+
+# 风险偏好关键词
+RISK_KEYWORDS: Dict[str, List[str]] = {
+    'low': ['稳健', '保守', '低风险', '风险承受能力低', '风险承受能力较低', '风险承受能力弱',
+            '风险承受能力较弱', '厌恶风险', '保本', '不能亏', '不想亏'],
+    'mid': ['中等风险', '风险适中', '风险承受能力中等', '风险承受能力一般', '平衡型', '平衡'],
+    'high': ['激进', '高风险', '风险承受能力高', '风险承受能力较高', '风险承受能力强',
+             '风险承受能力较强', '追涨', '博弈', '高收益']
+}
+
+HORIZON_LABELS = {
+    'short': '短线（数日内，关注日内与短期波动）',
+    'mid': '中线（数周至3个月，波段操作）',
+    'long': '长线（3个月以上，关注趋势与基本面）'
+}
+
+RISK_LABELS = {
+    'low': '低（稳健，优先控制回撤）',
+    'mid': '中（收益与风险平衡）',
+    'high': '高（激进，可承受较大波动）'
+}
+
+# 分句：否定只作用于同一分句内其后的关键词（“不做短线，偏好长线”）
+_CLAUSE_SPLIT = re.compile(r'[，,。.;；!！?？、\n]|但是|但|不过|可是|然而|而是')
+
+# 否定词（“非常”“不错”等不是否定）
+_NEGATION = re.compile(r'不(?!错|仅|管|论)|非(?!常)|别|没|无法|难以|拒绝|避免|回避|勿')
+
+# 归一化时可以忽略的常见措辞；去掉关键词和这些措辞后仍有剩余内容的描述视为未完整识别
+_FILLER = ['风险承受能力', '风险偏好', '风险', '投资者', '投资', '一个', '一名', '我是', '我的', '我',
+           '偏好', '偏向', '倾向', '风格', '比较', '喜欢', '希望', '主要', '操作', '交易', '期限',
+           '非常', '特别', '一些', '一点',
+           '是', '的', '做', '型', '者', '和', '与', '及', '偏', '较', '很']
+_PUNCTUATION = re.compile(r'[，,。.;；!！?？、:：\-~～()（）\n]')
+
+
+class PreferenceProfile:
+    """标准化的投资偏好画像"""
+
+    __slots__ = ('horizon', 'risk', 'note')
+
+    def __init__(self, horizon: str = 'any', risk: str = 'any', note: str = ''):
+        """
+        Args:
+            horizon: 投资期限
+            risk: 风险偏好
+            note: 未能完整归一化时的用户原文（空表示描述已被画像完整表达）
+        """
+        self.horizon = horizon
+        self.risk = risk
+        self.note = note
+
+    @property
+    def digest(self) -> str:
+        """原文摘要（无原文时为空）"""
+        return md5(self.note.encode('utf-8')).hexdigest()[:8] if self.note else ''
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.horizon, self.risk, self.digest
+
+    @property
+    def cache_type(self) -> str:
+        """
+        分析缓存类型，如 analysis@long-low；带原文时为 analysis#<原文摘要>
+        （均不超过 analysis_type 列的20个字符）
+        """
+        if self.note:
+            return f"analysis#{self.digest}"
+        return f"analysis@{self.horizon}-{self.risk}"
+
+    def describe(self) -> str:
+        """交给LLM的偏好描述（标准描述，未完整识别时附上用户原文）"""
+        parts = []
+        if self.horizon != 'any':
+            parts.append(f"- 投资期限: {HORIZON_LABELS[self.horizon]}")
+        if self.risk != 'any':
+            parts.append(f"- 风险偏好: {RISK_LABELS[self.risk]}")
+        if self.note:
+            parts.append(f"- 用户原始描述: {self.note}")
+        if not parts:
+            return "无特殊偏好，请自主分析并给出完整策略建议"
+        return '\n'.join(parts)
+
+    def to_dict(self) -> Dict[str, str]:
+        result = {'horizon': self.horizon, 'risk': self.risk}
+        if self.note:
+            result['note'] = self.note
+        return result
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PreferenceProfile) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"PreferenceProfile(horizon={self.horizon!r}, risk={self.risk!r}, note={self.note!r})"
+
+
+def _match(clauses: List[str], keywords: Dict[str, List[str]]) -> str:
+    """返回唯一命中的类别；未命中或命中多个互相矛盾的类别时返回 any"""
+    found = set()
+    for clause in clauses:
+        for level, words in keywords.items():
+            for word in words:
+                start = clause.find(word)
+                while start != -1:
+                    # 同一分句中关键词之前出现否定词时不计入（“不接受高风险”）
+                    if not _NEGATION.search(clause[:start]):
+                        found.add(level)
+                        break
+                    start = clause.find(word, start + 1)
+    return found.pop() if len(found) == 1 else 'any'
+
+
+def _fully_recognized(text: str) -> bool:
+    """去掉关键词、常见措辞和标点后没有剩余内容（含否定词的描述不算完整识别）"""
+    words = [w for group in (HORIZON_KEYWORDS, RISK_KEYWORDS) for ws in group.values() for w in ws]
+    for word in sorted(words, key=len, reverse=True):
+        text = text.replace(word, '')
+    text = _CLAUSE_SPLIT.sub('', text)
+    text = _PUNCTUATION.sub('', text)
+    for word in _FILLER:
+        text = text.replace(word, '')
+    return not text
+
+
+def normalize_preference(text: str) -> PreferenceProfile:
+    """
+    将用户自由描述的投资偏好归一化为画像
+
+    Args:
+        text: 用户偏好描述，如 "我是长期投资者，风险承受能力中等"
+
+    Returns:
+        PreferenceProfile；描述含有无法归一化的内容时 note 为原文
+    """
+    if not text or not text.strip():
+        return PreferenceProfile()
+
+    compact = re.sub(r'\s+', '', text).lower()
+    clauses = _CLAUSE_SPLIT.split(compact)
+    return PreferenceProfile(
+        horizon=_match(clauses, HORIZON_KEYWORDS),
+        risk=_match(clauses, RISK_KEYWORDS),
+        note='' if _fully_recognized(compact) else text.strip()
+    )
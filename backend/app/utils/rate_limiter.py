@@ -1,127 +1,346 @@
-"""
-频率限制器 - 预留接口，初期不启用
-"""
-import time
-from collections import deque
-from threading import Lock
-
-
-class RateLimiter:
-    """
-    频率限制器
-    
-    初期不启用，保留接口供后续扩展
-    """
-    
-    def __init__(self, enabled: bool = False, max_calls_per_minute: int = 60):
-        """
-        初始化频率限制器
-        
-        Args:
-            enabled: 是否启用
-            max_calls_per_minute: 每分钟最大调用次数
-        """
-        self.enabled = enabled
-        self.max_calls = max_calls_per_minute
-        self.call_history: deque = deque()
-        self.lock = Lock()
-    
-    def check_limit(self) -> bool:
-        """
-        检查是否超过频率限制
-        
-        Returns:
-            True: 未超限，可以调用
-            False: 已超限，需要等待
-        """
-        if not self.enabled:
-            return True  # 未启用时总是放行
-        
-        with self.lock:
-            now = time.time()
-            
-            # 清理一分钟前的记录
-            while self.call_history and self.call_history[0] < now - 60:
-                self.call_history.popleft()
-            
-            # 检查是否超限
-            if len(self.call_history) >= self.max_calls:
-                return False
-            
-            return True
-    
-    def record_call(self):
-        """记录一次调用"""
-        if not self.enabled:
-            return
-        
-        with self.lock:
-            self.call_history.append(time.time())
-    
-    def wait_if_needed(self) -> float:
-        """
-        如果需要等待，返回等待时间
-        
-        Returns:
-            需要等待的秒数，0表示无需等待
-        """
-        if not self.enabled:
-            return 0
-        
-        with self.lock:
-            now = time.time()
-            
-            # 清理过期记录
-            while self.call_history and self.call_history[0] < now - 60:
-                self.call_history.popleft()
-            
-            if len(self.call_history) >= self.max_calls:
-                # 计算需要等待的时间
-                oldest = self.call_history[0]
-                wait_time = 60 - (now - oldest)
-                return max(0, wait_time)
-            
-            return 0
-    
-    def enable(self, max_calls_per_minute: int = 60):
-        """
-        启用频率限制
-        
-        Args:
-            max_calls_per_minute: 每分钟最大调用次数
-        """
-        self.enabled = True
-        self.max_calls = max_calls_per_minute
-    
-    def disable(self):
-        """禁用频率限制"""
-        self.enabled = False
-    
-    def get_stats(self) -> dict:
-        """
-        获取统计信息
-        
-        Returns:
-            统计信息字典
-        """
-        with self.lock:
-            now = time.time()
-            
-            # 清理过期记录
-            while self.call_history and self.call_history[0] < now - 60:
-                self.call_history.popleft()
-            
-            return {
-                'enabled': self.enabled,
-                'max_calls_per_minute': self.max_calls,
-                'current_calls_in_window': len(self.call_history),
-                'remaining_calls': max(0, self.max_calls - len(self.call_history))
-            }
-
-
-# 全局实例
-# 云端LLM限制器
-cloud_llm_limiter = RateLimiter(enabled=False, max_calls_per_minute=60)
-
-# 局域网LLM限制器
-local_llm_limiter = RateLimiter(enabled=False, max_calls_per_minute=120)
+"""
+频率限制器 - 令牌桶，按上游区分（云端LLM、局域网LLM、各AKShare接口）
+
+- 令牌按固定速率补充，桶容量即允许的突发请求数
+- acquire() 阻塞等待令牌（可设超时），aacquire() 为异步版本
+- 桶状态可放在进程内存，或放在本地SQLite文件中由多个服务进程共享
+  （BEGIN IMMEDIATE 保证多进程同时取令牌时读-改-写的原子性），
+  多个 worker 合计的请求速率不会超过数据源的限制
+
+各上游的速率在 llm_config.json 的 rate_limit 节配置，未配置的上游不限速。
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+
+class RateLimitExceeded(RuntimeError):
+    """等待令牌超时"""
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        super().__init__(f"上游接口 {name} 请求过于频繁，{timeout:.0f} 秒内未获得令牌")
+
+
+class MemoryBucketBackend:
+    """进程内令牌桶状态"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = Lock()
+
+    def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        """
+        尝试取出令牌
+
+        Returns:
+            0 表示已取得；否则为令牌补足还需等待的秒数（未扣减）
+        """
+        with self._lock:
+            now = time.time()
+            available = self._refill(key, rate, capacity, now)
+            if available >= tokens:
+                self._buckets[key] = (available - tokens, now)
+                return 0.0
+            self._buckets[key] = (available, now)
+            return (tokens - available) / rate
+
+    def available(self, key: str, rate: float, capacity: float) -> float:
+        with self._lock:
+            return self._refill(key, rate, capacity, time.time())
+
+    def _refill(self, key: str, rate: float, capacity: float, now: float) -> float:
+        stored, updated_at = self._buckets.get(key, (capacity, now))
+        return min(capacity, stored + max(0.0, now - updated_at) * rate)
+
+
+class SQLiteBucketBackend:
+    """SQLite文件中的令牌桶状态（多进程共享）"""
+
+    def __init__(self, path: str, busy_timeout: float = 5):
+        """
+        Args:
+            path: 数据库文件路径
+            busy_timeout: 等待其他进程释放写锁的最长时间（秒）
+        """
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        """
+        尝试取出令牌
+
+        Returns:
+            0 表示已取得；否则为令牌补足还需等待的秒数（未扣减）
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            available = self._refill(conn, key, rate, capacity, now)
+            granted = available >= tokens
+            if granted:
+                available -= tokens
+            conn.execute(
+                "INSERT INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, available, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return 0.0 if granted else (tokens - available) / rate
+
+    def available(self, key: str, rate: float, capacity: float) -> float:
+        return self._refill(self._connection(), key, rate, capacity, time.time())
+
+    def _refill(self, conn: sqlite3.Connection, key: str, rate: float,
+                capacity: float, now: float) -> float:
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM rate_buckets WHERE name = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return capacity
+        stored, updated_at = row
+        return min(capacity, stored + max(0.0, now - updated_at) * rate)
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程一个连接（autocommit 模式，事务手动控制）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+
+class RateLimiter:
+    """令牌桶频率限制器"""
+
+    def __init__(self, name: str, rate: float = 1.0, burst: float = 1, enabled: bool = True,
+                 backend=None, acquire_timeout: float = 30):
+        """
+        Args:
+            name: 上游名称（同时是共享桶的键）
+            rate: 每秒补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+            enabled: 是否启用（未启用时总是放行）
+            backend: 桶状态后端，默认进程内存
+            acquire_timeout: acquire 默认等待上限（秒）
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.enabled = enabled and rate > 0
+        self.backend = backend or MemoryBucketBackend()
+        self.acquire_timeout = acquire_timeout
+        self._lock = Lock()
+        self._stats = {'granted': 0, 'waited': 0, 'wait_seconds': 0.0, 'rejected': 0}
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """不等待地尝试取令牌"""
+        if not self.enabled:
+            return True
+        granted = self.backend.take(self.name, self.rate, self.burst, tokens) == 0
+        self._record(granted, 0.0)
+        return granted
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """
+        阻塞等待令牌
+
+        Args:
+            tokens: 需要的令牌数
+            timeout: 最长等待秒数，默认 acquire_timeout
+
+        Returns:
+            是否在超时前取得令牌
+        """
+        if not self.enabled:
+            return True
+        start = time.monotonic()
+        deadline = start + (self.acquire_timeout if timeout is None else timeout)
+        slept = False
+        while True:
+            wait = self.backend.take(self.name, self.rate, self.burst, tokens)
+            now = time.monotonic()
+            if wait == 0:
+                self._record(True, now - start if slept else 0.0)
+                return True
+            if now + wait > deadline:
+                self._record(False, now - start if slept else 0.0)
+                return False
+            time.sleep(wait)
+            slept = True
+
+    async def aacquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """acquire 的异步版本（等待期间不阻塞事件循环）"""
+        if not self.enabled:
+            return True
+        start = time.monotonic()
+        deadline = start + (self.acquire_timeout if timeout is None else timeout)
+        slept = False
+        while True:
+            wait = await self._atake(tokens)
+            now = time.monotonic()
+            if wait == 0:
+                self._record(True, now - start if slept else 0.0)
+                return True
+            if now + wait > deadline:
+                self._record(False, now - start if slept else 0.0)
+                return False
+            await asyncio.sleep(wait)
+            slept = True
+
+    def acquire_or_raise(self, tokens: float = 1, timeout: Optional[float] = None):
+        """
+        等待令牌，超时抛出 RateLimitExceeded
+
+        Raises:
+            RateLimitExceeded: 超时未取得令牌
+        """
+        if not self.acquire(tokens, timeout):
+            raise RateLimitExceeded(self.name, self.acquire_timeout if timeout is None else timeout)
+
+    async def aacquire_or_raise(self, tokens: float = 1, timeout: Optional[float] = None):
+        """aacquire 的异步版本，超时抛出 RateLimitExceeded"""
+        if not await self.aacquire(tokens, timeout):
+            raise RateLimitExceeded(self.name, self.acquire_timeout if timeout is None else timeout)
+
+    def enable(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        """
+        启用频率限制
+
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量
+        """
+        if rate is not None:
+            self.rate = rate
+        if burst is not None:
+            self.burst = burst
+        self.enabled = self.rate > 0
+
+    def disable(self):
+        """禁用频率限制"""
+        self.enabled = False
+
+    def get_stats(self) -> dict:
+        """
+        获取统计信息
+
+        Returns:
+            统计信息字典
+        """
+        available = None
+        if self.enabled:
+            try:
+                available = round(self.backend.available(self.name, self.rate, self.burst), 2)
+            except Exception:
+                pass
+        with self._lock:
+            return {
+                'name': self.name,
+                'enabled': self.enabled,
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'available_tokens': available,
+                'granted': self._stats['granted'],
+                'waited': self._stats['waited'],
+                'wait_seconds': round(self._stats['wait_seconds'], 3),
+                'rejected': self._stats['rejected']
+            }
+
+    async def _atake(self, tokens: float) -> float:
+        """异步取令牌：SQLite 后端的事务和忙等待放到线程池执行，不阻塞事件循环"""
+        if isinstance(self.backend, MemoryBucketBackend):
+            return self.backend.take(self.name, self.rate, self.burst, tokens)
+        return await asyncio.to_thread(self.backend.take, self.name, self.rate, self.burst, tokens)
+
+    def _record(self, granted: bool, waited: float):
+        with self._lock:
+            if granted:
+                self._stats['granted'] += 1
+            else:
+                self._stats['rejected'] += 1
+            if waited > 0:
+                self._stats['waited'] += 1
+                self._stats['wait_seconds'] += waited
+
+
+class RateLimiterRegistry:
+    """按上游名称创建和共享限制器"""
+
+    def __init__(self, config: Optional[Dict] = None, default_path: Optional[str] = None):
+        """
+        Args:
+            config: rate_limit 配置节
+            default_path: SQLite后端的默认文件路径
+        """
+        config = config or {}
+        self.limits: Dict[str, Dict] = config.get('limits', {})
+        self.acquire_timeout = config.get('acquire_timeout', 30)
+        self.backend_name = config.get('backend', 'memory')
+        self.path = config.get('path') or default_path
+        self._backend = None
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = Lock()
+
+    def get(self, name: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                options = self.limits.get(name, {})
+                limiter = self._limiters[name] = RateLimiter(
+                    name,
+                    rate=options.get('rate', 0),
+                    burst=options.get('burst', 1),
+                    enabled=options.get('enabled', bool(options)),
+                    backend=self._get_backend(),
+                    acquire_timeout=options.get('acquire_timeout', self.acquire_timeout)
+                )
+            return limiter
+
+    def get_stats(self) -> List[dict]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.get_stats() for limiter in limiters]
+
+    def _get_backend(self):
+        if self._backend is None:
+            if self.backend_name == 'sqlite' and self.path:
+                self._backend = SQLiteBucketBackend(self.path)
+            else:
+                self._backend = MemoryBucketBackend()
+        return self._backend
+
+
+def _create_registry() -> RateLimiterRegistry:
+    try:
+        from app.config import BaseConfig
+        return RateLimiterRegistry(
+            BaseConfig.RATE_LIMIT_CONFIG,
+            default_path=str(BaseConfig.BASE_DIR / 'data' / 'rate_limits.db')
+        )
+    except:
+        return RateLimiterRegistry()
+
+
+# 全局限制器注册表（cloud_llm / local_llm / spot / hist / info / fund_flow）
+rate_limiters = _create_registry()
+
+
+def get_limiter(name: str) -> RateLimiter:
+    """按上游名称获取限制器"""
+    return rate_limiters.get(name)
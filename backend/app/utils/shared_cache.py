@@ -0,0 +1,195 @@
+"""
+跨进程共享缓存 - 多个 worker 进程共用的一级缓存（SQLite WAL 文件）
+
+多 worker 部署时，每个进程的内存缓存都是冷的、互相重复；共享层放在本机的
+SQLite 文件中（WAL 模式下读写互不阻塞，读走 mmap），一个 worker 获取的数据
+其他 worker 直接命中。值用 pickle 序列化（DataFrame、字典等均可），
+只在本机进程间共享，不接受外部输入。
+
+共享层只是加速层：任何读写错误都当作未命中处理，不影响请求本身。
+"""
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """SQLite WAL 共享缓存"""
+
+    def __init__(self, path: str, max_entries: int = 20000, purge_interval: float = 60,
+                 busy_timeout: float = 2, mmap_size: int = 64 * 1024 * 1024):
+        """
+        Args:
+            path: 数据库文件路径
+            max_entries: 最大条目数（清理时按最近写入时间淘汰多余条目）
+            purge_interval: 每个进程清理过期条目的最小间隔（秒）
+            busy_timeout: 等待写锁的最长时间（秒），超时视为写入失败
+            mmap_size: 读取使用的内存映射大小（字节）
+        """
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'errors': 0}
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """
+        读取条目
+
+        Returns:
+            (值, 过期时间戳, 计算耗时)；不存在或已超过保留期返回None
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at, delta FROM shared_cache WHERE key = ? AND keep_until > ?",
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            return pickle.loads(row[0]), row[1], row[2]
+        except Exception as e:
+            self._error('读取', e)
+            return None
+
+    def set(self, key: str, value: Any, expires_at: float,
+            keep_until: Optional[float] = None, delta: float = 0):
+        """
+        写入条目
+
+        Args:
+            key: 缓存键
+            value: 值（可 pickle 的对象）
+            expires_at: 过期时间戳
+            keep_until: 保留到的时间戳（过期后仍可作为旧值读取），默认等于过期时间
+            delta: 计算该值的耗时（秒）
+        """
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            now = time.time()
+            self._connection().execute(
+                "INSERT INTO shared_cache (key, value, expires_at, keep_until, delta, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "value = excluded.value, expires_at = excluded.expires_at, "
+                "keep_until = excluded.keep_until, delta = excluded.delta, updated_at = excluded.updated_at",
+                (key, blob, expires_at, keep_until or expires_at, delta, now)
+            )
+            self._stats['writes'] += 1
+            self._maybe_purge(now)
+        except Exception as e:
+            self._error('写入', e)
+
+    def delete(self, key: str):
+        try:
+            self._connection().execute("DELETE FROM shared_cache WHERE key = ?", (key,))
+        except Exception as e:
+            self._error('删除', e)
+
+    def delete_prefix(self, prefix: str):
+        """删除所有以 prefix 开头的条目"""
+        try:
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            self._connection().execute(
+                "DELETE FROM shared_cache WHERE key LIKE ? ESCAPE '\\'", (escaped + '%',)
+            )
+        except Exception as e:
+            self._error('删除', e)
+
+    def get_stats(self) -> dict:
+        """
+        获取统计信息
+
+        Returns:
+            统计信息字典（命中等计数为当前进程的）
+        """
+        stats = {'path': self.path, **self._stats}
+        try:
+            stats['entries'] = self._connection().execute(
+                "SELECT COUNT(*) FROM shared_cache"
+            ).fetchone()[0]
+        except Exception:
+            pass
+        return stats
+
+    def _maybe_purge(self, now: float):
+        """定期删除超过保留期的条目，并把条目数控制在上限内"""
+        if now < self._next_purge or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_purge = now + self.purge_interval
+            conn = self._connection()
+            conn.execute("DELETE FROM shared_cache WHERE keep_until <= ?", (now,))
+            conn.execute(
+                "DELETE FROM shared_cache WHERE key IN ("
+                "SELECT key FROM shared_cache ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        finally:
+            self._purge_lock.release()
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程一个连接（autocommit，每条语句即一个事务）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, "
+                "keep_until REAL NOT NULL, delta REAL NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_shared_cache_keep ON shared_cache (keep_until)")
+            self._local.conn = conn
+        return conn
+
+    def _error(self, action: str, e: Exception):
+        self._stats['errors'] += 1
+        logger.warning(f"共享缓存{action}失败: {e}")
+
+
+_shared_cache: Optional[SharedCache] = None
+
+
+def init_shared_cache(app) -> Optional[SharedCache]:
+    """
+    按应用配置（SHARED_CACHE_CONFIG）创建共享缓存；未启用时关闭共享层
+
+    Args:
+        app: Flask应用
+
+    Returns:
+        共享缓存，未启用时为None
+    """
+    global _shared_cache
+    config = app.config.get('SHARED_CACHE_CONFIG') or {}
+    if not config.get('enabled', False):
+        _shared_cache = None
+        return None
+
+    path = config.get('path') or Path(app.config['BASE_DIR']) / 'data' / 'shared_cache.db'
+    if _shared_cache is None or _shared_cache.path != str(path):
+        _shared_cache = SharedCache(
+            path,
+            max_entries=config.get('max_entries', 20000),
+            purge_interval=config.get('purge_interval', 60)
+        )
+    return _shared_cache
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """当前应用配置的共享缓存；未初始化或未启用时返回None"""
+    return _shared_cache
@@ -0,0 +1,117 @@
+"""
+单飞（single-flight）合并器 - 合并并发的相同上游调用
+
+同一个键的第一个调用者负责真正执行，其余并发调用者等待并共享其结果
+（或异常），避免热门股票被多个线程重复请求AKShare / 云端LLM。
+"""
+from functools import wraps
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    """一次正在进行的调用"""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    单飞合并器
+
+    注意：所有并发调用者拿到的是同一个结果对象，调用方不应原地修改。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = Lock()
+        self._stats = {'executed': 0, 'shared': 0}
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        执行调用；若相同键的调用正在进行，则等待其结果
+
+        Args:
+            key: 合并键
+            func: 实际执行的函数
+
+        Returns:
+            函数返回值
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats['shared'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def lead(self, key: Hashable) -> Optional[_Call]:
+        """
+        尝试成为该键的执行者（用于无法包装成单个函数调用的场景，如流式生成）
+
+        成功后必须调用 finish() 发布结果，否则等待该键的调用者会一直阻塞。
+
+        Returns:
+            调用句柄；相同键的调用正在进行时返回None（可用 do() 等待其结果）
+        """
+        with self._lock:
+            if key in self._calls:
+                return None
+            call = self._calls[key] = _Call()
+            self._stats['executed'] += 1
+            return call
+
+    def finish(self, key: Hashable, call: _Call, result: Any = None,
+               error: Optional[BaseException] = None):
+        """发布 lead() 取得的调用的结果（或异常），唤醒所有等待者"""
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def wrap(self, func: Callable) -> Callable:
+        """
+        方法装饰器：以 函数名 + 参数（跳过self）作为合并键
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args[1:], tuple(sorted(kwargs.items())))
+            return self.do(key, func, *args, **kwargs)
+        return wrapper
+
+    def get_stats(self) -> dict:
+        """
+        获取统计信息
+
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            return {
+                'executed': self._stats['executed'],
+                'shared': self._stats['shared'],
+                'in_flight': len(self._calls)
+            }
@@ -0,0 +1,52 @@
+"""
+Server-Sent Events 工具
+
+- iter_chat_deltas：解析 OpenAI 兼容接口 stream=true 返回的SSE流，逐段产出生成内容
+- format_event：把服务端事件编码为SSE文本帧，供流式诊断接口使用
+"""
+import json
+from typing import Any, Iterable, Iterator
+
+
+def iter_chat_deltas(lines: Iterable[str]) -> Iterator[str]:
+    """
+    解析聊天补全流式响应
+
+    Args:
+        lines: 响应的文本行（如 httpx.Response.iter_lines()）
+
+    Yields:
+        每个分片中 choices[0].delta.content 的非空内容
+    """
+    for line in lines:
+        if not line or not line.startswith('data:'):
+            # 空行为事件分隔，":"开头为注释/心跳
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        choices = chunk.get('choices') or []
+        if not choices:
+            continue
+        content = (choices[0].get('delta') or {}).get('content')
+        if content:
+            yield content
+
+
+def format_event(event: str, data: Any) -> str:
+    """
+    编码一个SSE事件
+
+    Args:
+        event: 事件名
+        data: 事件数据（JSON序列化）
+
+    Returns:
+        以空行结尾的SSE文本帧
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
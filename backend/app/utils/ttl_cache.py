@@ -0,0 +1,374 @@
+"""
+LRU + TTL 缓存 - 线程安全、有容量上限的进程内缓存
+
+- 条目按最近访问顺序排列，超过条目数或字节数上限时从最久未用的一端淘汰
+- 每个条目有自己的过期时间（可按交易时段动态计算）
+- 记录命中 / 未命中 / 淘汰 / 过期次数，供 /api/health 查看
+
+过期后的宽限期（grace）内条目仍可作为旧值返回（stale-while-revalidate），
+同时只在后台发起一次刷新；临近过期的热点键按 XFetch 概率提前刷新，
+避免大量请求在同一时刻一起穿透到上游。
+
+`cached` 装饰器为每个被装饰的函数创建一个独立缓存，参数可在
+llm_config.json 的 data_cache 节按函数名覆盖。启用跨进程共享缓存
+（shared_cache）时，进程内未命中会再查共享层，写入时同时写共享层，
+多 worker 部署下一个进程获取的数据其他进程直接可用。
+"""
+import logging
+import math
+import random
+import sys
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from app.utils.shared_cache import SharedCache, get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# 查找结果状态
+FRESH = 'fresh'      # 有效
+EARLY = 'early'      # 有效，但应在后台提前刷新
+STALE = 'stale'      # 已过期、仍在宽限期内，可返回旧值并在后台刷新
+MISS = 'miss'        # 不存在或已超过宽限期
+
+# 已创建的缓存（名称 -> 缓存），用于汇总统计
+_registry: Dict[str, 'LRUTTLCache'] = {}
+_registry_lock = Lock()
+_refresh_pool = None
+
+
+def should_refresh_early(expires_at: float, delta: float, beta: float = 1.0,
+                         now: Optional[float] = None) -> bool:
+    """
+    XFetch 概率提前刷新：越接近过期、重算越慢，越可能提前刷新
+
+    Args:
+        expires_at: 过期时间戳
+        delta: 重新计算耗时（秒）
+        beta: 提前程度（>1 更积极，0 关闭）
+    """
+    if delta <= 0 or beta <= 0:
+        return False
+    now = time.time() if now is None else now
+    return now - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算对象占用的字节数（DataFrame按深度内存，容器递归累加）"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUTTLCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, name: str, ttl: float = 60, max_entries: int = 1024, max_bytes: int = 0,
+                 grace: float = 0, beta: float = 1.0,
+                 sizeof: Callable[[Any], int] = estimate_size,
+                 shared: bool = False):
+        """
+        Args:
+            name: 缓存名称（统计用）
+            ttl: 默认有效期（秒）
+            max_entries: 最大条目数
+            max_bytes: 最大字节数（0表示不限；按 sizeof 估算）
+            grace: 过期后仍可返回旧值的宽限期（秒，0表示过期即失效）
+            beta: XFetch 提前刷新系数（0表示不提前刷新）
+            sizeof: 条目大小估算函数
+            shared: 是否使用跨进程共享缓存（按应用配置启用后生效）
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.beta = beta
+        self._sizeof = sizeof
+        self._use_shared = shared
+        # 键 -> (值, 过期时间戳, 字节数, 计算耗时)
+        self._data: 'OrderedDict[Hashable, Tuple[Any, float, int, float]]' = OrderedDict()
+        self._bytes = 0
+        self._refreshing: Set[Hashable] = set()
+        self._lock = Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'early_refreshes': 0,
+                       'shared_hits': 0, 'evictions': 0, 'expirations': 0}
+
+    @property
+    def shared(self) -> Optional[SharedCache]:
+        """当前生效的共享缓存（应用配置中未启用时为None）"""
+        return get_shared_cache() if self._use_shared else None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取未过期的值，并标记为最近使用"""
+        value, state = self.lookup(key)
+        return value if state in (FRESH, EARLY) else default
+
+    def lookup(self, key: Hashable) -> Tuple[Any, str]:
+        """
+        查找并返回值及其状态（进程内未命中时再查共享缓存）
+
+        Returns:
+            (值, FRESH / EARLY / STALE)；不存在或超过宽限期时为 (None, MISS)
+        """
+        with self._lock:
+            found = self._lookup_local(key, time.time())
+        if found is not None:
+            return found
+
+        shared = self.shared
+        if shared is not None:
+            item = shared.get(self._shared_key(key))
+            if item is not None:
+                value, expires_at, delta = item
+                self._store(key, value, expires_at, delta)
+                with self._lock:
+                    found = self._lookup_local(key, time.time())
+                    if found is not None:
+                        self._stats['shared_hits'] += 1
+                        return found
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None, MISS
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, delta: float = 0):
+        """
+        写入缓存（启用共享缓存时同时写入共享层）
+
+        Args:
+            key: 缓存键
+            value: 值
+            ttl: 有效期（秒），不传使用默认值
+            delta: 计算该值的耗时（秒），用于 XFetch 提前刷新
+        """
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._store(key, value, expires_at, delta)
+        shared = self.shared
+        if shared is not None:
+            shared.set(self._shared_key(key), value, expires_at,
+                            keep_until=expires_at + self.grace, delta=delta)
+
+    def begin_refresh(self, key: Hashable) -> bool:
+        """登记后台刷新；同一键已有刷新在进行时返回False"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: Hashable):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        shared = self.shared
+        if shared is not None:
+            shared.delete(self._shared_key(key))
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)[0]
+
+    def clear(self):
+        shared = self.shared
+        if shared is not None:
+            shared.delete_prefix(self._shared_key(''))
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> dict:
+        """
+        获取统计信息
+
+        Returns:
+            统计信息字典
+        """
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'shared': self.shared is not None,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0,
+                **self._stats
+            }
+
+    def _lookup_local(self, key: Hashable, now: float) -> Optional[Tuple[Any, str]]:
+        """在进程内查找（调用方持有锁），未命中返回None"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at, _, delta = item
+        if now < expires_at:
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            if should_refresh_early(expires_at, delta, self.beta, now):
+                self._stats['early_refreshes'] += 1
+                return value, EARLY
+            return value, FRESH
+        if now < expires_at + self.grace:
+            self._data.move_to_end(key)
+            self._stats['stale_hits'] += 1
+            return value, STALE
+        self._remove(key)
+        self._stats['expirations'] += 1
+        return None
+
+    def _store(self, key: Hashable, value: Any, expires_at: float, delta: float):
+        """写入进程内缓存并按上限淘汰"""
+        size = self._sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return  # 单个条目超过总上限，不缓存
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size, delta)
+            self._bytes += size
+            self._evict()
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"{self.name}:{key!r}"
+
+    def _remove(self, key: Hashable) -> Tuple[Any, float, int]:
+        item = self._data.pop(key)
+        self._bytes -= item[2]
+        return item
+
+    def _evict(self):
+        """超出上限时先丢弃已过期条目，再从最久未用的一端淘汰"""
+        if len(self._data) <= self.max_entries and (not self.max_bytes or self._bytes <= self.max_bytes):
+            return
+
+        now = time.time()
+        for key in [k for k, item in self._data.items() if item[1] + self.grace <= now]:
+            self._remove(key)
+            self._stats['expirations'] += 1
+
+        while self._data and (
+            len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._data)))
+            self._stats['evictions'] += 1
+
+
+def get_cache(name: str, **kwargs) -> LRUTTLCache:
+    """按名称获取缓存，不存在时创建并登记"""
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = _registry[name] = LRUTTLCache(name, **kwargs)
+        return cache
+
+
+def cache_stats() -> List[dict]:
+    """所有已登记缓存的统计信息"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return [cache.get_stats() for cache in caches]
+
+
+def _refresher():
+    """后台刷新线程池（首次需要时创建，任务携带当前应用上下文）"""
+    global _refresh_pool
+    with _registry_lock:
+        if _refresh_pool is None:
+            from app.utils.fanout import FanOut
+            _refresh_pool = FanOut(max_workers=4, thread_name_prefix='cache-refresh')
+        return _refresh_pool
+
+
+def cached(ttl: float = 60, max_entries: int = 1024, max_bytes: int = 0,
+           grace: float = 0, beta: float = 1.0,
+           name: Optional[str] = None, shared: bool = True,
+           ttl_func: Optional[Callable[[float], float]] = None,
+           should_cache: Callable[[Any], bool] = lambda result: result is not None):
+    """
+    方法缓存装饰器：以 参数（跳过self）作为缓存键
+
+    过期后的宽限期内直接返回旧值，并在后台刷新（同一键同时只有一个刷新）；
+    有效期内的热点键按 XFetch 概率提前在后台刷新。
+
+    注意：命中时返回的是缓存中的同一个对象，调用方不应原地修改。
+
+    Args:
+        ttl: 有效期（秒）
+        max_entries: 最大条目数
+        max_bytes: 最大字节数（0表示不限）
+        grace: 过期后仍返回旧值的宽限期（秒，0表示不返回旧值）
+        beta: XFetch 提前刷新系数（0表示不提前刷新）
+        name: 缓存名称，默认为函数名；也是 data_cache 配置中的键
+        shared: 是否使用跨进程共享缓存（需在 shared_cache 配置中启用）
+        ttl_func: 写入时根据 ttl 计算实际有效期，如 trading_calendar.ttl
+        should_cache: 判断结果是否写入缓存（默认不缓存None）
+    """
+    def decorator(func: Callable) -> Callable:
+        cache_name = name or func.__name__
+        try:
+            from app.config import BaseConfig
+            overrides = BaseConfig.DATA_CACHE_CONFIG.get(cache_name, {})
+        except:
+            overrides = {}
+
+        cache = get_cache(
+            cache_name,
+            ttl=overrides.get('ttl', ttl),
+            max_entries=overrides.get('max_entries', max_entries),
+            max_bytes=overrides.get('max_bytes', max_bytes),
+            grace=overrides.get('grace', grace),
+            beta=overrides.get('beta', beta),
+            shared=overrides.get('shared', shared)
+        )
+
+        def load(key, args, kwargs):
+            start = time.monotonic()
+            result = func(*args, **kwargs)
+            if should_cache(result):
+                cache.set(key, result, ttl_func(cache.ttl) if ttl_func else None,
+                          delta=time.monotonic() - start)
+            return result
+
+        def refresh(key, args, kwargs):
+            try:
+                load(key, args, kwargs)
+            except Exception as e:
+                logger.warning(f"后台刷新缓存失败 [{cache_name}]: {e}")
+            finally:
+                cache.end_refresh(key)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args[1:], tuple(sorted(kwargs.items())))
+            result, state = cache.lookup(key)
+            if state == FRESH:
+                return result
+            if state != MISS:
+                if cache.begin_refresh(key):
+                    _refresher().submit(refresh, key, args, kwargs)
+                return result
+            return load(key, args, kwargs)
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -0,0 +1,206 @@
+"""
+丐版量化交易系统 - 全市场日线回填
+
+冷启动时按股票逐只预先拉取日线历史写入本地（stock_daily 表及列式副本），
+之后的诊断请求只需增量同步。上游请求经 hist 频率限制器和熔断器，
+工作线程数只决定并发上限，总速率由 rate_limit 配置决定。
+
+进度记录在检查点文件中，中断（Ctrl+C）后再次运行会跳过已完成的股票。
+
+用法：
+    python backfill.py                       # 全部A股
+    python backfill.py --workers 8 --limit 500
+    python backfill.py --codes 600519,000001
+    python backfill.py --restart             # 忽略检查点，从头开始
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+# 加载 .env 文件（如果存在）
+load_dotenv()
+
+from app import create_app, db
+from app.config import BaseConfig
+
+# 熔断器打开时同一只股票最多等待重试的次数
+MAX_ATTEMPTS = 3
+
+# 检查点最少每隔多少秒写一次
+CHECKPOINT_INTERVAL = 5
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='全市场日线历史回填（可中断续传）')
+    parser.add_argument('--workers', type=int, default=4, help='并发线程数（默认4，总速率受 rate_limit.hist 限制）')
+    parser.add_argument('--codes', default='', help='只回填指定股票，逗号分隔（默认全部A股）')
+    parser.add_argument('--limit', type=int, default=0, help='本次最多回填多少只（0表示不限）')
+    parser.add_argument('--checkpoint', default=str(BaseConfig.BASE_DIR / 'data' / 'backfill_checkpoint.json'),
+                        help='检查点文件路径')
+    parser.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+    return parser.parse_args()
+
+
+def load_checkpoint(path: Path, restart: bool) -> dict:
+    """读取检查点；不存在或 restart 时返回空进度"""
+    if not restart:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            checkpoint.setdefault('done', {})
+            checkpoint.setdefault('failed', {})
+            return checkpoint
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"检查点文件损坏，从头开始: {e}")
+    return {'started_at': datetime.now().isoformat(), 'done': {}, 'failed': {}}
+
+
+def save_checkpoint(path: Path, checkpoint: dict):
+    """原子写入检查点（先写临时文件再替换）"""
+    checkpoint['updated_at'] = datetime.now().isoformat()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_universe(codes_arg: str) -> list:
+    """
+    获取待回填的股票代码，并写入/更新 stock 表
+
+    Returns:
+        股票代码列表
+    """
+    import akshare as ak
+    from app.models.stock import Stock
+    from app.services.data_service import data_service
+    from app.services.upstream import call_upstream
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    if codes_arg:
+        return [code.strip() for code in codes_arg.split(',') if code.strip()]
+
+    df = call_upstream('universe', ak.stock_info_a_code_name)
+    rows = [
+        {'code': str(code), 'name': str(name), 'market': data_service._get_market(str(code)),
+         'updated_at': datetime.now()}
+        for code, name in zip(df['code'], df['name'])
+    ]
+    stmt = sqlite_insert(Stock)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['code'],
+        set_={'name': stmt.excluded.name, 'market': stmt.excluded.market, 'updated_at': stmt.excluded.updated_at}
+    )
+    db.session.execute(stmt, rows)
+    db.session.commit()
+    return [row['code'] for row in rows]
+
+
+def backfill_one(app, code: str) -> int:
+    """
+    回填单只股票（在工作线程中进入应用上下文）
+
+    Returns:
+        写入（含更新）的行数
+    """
+    from app.services.bar_store import bar_store
+    from app.services.columnar_store import columnar_store
+    from app.utils.circuit_breaker import CircuitOpenError
+
+    with app.app_context():
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                written = bar_store.sync(code, force=True)
+                break
+            except CircuitOpenError as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                # 上游熔断中：等到可以探测时再试，而不是把剩余股票全部判为失败
+                time.sleep(max(e.retry_after, 1))
+
+        # 早于列式副本的本地数据没有副本文件，顺带补建
+        if columnar_store.enabled and columnar_store.length(code) is None:
+            bar_store.rebuild_columnar(code)
+        return written
+
+
+def main():
+    args = parse_args()
+    env = os.environ.get('FLASK_ENV', 'development')
+    app = create_app(env)
+    checkpoint_path = Path(args.checkpoint)
+    checkpoint = load_checkpoint(checkpoint_path, args.restart)
+
+    print("=" * 50)
+    print("全市场日线回填")
+    print("=" * 50)
+
+    with app.app_context():
+        codes = load_universe(args.codes)
+
+    pending = [code for code in codes if code not in checkpoint['done']]
+    if args.limit > 0:
+        pending = pending[:args.limit]
+    done = sum(1 for code in codes if code in checkpoint['done'])
+    print(f"股票总数: {len(codes)}，已完成: {done}，本次回填: {len(pending)}，并发: {args.workers}")
+    print("=" * 50)
+    if not pending:
+        return 0
+
+    start = time.monotonic()
+    last_save = start
+    finished = 0
+    rows = 0
+    executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='backfill')
+    futures = {executor.submit(backfill_one, app, code): code for code in pending}
+    try:
+        for future in as_completed(futures):
+            code = futures[future]
+            finished += 1
+            try:
+                written = future.result()
+                rows += written
+                checkpoint['done'][code] = written
+                checkpoint['failed'].pop(code, None)
+                status = f"写入 {written} 行"
+            except Exception as e:
+                checkpoint['failed'][code] = str(e)
+                status = f"失败: {e}"
+
+            elapsed = time.monotonic() - start
+            eta = elapsed / finished * (len(pending) - finished)
+            print(f"[{finished}/{len(pending)}] {code} {status}（已用 {elapsed:.0f}s，预计剩余 {eta:.0f}s）")
+
+            if time.monotonic() - last_save >= CHECKPOINT_INTERVAL:
+                save_checkpoint(checkpoint_path, checkpoint)
+                last_save = time.monotonic()
+    except KeyboardInterrupt:
+        print("已中断，保存进度（正在进行的股票完成后退出）...")
+        executor.shutdown(wait=True, cancel_futures=True)
+        save_checkpoint(checkpoint_path, checkpoint)
+        return 130
+    finally:
+        executor.shutdown(wait=True)
+
+    save_checkpoint(checkpoint_path, checkpoint)
+    failed = [code for code in pending if code in checkpoint['failed']]
+    print("=" * 50)
+    print(f"完成: {finished - len(failed)} 只，失败: {len(failed)} 只，共写入 {rows} 行，"
+          f"耗时 {time.monotonic() - start:.0f}s")
+    if failed:
+        print(f"失败的股票将在下次运行时重试，检查点: {checkpoint_path}")
+    print("=" * 50)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
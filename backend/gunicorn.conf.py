@@ -0,0 +1,33 @@
+"""
+gunicorn 配置 - 多进程 + 多线程部署
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+进程数、线程数等可用环境变量调整：
+    WEB_BIND      监听地址（默认 127.0.0.1:5001）
+    WEB_WORKERS   worker 进程数（默认 CPU 核数，最多 4）
+    WEB_THREADS   每个 worker 的线程数（默认 8）
+    WEB_TIMEOUT   worker 无响应多久后重启（秒，默认 120）
+
+请求大部分时间在等待 AKShare 和 LLM，使用 gthread worker 以线程承载并发；
+各进程共用 data/shared_cache.db 中的共享缓存和 data/rate_limits.db 中的令牌桶，
+增加进程数不会增加对上游的请求量。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('WEB_BIND', '127.0.0.1:5001')
+workers = int(os.environ.get('WEB_WORKERS', min(multiprocessing.cpu_count(), 4)))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 8))
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# 不预加载应用：每个 worker 在 fork 之后各自 create_app，
+# 后台线程（缓存写回、清理、刷新）和数据库连接都在子进程内创建
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
@@ -0,0 +1,16 @@
+"""
+测试公共夹具
+"""
+import pytest
+
+from app import create_app, db
+
+
+@pytest.fixture
+def app():
+    """测试配置的应用（内存数据库，不读写 data/ 下的共享缓存和列式副本）"""
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,79 @@
+"""
+日线本地存储测试：增量同步与复权检测
+"""
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('akshare')
+
+from app.services import bar_store as bar_store_module
+from app.services.bar_store import BarStore
+
+
+class FakeHistory:
+    """模拟 stock_zh_a_hist：最后一天为盘中K线，收盘价可变"""
+
+    def __init__(self, days: int = 10):
+        end = date(2024, 6, 28)
+        self.dates = [d.date() for d in pd.bdate_range(end=end, periods=days)]
+        self.closes = [10.0 + i for i in range(days)]
+        self.calls = []
+
+    def __call__(self, symbol, period='daily', adjust='', start_date=None, end_date=None):
+        self.calls.append(start_date)
+        start = pd.to_datetime(start_date).date() if start_date else date.min
+        rows = [(d, c) for d, c in zip(self.dates, self.closes) if d >= start]
+        return pd.DataFrame({
+            '日期': [d for d, _ in rows],
+            '开盘': [c for _, c in rows], '收盘': [c for _, c in rows],
+            '最高': [c for _, c in rows], '最低': [c for _, c in rows],
+            '成交量': 1000.0, '成交额': 1e6, '涨跌幅': 0.0, '换手率': 1.0
+        })
+
+
+class FakeCalendar:
+    @staticmethod
+    def ttl(live_ttl, now=None):
+        return live_ttl
+
+
+@pytest.fixture
+def history(app, monkeypatch):
+    fake = FakeHistory()
+    monkeypatch.setattr(bar_store_module.ak, 'stock_zh_a_hist', fake, raising=False)
+    monkeypatch.setattr(bar_store_module, 'call_upstream', lambda name, func, *args, **kwargs: func(*args, **kwargs))
+    monkeypatch.setattr(bar_store_module, 'trading_calendar', FakeCalendar())
+    return fake
+
+
+def test_intraday_price_moves_only_fetch_incrementally(history):
+    store = BarStore()
+    store.sync('000001', force=True)
+    assert history.calls == [None]
+
+    previous_day = history.dates[-2].strftime('%Y%m%d')
+    for close in (20.1, 20.5, 19.8):
+        history.closes[-1] = close
+        history.calls.clear()
+        store.sync('000001', force=True)
+        # 每次只有一次从倒数第二天开始的增量拉取，没有全量回填
+        assert history.calls == [previous_day]
+        assert store.get_frame('000001', 1)['close'].iloc[-1] == close
+
+    assert len(store.get_frame('000001', 100)) == len(history.dates)
+
+
+def test_adjusted_closed_bar_triggers_backfill(history):
+    store = BarStore()
+    store.sync('000001', force=True)
+
+    # 除权除息：前复权后历史价格整体变化
+    history.closes = [c * 0.9 for c in history.closes]
+    history.calls.clear()
+    store.sync('000001', force=True)
+
+    assert history.calls == [history.dates[-2].strftime('%Y%m%d'), None]
+    frame = store.get_frame('000001', 100)
+    assert frame['close'].tolist() == pytest.approx(history.closes)
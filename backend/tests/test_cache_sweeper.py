@@ -0,0 +1,22 @@
+"""
+分析缓存清理测试：多进程部署时只有持锁的一个进程执行清理
+"""
+import pytest
+
+pytest.importorskip('akshare')
+
+from app.services.cache_sweeper import CacheSweeper
+
+
+def test_only_one_sweeper_holds_the_lock(tmp_path):
+    first, second = CacheSweeper(), CacheSweeper()
+    for sweeper in (first, second):
+        sweeper._lock_path = tmp_path / 'cache_sweeper.lock'
+
+    assert first._hold_lock()
+    assert first._hold_lock()
+    assert not second._hold_lock()
+
+    # 持锁者退出（锁文件关闭）后由其他进程接手
+    first._lock_file.close()
+    assert second._hold_lock()
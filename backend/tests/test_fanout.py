@@ -0,0 +1,40 @@
+"""
+并发扇出测试：超时从任务开始运行时计起，排队超时的任务被取消
+"""
+import time
+
+from app.utils.fanout import FanOut, remaining_time
+
+
+def test_queue_time_does_not_count_against_timeout():
+    fanout = FanOut(max_workers=1, default_timeout=0.5)
+
+    def slow():
+        time.sleep(0.3)
+        return remaining_time()
+
+    results, errors = fanout.run({'a': slow, 'b': slow})
+    assert errors == {}
+    assert 0 < results['a'] <= 0.5 and 0 < results['b'] <= 0.5
+    assert remaining_time() is None
+
+
+def test_task_still_queued_after_timeout_is_cancelled():
+    fanout = FanOut(max_workers=1)
+    ran = []
+    # 其他请求的任务占满线程池
+    busy = fanout.submit(time.sleep, 0.5)
+
+    results, errors = fanout.run({'b': lambda: ran.append('b')}, timeouts={'b': 0.1})
+    assert results == {}
+    assert isinstance(errors['b'], TimeoutError)
+    busy.result()
+    time.sleep(0.05)
+    assert ran == []
+
+
+def test_running_task_times_out():
+    fanout = FanOut(max_workers=2, default_timeout=0.1)
+    results, errors = fanout.run({'a': lambda: time.sleep(0.5), 'b': lambda: 'ok'})
+    assert results == {'b': 'ok'}
+    assert isinstance(errors['a'], TimeoutError)
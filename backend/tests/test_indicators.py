@@ -0,0 +1,57 @@
+"""
+增量指标测试：复用状态的结果与对同一窗口全量重算一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('akshare')
+
+from app.services import indicator_engine
+from app.services.data_service import DataService
+
+
+def make_bars(n: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 20 + np.cumsum(rng.normal(0, 0.5, n))
+    return pd.DataFrame({
+        'trade_date': [d.date().isoformat() for d in pd.bdate_range('2024-01-02', periods=n)],
+        'close': close,
+        'high': close + rng.uniform(0, 0.5, n),
+        'low': close - rng.uniform(0, 0.5, n)
+    })
+
+
+def full_recompute(window: pd.DataFrame, tick=None) -> dict:
+    window = window.copy()
+    if tick:
+        window.loc[window.index[-1], ['close', 'high', 'low']] = tick
+    series = indicator_engine.compute(
+        window['close'].to_numpy(), window['high'].to_numpy(), window['low'].to_numpy()
+    )
+    return indicator_engine.summarize(indicator_engine.last_values(series))
+
+
+def test_sliding_window_matches_full_recompute():
+    service = DataService()
+    bars = make_bars(100)
+    days = 60
+
+    # 每个交易日窗口向后滑动一根K线，盘中多次用实时报价刷新
+    for end in range(days, len(bars) + 1):
+        window = bars.iloc[end - days:end].reset_index(drop=True)
+        last = window.iloc[-1]
+        for move in (0.0, 0.3, -0.4):
+            tick = (last['close'] + move, last['high'] + abs(move), last['low'] - abs(move))
+            assert service.calc_technical_indicators(window, code='600519', tick=tick) == \
+                full_recompute(window, tick)
+        assert service.calc_technical_indicators(window, code='600519') == full_recompute(window)
+
+
+def test_windows_of_different_length_do_not_share_state():
+    service = DataService()
+    bars = make_bars(130)
+
+    for days in (60, 120, 60, 120):
+        window = bars.tail(days).reset_index(drop=True)
+        assert service.calc_technical_indicators(window, code='000001') == full_recompute(window)
@@ -0,0 +1,174 @@
+"""
+诊断服务测试：数据获取失败的错误类型、批量诊断的线程池、流式诊断的请求合并
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('akshare')
+
+from app.services import llm_service as llm_module
+from app.services.llm_service import LLMService
+from app.services.market_context import MarketDataContext
+from app.utils.rate_limiter import RateLimitExceeded
+from app.utils.ttl_cache import MISS
+
+
+def load_with(errors, stock_info=None):
+    def load(self, fanout, timeouts=None):
+        self.stock_info = stock_info
+        self.daily = pd.DataFrame()
+        self.errors = errors
+        return self
+    return load
+
+
+@pytest.mark.parametrize('error', [TimeoutError('stock_info 超时'), RateLimitExceeded('info', 20)])
+def test_fetch_failure_is_not_reported_as_bad_code(monkeypatch, error):
+    monkeypatch.setattr(MarketDataContext, 'load', load_with({'stock_info': error}))
+    with pytest.raises(RuntimeError) as info:
+        LLMService()._prepare_diagnosis('600519', llm_module.normalize_preference(''), False)
+    assert not isinstance(info.value, ValueError)
+
+
+def test_missing_stock_is_reported_as_bad_code(monkeypatch):
+    monkeypatch.setattr(MarketDataContext, 'load', load_with({}))
+    with pytest.raises(ValueError):
+        LLMService()._prepare_diagnosis('999999', llm_module.normalize_preference(''), False)
+
+
+def test_batch_fetches_do_not_use_the_interactive_pool(monkeypatch):
+    used = []
+
+    def load(self, fanout, timeouts=None):
+        used.append(fanout)
+        return self
+
+    monkeypatch.setattr(MarketDataContext, 'load', load)
+    service = LLMService()
+    results = list(service.diagnose_batch(['600519', '000001']))
+
+    assert len(results) == 2
+    assert used == [service.batch_fetch, service.batch_fetch]
+    assert service.batch_fetch is not service.fanout
+
+
+class FakeCloud:
+    enabled = True
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def stream(self, prompt, system_prompt=None):
+        self.calls.append('stream')
+        yield '{"summary": '
+        self.release.wait(5)
+        yield '"stream"}'
+
+    def complete(self, prompt, system_prompt=None):
+        self.calls.append('complete')
+        self.release.wait(5)
+        return '{"summary": "complete"}'
+
+
+class FakeData:
+    def __init__(self):
+        self.daily_ready = threading.Event()
+        self.daily_ready.set()
+
+    def get_stock_info(self, code):
+        return {'code': code}
+
+    def get_realtime_quote(self, code):
+        return None
+
+    def get_daily_frame(self, code, days):
+        self.daily_ready.wait(5)
+        return pd.DataFrame({'close': [1.0]})
+
+    def get_fund_flow(self, code):
+        return None
+
+    def calc_technical_indicators(self, df, code=None):
+        return {}
+
+
+@pytest.fixture
+def stub_service(monkeypatch):
+    service = LLMService()
+    service.cloud_llm = FakeCloud()
+    service.data_service = FakeData()
+    ctx = SimpleNamespace(code='600519', stock_info={'code': '600519'}, technical={})
+    monkeypatch.setattr(service, '_prepare_diagnosis', lambda code, profile, force, fanout=None: (ctx, 'h', None))
+    monkeypatch.setattr(service, '_check_prepared', lambda ctx, profile, force: (ctx, 'h', None))
+    monkeypatch.setattr(service, '_build_analysis_prompt', lambda ctx, profile: 'prompt')
+    monkeypatch.setattr(service, '_cache_analysis', lambda *args: None)
+    return service
+
+
+def wait_for(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_concurrent_diagnose_waits_for_running_stream(stub_service):
+    stream = stub_service.diagnose_stock_stream('600519')
+    assert next(stream) == ('stock_info', {'code': '600519'})
+    assert next(stream) == ('technical', {})
+    assert next(stream) == ('token', '{"summary": ')
+
+    shared = []
+    waiter = threading.Thread(target=lambda: shared.append(stub_service.diagnose_stock('600519')))
+    waiter.start()
+    wait_for(lambda: stub_service._flight.get_stats()['shared'] == 1)
+    stub_service.cloud_llm.release.set()
+    events = list(stream)
+    waiter.join(5)
+
+    assert events[-1][0] == 'result'
+    assert shared == [events[-1][1]]
+    assert stub_service.cloud_llm.calls == ['stream']
+
+
+def test_stream_joins_running_diagnosis(stub_service):
+    results = []
+    leader = threading.Thread(target=lambda: results.append(stub_service.diagnose_stock('600519')))
+    leader.start()
+    wait_for(lambda: stub_service.cloud_llm.calls)
+
+    events = []
+    follower = threading.Thread(target=lambda: events.extend(stub_service.diagnose_stock_stream('600519')))
+    follower.start()
+    wait_for(lambda: stub_service._flight.get_stats()['shared'] == 1)
+    stub_service.cloud_llm.release.set()
+    follower.join(5)
+    leader.join(5)
+
+    assert [name for name, _ in events] == ['result']
+    assert events[0][1] is results[0]
+    assert stub_service.cloud_llm.calls == ['complete']
+
+
+def test_stream_yields_stock_info_before_slow_fetches(monkeypatch):
+    service = LLMService()
+    service.cloud_llm = FakeCloud()
+    service.cloud_llm.release.set()
+    service.data_service = FakeData()
+    service.data_service.daily_ready.clear()
+    monkeypatch.setattr(MarketDataContext, 'data_hash', lambda self, cache: 'h')
+    monkeypatch.setattr(service, '_get_cached_analysis', lambda *args: (None, MISS))
+    monkeypatch.setattr(service, '_build_analysis_prompt', lambda ctx, profile: 'prompt')
+    monkeypatch.setattr(service, '_cache_analysis', lambda *args: None)
+    stream = service.diagnose_stock_stream('600519')
+
+    # 日线仍在获取中，基本信息已经产出
+    start = time.monotonic()
+    assert next(stream) == ('stock_info', {'code': '600519'})
+    assert time.monotonic() - start < 1
+    service.data_service.daily_ready.set()
+    assert [name for name, _ in stream] == ['technical', 'token', 'token', 'result']
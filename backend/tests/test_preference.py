@@ -0,0 +1,48 @@
+"""
+投资偏好归一化测试
+"""
+import pytest
+
+from app.utils.preference import PreferenceProfile, normalize_preference
+
+
+@pytest.mark.parametrize('text, horizon, risk', [
+    ('我是长期投资者，风险承受能力中等', 'long', 'mid'),
+    ('稳健型，希望长期持有', 'long', 'low'),
+    ('非常激进的短线', 'short', 'high'),
+    ('我是稳健型投资者，但是偏好短线', 'short', 'low'),
+])
+def test_recognized_text_uses_profile_key(text, horizon, risk):
+    profile = normalize_preference(text)
+    assert (profile.horizon, profile.risk) == (horizon, risk)
+    assert profile.note == ''
+    assert profile.cache_type == f"analysis@{horizon}-{risk}"
+
+
+@pytest.mark.parametrize('text', ['不接受高风险', '我不太能承受高风险', '拒绝激进操作'])
+def test_negated_risk_is_not_high(text):
+    profile = normalize_preference(text)
+    assert profile.risk != 'high'
+    # 否定说法无法用画像表达，原文交给LLM并单独缓存
+    assert profile.note == text
+    assert profile.cache_type != normalize_preference('激进').cache_type
+
+
+def test_negation_is_scoped_to_clause():
+    assert normalize_preference('我不太懂股票，喜欢激进').risk == 'high'
+
+    profile = normalize_preference('不做短线，偏好长线')
+    assert profile.horizon == 'long'
+    assert profile.note == '不做短线，偏好长线'
+
+
+def test_unrecognized_text_is_passed_to_llm():
+    profile = normalize_preference('持有成本20元，关注新能源')
+    assert profile.key != PreferenceProfile().key
+    assert '持有成本20元，关注新能源' in profile.describe()
+    assert len(profile.cache_type) <= 20
+
+
+def test_same_text_shares_cache_entry():
+    assert normalize_preference('关注新能源').key == normalize_preference('关注新能源').key
+    assert normalize_preference('长线 稳健').key == normalize_preference('稳健，长线').key
@@ -0,0 +1,76 @@
+"""
+行情快照测试：过期后在后台刷新并沿用旧快照，刷新失败时在重试间隔内不再访问上游
+"""
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('akshare')
+
+from app.services import quote_snapshot as snapshot_module
+from app.services.quote_snapshot import QUOTE_COLUMNS, QuoteSnapshot
+
+
+class FakeCalendar:
+    def ttl(self, live_ttl, now=None):
+        return live_ttl
+
+
+def spot_frame(price: float) -> pd.DataFrame:
+    row = {column: 1.0 for column in QUOTE_COLUMNS.values()}
+    row.update({'代码': '600519', '名称': '贵州茅台', '最新价': price})
+    return pd.DataFrame([row])
+
+
+def wait_refreshed(snapshot, timeout=2.0):
+    deadline = time.time() + timeout
+    while snapshot._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    assert not snapshot._refreshing
+
+
+def test_expired_snapshot_refreshes_in_background(monkeypatch):
+    calls = []
+    responses = [spot_frame(1500.0)]
+    release = threading.Event()
+
+    def fake_upstream(name, func, *args, **kwargs):
+        calls.append(name)
+        if len(calls) > 1:
+            release.wait(5)
+        if not responses:
+            raise ConnectionError('upstream down')
+        return responses.pop(0)
+
+    monkeypatch.setattr(snapshot_module, 'call_upstream', fake_upstream)
+    monkeypatch.setattr(snapshot_module, 'trading_calendar', FakeCalendar())
+    snapshot = QuoteSnapshot(refresh_interval=30, retry_interval=10)
+
+    # 还没有快照：首次读取等待下载
+    assert snapshot.get('600519')['current_price'] == 1500.0
+    assert calls == ['spot']
+
+    # 快照过期且上游卡住：读取立即返回旧快照，只有一个后台刷新
+    snapshot._expires_at = 0
+    started = time.time()
+    for _ in range(20):
+        assert snapshot.get('600519')['current_price'] == 1500.0
+    assert time.time() - started < 1
+    assert calls == ['spot', 'spot']
+
+    # 刷新失败：沿用旧快照，重试间隔内的请求不访问上游
+    release.set()
+    wait_refreshed(snapshot)
+    assert 0 < snapshot._expires_at - time.time() <= 10
+    for _ in range(20):
+        assert snapshot.get('600519')['current_price'] == 1500.0
+    assert calls == ['spot', 'spot']
+
+    snapshot._expires_at = 0
+    responses.append(spot_frame(1510.0))
+    snapshot.get('600519')
+    wait_refreshed(snapshot)
+    assert snapshot.get('600519')['current_price'] == 1510.0
+    assert calls == ['spot', 'spot', 'spot']
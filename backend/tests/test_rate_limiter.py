@@ -0,0 +1,34 @@
+"""
+频率限制测试：异步取令牌时共享后端不在事件循环线程上执行
+"""
+import asyncio
+import threading
+
+from app.utils.rate_limiter import MemoryBucketBackend, RateLimiter
+
+
+class SharedBackend:
+    """非内存后端（如 SQLiteBucketBackend）的替身，记录 take 所在线程"""
+
+    def __init__(self):
+        self.backend = MemoryBucketBackend()
+        self.threads = []
+
+    def take(self, key, rate, capacity, tokens=1):
+        self.threads.append(threading.get_ident())
+        return self.backend.take(key, rate, capacity, tokens)
+
+
+def test_aacquire_runs_shared_backend_off_the_event_loop():
+    backend = SharedBackend()
+    limiter = RateLimiter('llm', rate=100, burst=1, backend=backend)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        assert await limiter.aacquire(timeout=1)
+        assert await limiter.aacquire(timeout=1)
+        return loop_thread
+
+    loop_thread = asyncio.run(main())
+    assert len(backend.threads) >= 2
+    assert loop_thread not in backend.threads
@@ -0,0 +1,31 @@
+"""
+交易日历测试：上游失败时的重试节流与近似日历
+"""
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip('akshare')
+
+from app.services import trading_calendar as calendar_module
+from app.services.trading_calendar import TradingCalendar
+
+
+def test_upstream_failure_is_retried_only_after_interval(tmp_path, monkeypatch):
+    calls = []
+
+    def failing_upstream(name, func, *args, **kwargs):
+        calls.append(name)
+        raise ConnectionError('upstream down')
+
+    monkeypatch.setattr(calendar_module, 'call_upstream', failing_upstream)
+    calendar = TradingCalendar(cache_path=str(tmp_path / 'trade_calendar.json'))
+
+    now = datetime(2024, 6, 29, 10, 0, tzinfo=calendar.tz)  # 周六
+    for _ in range(10):
+        calendar.ttl(30, now)
+    assert calls == ['calendar']
+
+    # 失败后按周一至周五近似
+    assert not calendar.is_trading_day(date(2024, 6, 29))
+    assert calendar.is_trading_day(date(2024, 7, 1))
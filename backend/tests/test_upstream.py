@@ -0,0 +1,104 @@
+"""
+上游调用测试：熔断中不消耗令牌，等待令牌时不占用并发名额
+"""
+import threading
+
+import pytest
+
+pytest.importorskip('akshare')
+
+from app.services import upstream as upstream_module
+from app.utils.circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from app.utils.rate_limiter import RateLimitExceeded
+
+
+class FakeLimiter:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.acquired = 0
+        self.gate = None        # 设置后第一次取令牌阻塞到该事件
+        self.waiting = threading.Event()
+
+    def acquire_or_raise(self, tokens=1, timeout=None):
+        if self.fail:
+            raise RateLimitExceeded('hist', 0)
+        gate, self.gate = self.gate, None
+        if gate is not None:
+            self.waiting.set()
+            gate.wait(5)
+        self.acquired += 1
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    registry = CircuitBreakerRegistry(defaults={'max_in_flight': 1, 'fail_threshold': 1})
+    limiter = FakeLimiter()
+    monkeypatch.setattr(upstream_module, 'breakers', registry)
+    monkeypatch.setattr(upstream_module, 'get_limiter', lambda name: limiter)
+    return registry, limiter
+
+
+def test_open_breaker_rejects_without_consuming_tokens(setup):
+    registry, limiter = setup
+    with pytest.raises(ValueError):
+        upstream_module.call_upstream('hist', lambda: int('x'))
+    assert limiter.acquired == 1
+
+    with pytest.raises(CircuitOpenError):
+        upstream_module.call_upstream('hist', lambda: 'ok')
+    assert limiter.acquired == 1
+
+
+def test_waiting_for_token_does_not_hold_slot(setup):
+    registry, limiter = setup
+    release = threading.Event()
+    limiter.gate = release
+    results = []
+
+    worker = threading.Thread(
+        target=lambda: results.append(upstream_module.call_upstream('hist', lambda: 'slow'))
+    )
+    worker.start()
+    limiter.waiting.wait(5)
+    try:
+        # max_in_flight=1：另一个调用仍在等令牌，不占用名额
+        assert upstream_module.call_upstream('hist', lambda: 'ok') == 'ok'
+        assert registry.get('hist').get_stats()['in_flight'] == 0
+    finally:
+        release.set()
+        worker.join()
+    assert results == ['slow']
+
+
+def test_in_flight_limit_counts_running_calls(setup):
+    registry, limiter = setup
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'ok'
+
+    worker = threading.Thread(target=upstream_module.call_upstream, args=('hist', slow))
+    worker.start()
+    started.wait(5)
+    try:
+        with pytest.raises(CircuitOpenError):
+            upstream_module.call_upstream('hist', lambda: 'ok')
+    finally:
+        release.set()
+        worker.join()
+    assert registry.get('hist').get_stats()['in_flight'] == 0
+
+
+def test_token_timeout_does_not_count_as_failure(setup):
+    registry, limiter = setup
+    limiter.fail = True
+    for _ in range(3):
+        with pytest.raises(RateLimitExceeded):
+            upstream_module.call_upstream('hist', lambda: 'ok')
+
+    stats = registry.get('hist').get_stats()
+    assert stats['state'] == 'closed'
+    assert stats['in_flight'] == 0
+    assert stats['failures'] == 0
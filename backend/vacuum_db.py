@@ -0,0 +1,38 @@
+"""
+丐版量化交易系统 - 数据库维护：切换为增量空间回收
+
+analysis_cache 清理线程每轮用 incremental_vacuum 回收空闲页，这要求数据库为
+auto_vacuum=INCREMENTAL 模式。新建的数据库在建表前已经设置；在此之前创建的
+数据库需执行一次本命令转换。转换是一次完整 VACUUM，会锁住整个数据库并临时占用
+与数据库同样大小的磁盘空间，请先停止服务进程再运行。
+
+用法：
+    python vacuum_db.py
+"""
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# 加载 .env 文件（如果存在）
+load_dotenv()
+
+from app import create_app
+from app.services.cache_sweeper import cache_sweeper
+
+
+def main():
+    env = os.environ.get('FLASK_ENV', 'development')
+    app = create_app(env)
+
+    with app.app_context():
+        start = time.monotonic()
+        if not cache_sweeper.enable_incremental_vacuum():
+            print("数据库已是 auto_vacuum=INCREMENTAL 模式（或为内存库），无需转换")
+            return 0
+    print(f"已切换为 auto_vacuum=INCREMENTAL，耗时 {time.monotonic() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
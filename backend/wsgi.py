@@ -0,0 +1,16 @@
+"""
+丐版量化交易系统 - 生产部署入口（WSGI）
+
+    Linux/macOS:  gunicorn -c gunicorn.conf.py wsgi:app
+    Windows:      waitress-serve --listen=127.0.0.1:5001 --threads=8 wsgi:app
+"""
+import os
+from dotenv import load_dotenv
+
+# 加载 .env 文件（如果存在）
+load_dotenv()
+
+from app import create_app
+
+# 生产入口默认使用 production 配置
+app = create_app(os.environ.get('FLASK_ENV', 'production'))
@@ -1,63 +1,162 @@
-import axios from 'axios'
-
-// 创建axios实例
-const api = axios.create({
-    baseURL: '/api',
-    timeout: 120000  // 2分钟超时，因为LLM分析可能较慢
-})
-
-// 健康检查
-export const checkHealth = async () => {
-    const response = await api.get('/health')
-    return response.data
-}
-
-// 获取股票信息
-export const getStockInfo = async (code) => {
-    const response = await api.get(`/stock/${code}`)
-    return response.data
-}
-
-// 获取日线数据
-export const getStockDaily = async (code, days = 60) => {
-    const response = await api.get(`/stock/${code}/daily`, { params: { days } })
-    return response.data
-}
-
-// 获取技术指标
-export const getTechnicalIndicators = async (code) => {
-    const response = await api.get(`/stock/${code}/technical`)
-    return response.data
-}
-
-// 个股诊断
-export const diagnoseStock = async (code, userPreference = '', forceRefresh = false) => {
-    const response = await api.post('/analysis/diagnose', {
-        code,
-        user_preference: userPreference,
-        force_refresh: forceRefresh
-    })
-    return response.data
-}
-
-// 清除缓存
-export const clearCache = async (code) => {
-    const response = await api.delete(`/analysis/cache/${code}`)
-    return response.data
-}
-
-// 记录操作
-export const recordOperation = async (data) => {
-    const response = await api.post('/analysis/operation', data)
-    return response.data
-}
-
-// 获取操作历史
-export const getOperationHistory = async (code = '', limit = 50) => {
-    const response = await api.get('/analysis/operation/history', {
-        params: { code, limit }
-    })
-    return response.data
-}
-
-export default api
+import axios from 'axios'
+
+// 创建axios实例
+const api = axios.create({
+    baseURL: '/api',
+    timeout: 120000  // 2分钟超时，因为LLM分析可能较慢
+})
+
+// 健康检查
+export const checkHealth = async () => {
+    const response = await api.get('/health')
+    return response.data
+}
+
+// 获取股票信息
+export const getStockInfo = async (code) => {
+    const response = await api.get(`/stock/${code}`)
+    return response.data
+}
+
+// 批量获取实时行情（自选股列表一次往返）
+export const getQuotes = async (codes) => {
+    const response = await api.get('/stock/quotes', { params: { codes: codes.join(',') } })
+    return response.data
+}
+
+// 获取日线数据
+export const getStockDaily = async (code, days = 60) => {
+    const response = await api.get(`/stock/${code}/daily`, { params: { days } })
+    return response.data
+}
+
+// 获取技术指标
+export const getTechnicalIndicators = async (code) => {
+    const response = await api.get(`/stock/${code}/technical`)
+    return response.data
+}
+
+// 获取完整技术指标序列（绘图用）
+export const getTechnicalSeries = async (code, days = 120) => {
+    const response = await api.get(`/stock/${code}/technical`, { params: { series: 1, days } })
+    return response.data
+}
+
+// 个股诊断
+export const diagnoseStock = async (code, userPreference = '', forceRefresh = false) => {
+    const response = await api.post('/analysis/diagnose', {
+        code,
+        user_preference: userPreference,
+        force_refresh: forceRefresh
+    })
+    return response.data
+}
+
+// 流式个股诊断（SSE）：先收到基本信息和技术指标，再逐段收到AI生成内容
+// handlers: { onStockInfo, onTechnical, onToken }，返回与 diagnoseStock 相同结构的结果
+export const diagnoseStockStream = async (code, userPreference = '', forceRefresh = false, handlers = {}) => {
+    const response = await fetch('/api/analysis/diagnose/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            code,
+            user_preference: userPreference,
+            force_refresh: forceRefresh
+        })
+    })
+    if (!response.ok) {
+        return response.json()
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let result = null
+    const handleFrame = (frame) => {
+        let event = 'message'
+        let data = ''
+        frame.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) event = line.slice(6).trim()
+            else if (line.startsWith('data:')) data += line.slice(5).trim()
+        })
+        if (!data) return
+        const payload = JSON.parse(data)
+        if (event === 'stock_info') handlers.onStockInfo?.(payload)
+        else if (event === 'technical') handlers.onTechnical?.(payload)
+        else if (event === 'token') handlers.onToken?.(payload.text)
+        else if (event === 'result') result = { code: 200, message: 'success', data: payload }
+        else if (event === 'error') result = { code: payload.code, message: payload.message, data: null }
+    }
+    while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const frames = buffer.split('\n\n')
+        buffer = frames.pop()
+        frames.forEach(handleFrame)
+    }
+    handleFrame(buffer)
+    return result || { code: 500, message: '诊断连接中断', data: null }
+}
+
+// 批量诊断（自选股）：结果按完成顺序逐行返回，每收到一只调用一次 onResult
+export const diagnoseBatch = async (codes, userPreference = '', forceRefresh = false, onResult = () => {}) => {
+    const response = await fetch('/api/analysis/diagnose/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            codes,
+            user_preference: userPreference,
+            force_refresh: forceRefresh
+        })
+    })
+    if (!response.ok) {
+        return response.json()
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let summary = null
+    const handleLine = (line) => {
+        if (!line.trim()) return
+        const item = JSON.parse(line)
+        if (item.done) {
+            summary = item
+        } else {
+            onResult(item)
+        }
+    }
+    while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop()
+        lines.forEach(handleLine)
+    }
+    handleLine(buffer)
+    return { code: 200, message: 'success', data: summary }
+}
+
+// 清除缓存
+export const clearCache = async (code) => {
+    const response = await api.delete(`/analysis/cache/${code}`)
+    return response.data
+}
+
+// 记录操作
+export const recordOperation = async (data) => {
+    const response = await api.post('/analysis/operation', data)
+    return response.data
+}
+
+// 获取操作历史
+export const getOperationHistory = async (code = '', limit = 50) => {
+    const response = await api.get('/analysis/operation/history', {
+        params: { code, limit }
+    })
+    return response.data
+}
+
+export default api
@@ -1,21 +1,21 @@
-import { createRouter, createWebHistory } from 'vue-router'
-
-const routes = [
-    {
-        path: '/',
-        name: 'Home',
-        component: () => import('@/views/Home.vue')
-    },
-    {
-        path: '/diagnosis',
-        name: 'StockDiagnosis',
-        component: () => import('@/views/StockDiagnosis.vue')
-    }
-]
-
-const router = createRouter({
-    history: createWebHistory(),
-    routes
-})
-
-export default router
+import { createRouter, createWebHistory } from 'vue-router'
+
+const routes = [
+    {
+        path: '/',
+        name: 'Home',
+        component: () => import('@/views/Home.vue')
+    },
+    {
+        path: '/diagnosis',
+        name: 'StockDiagnosis',
+        component: () => import('@/views/StockDiagnosis.vue')
+    }
+]
+
+const router = createRouter({
+    history: createWebHistory(),
+    routes
+})
+
+export default router
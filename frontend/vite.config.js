@@ -1,20 +1,20 @@
-import { defineConfig } from 'vite'
-import vue from '@vitejs/plugin-vue'
-
-export default defineConfig({
-    plugins: [vue()],
-    server: {
-        port: 3000,
-        proxy: {
-            '/api': {
-                target: 'http://127.0.0.1:5001',
-                changeOrigin: true
-            }
-        }
-    },
-    resolve: {
-        alias: {
-            '@': '/src'
-        }
-    }
-})
+import { defineConfig } from 'vite'
+import vue from '@vitejs/plugin-vue'
+
+export default defineConfig({
+    plugins: [vue()],
+    server: {
+        port: 3000,
+        proxy: {
+            '/api': {
+                target: 'http://127.0.0.1:5001',
+                changeOrigin: true
+            }
+        }
+    },
+    resolve: {
+        alias: {
+            '@': '/src'
+        }
+    }
+})